@@ -1,11 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers.auth import router as auth_router
 from .routers.consents import router as consents_router
 from .routers.dashboard import router as dashboard_router
+from .routers.events import router as events_router
+from .routers.metrics import router as metrics_router
 from .routers.profile import router as profile_router
+from .banks.cache import snapshot_cache
+from .banks.client import consent_scheduler
+from .banks.tokens import bank_token_manager
+from .banks.transport import bank_transport
+from .core.logs import setup_logging, shutdown_logging
+from .core.metrics import MetricsMiddleware
+from .core.passwords import password_hasher
+from .core.state import state_backend
+from .core.users import user_repository
 
-app = FastAPI(title="Monetrix API", version="2.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    await bank_transport.start()
+    await bank_token_manager.start()
+    await consent_scheduler.start()
+    try:
+        yield
+    finally:
+        await consent_scheduler.close()
+        await bank_token_manager.close()
+        await snapshot_cache.close()
+        await bank_transport.close()
+        await user_repository.close()
+        await password_hasher.close()
+        await state_backend.close()
+        shutdown_logging()
+
+
+app = FastAPI(title="Monetrix API", version="2.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,8 +46,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
 app.include_router(consents_router)
 app.include_router(dashboard_router)
+app.include_router(events_router)
+app.include_router(metrics_router)
 app.include_router(profile_router)
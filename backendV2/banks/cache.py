@@ -0,0 +1,172 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from ..banks.config import SNAPSHOT_MAX_ENTRIES, SNAPSHOT_MAX_ITEMS, SNAPSHOT_STALE_TTL_SECONDS, SNAPSHOT_TTL_SECONDS
+from ..banks.client import BankClients, aggregate_banks, consent_scheduler
+from ..banks.outbound import Priority, priority
+from ..banks.singleflight import SingleFlight
+from ..core.logs import LOG_SAMPLE_RATE, get_logger
+
+log = get_logger(__name__)
+
+SnapshotKey = Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class Snapshot:
+    key: SnapshotKey
+    data: Dict[str, Any]
+    version: int
+    created_at: float
+    items: int
+    derived: Dict[str, Any] = field(default_factory=dict)  # индексы и прочие структуры, построенные по снимку
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+def snapshot_key(clients: BankClients) -> SnapshotKey:
+    """Ключ снимка — отсортированные пары (bank, client); словарь bank -> client тоже принимается"""
+    pairs = clients.items() if isinstance(clients, dict) else clients
+    return tuple(sorted(set((bank, client) for bank, client in pairs if client)))
+
+
+def _count_items(data: Dict[str, Any]) -> int:
+    return len(data.get("accounts", [])) + len(data.get("transactions", []))
+
+
+class SnapshotCache:
+    """LRU-кэш результатов aggregate_banks с TTL и stale-while-revalidate"""
+
+    def __init__(self, loader: Callable[..., Awaitable[Dict[str, Any]]], *,
+                 ttl: float = SNAPSHOT_TTL_SECONDS, stale_ttl: float = SNAPSHOT_STALE_TTL_SECONDS,
+                 max_entries: int = SNAPSHOT_MAX_ENTRIES, max_items: int = SNAPSHOT_MAX_ITEMS) -> None:
+        self._loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_items = max_items
+        self._entries: "OrderedDict[SnapshotKey, Snapshot]" = OrderedDict()
+        self._items = 0
+        self._version = 0
+        self._epochs: Dict[SnapshotKey, int] = {}
+        self._epoch_counter = itertools.count(1)
+        self._refreshing: Dict[SnapshotKey, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._flight = SingleFlight()
+
+    async def get(self, clients: BankClients) -> Snapshot:
+        key = snapshot_key(clients)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = entry.age()
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                log.debug("snapshot.hit", "📦 Снимок из кэша", clients=len(key), age=round(age, 1), sample=LOG_SAMPLE_RATE)
+                return entry
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self._schedule_refresh(key)
+                log.debug("snapshot.stale", "📦 Устаревший снимок, обновляю в фоне", clients=len(key), age=round(age, 1), sample=LOG_SAMPLE_RATE)
+                return entry
+        log.debug("snapshot.miss", "📦 Снимка нет в кэше, собираю", clients=len(key), sample=LOG_SAMPLE_RATE)
+        # Эпоха в ключе: промах после invalidate не присоединяется к загрузке, начатой до него, и не получит старые данные
+        epoch = self._epoch(key)
+        return await self._flight.do((key, epoch), lambda: self._load(key, epoch))
+
+    async def reload(self, clients: BankClients, **loader_kwargs: Any) -> Snapshot:
+        """Принудительно перестраивает снимок (например, после полной пересинхронизации)"""
+        key = snapshot_key(clients)
+        self._drop(key)
+        return await self._load(key, **loader_kwargs)
+
+    def peek(self, clients: BankClients) -> Optional[Snapshot]:
+        return self._entries.get(snapshot_key(clients))
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "items": self._items, "refreshing": len(self._refreshing)}
+
+    def flight_stats(self) -> Dict[str, int]:
+        return {**self._flight.stats, "in_flight": self._flight.in_flight()}
+
+    def invalidate(self, bank_code: Optional[str] = None, client_id: Optional[str] = None) -> int:
+        """Удаляет снимки, в которых участвует пара (bank_code, client_id); без аргументов — все"""
+        removed = 0
+        for key in list(self._entries):
+            if self._matches(key, bank_code, client_id):
+                self._drop(key)
+                removed += 1
+        for key in list(self._epochs):
+            if self._matches(key, bank_code, client_id):
+                self._epochs.pop(key)
+        return removed
+
+    async def close(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._refreshing.clear()
+
+    @staticmethod
+    def _matches(key: SnapshotKey, bank_code: Optional[str], client_id: Optional[str]) -> bool:
+        return any((bank_code is None or bank == bank_code) and (client_id is None or client == client_id) for bank, client in key)
+
+    def _epoch(self, key: SnapshotKey) -> int:
+        epoch = self._epochs.get(key)
+        if epoch is None:
+            epoch = self._epochs[key] = next(self._epoch_counter)
+        return epoch
+
+    async def _load(self, key: SnapshotKey, epoch: Optional[int] = None, **loader_kwargs: Any) -> Snapshot:
+        epoch = self._epoch(key) if epoch is None else epoch
+        data = await self._loader(key, **loader_kwargs)
+        self._version += 1
+        snapshot = Snapshot(key=key, data=data, version=self._version, created_at=time.monotonic(), items=_count_items(data))
+        if self._epochs.get(key) == epoch:
+            self._store(snapshot)
+        return snapshot
+
+    def _schedule_refresh(self, key: SnapshotKey) -> None:
+        if key in self._refreshing:
+            return
+        with priority(Priority.BACKGROUND):
+            task = asyncio.create_task(self._load(key))
+        self._refreshing[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._on_refresh_done(key, t))
+
+    def _on_refresh_done(self, key: SnapshotKey, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._refreshing.get(key) is task:
+            self._refreshing.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("snapshot.refresh_failed", "⚠️  Не удалось обновить снимок", key=key, error=repr(task.exception()))
+
+    def _store(self, snapshot: Snapshot) -> None:
+        previous = self._entries.pop(snapshot.key, None)
+        if previous is not None:
+            self._items -= previous.items
+        self._entries[snapshot.key] = snapshot
+        self._items += snapshot.items
+        while self._entries and (len(self._entries) > self.max_entries or self._items > self.max_items):
+            oldest = next(iter(self._entries))
+            if oldest == snapshot.key:
+                break
+            self._drop(oldest)
+
+    def _drop(self, key: SnapshotKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._items -= entry.items
+        # Загрузка, начатая до удаления, не должна вернуть снимок в кэш
+        self._epochs.pop(key, None)
+
+
+snapshot_cache = SnapshotCache(aggregate_banks)
+# Согласие активировалось (или было отклонено) в фоне — снимок с pending-статусом больше не актуален
+consent_scheduler.add_listener(lambda old, new: snapshot_cache.invalidate(new.bank_code, new.client_id))
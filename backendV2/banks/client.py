@@ -1,110 +1,49 @@
 import asyncio
+import time
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Tuple, List
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, Iterable, Optional, Tuple, List, Union
 import httpx
-from ..banks.config import BANK_CONFIGS, BankConfig, DEFAULT_BANK_CLIENTS, TEAM_LOGIN
+from ..banks.config import BANK_CONFIGS, ERROR_BODY_LIMIT, BankConfig, DEFAULT_BANK_CLIENTS, TEAM_LOGIN
+from ..banks.consent_scheduler import ConsentScheduler
+from ..banks.events import event_bus
+from ..banks.health import BankUnavailableError, bank_breakers
+from ..banks.registry import BankConsentState, ConsentRegistry
+from ..banks.singleflight import SingleFlight
+from ..banks.records import Account, Transaction, format_timestamp, parse_accounts, parse_timestamp
+from ..banks.store import AccountHistory, transaction_store
+from ..banks.tokens import BankTokenState, bank_tokens, ensure_bank_token, fetch_bank_token  # noqa: F401 (реэкспорт)
+from ..banks.transport import bank_transport
+from ..core.logs import get_logger
+from ..core.metrics import metrics
 from ..core.models import ConsentStatus
+from ..core.state import state_backend
 
-@dataclass
-class BankTokenState:
-    access_token: str
-    expires_at: datetime
+consent_registry = ConsentRegistry()
+bank_fetch_semaphores: Dict[str, asyncio.Semaphore] = {code: asyncio.Semaphore(cfg.max_concurrency) for code, cfg in BANK_CONFIGS.items()}
+bank_client_semaphores: Dict[str, asyncio.Semaphore] = {code: asyncio.Semaphore(cfg.client_concurrency) for code, cfg in BANK_CONFIGS.items()}
+bank_data_flight = SingleFlight()
+bank_last_good: Dict[Tuple[str, str], Dict[str, Any]] = {}  # последний успешный ответ банка для отдачи при сбое
 
-@dataclass
-class BankConsentState:
-    consent_id: Optional[str]
-    status: ConsentStatus
-    bank_code: str
-    client_id: str
-    expires_at: Optional[datetime]
-    last_synced_at: datetime
-    request_id: Optional[str] = None  # SBank возвращает request_id для pending согласий
-
-bank_tokens: Dict[str, BankTokenState] = {}
-bank_token_locks: Dict[str, asyncio.Lock] = {code: asyncio.Lock() for code in BANK_CONFIGS}
-bank_consents_by_key: Dict[Tuple[str, str], BankConsentState] = {}
-bank_consents_by_id: Dict[str, BankConsentState] = {}
-bank_consent_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
-
-def _get_consent_lock(bank_code: str, client_id: str) -> asyncio.Lock:
-    key = (bank_code, client_id)
-    if key not in bank_consent_locks:
-        bank_consent_locks[key] = asyncio.Lock()
-    return bank_consent_locks[key]
+log = get_logger(__name__)
+bank_gather_seconds = metrics.histogram(
+    "monetrix_bank_gather_duration_seconds", "Сбор данных одного банка: токен, согласие, счета и транзакции", ("bank", "outcome"))
+aggregate_seconds = metrics.histogram("monetrix_aggregate_duration_seconds", "Агрегация по всем банкам пользователя")
+bank_stale_responses = metrics.counter(
+    "monetrix_bank_stale_responses_total", "Ответы из последних успешных данных вместо банка", ("bank", "reason"))
 
 async def _http_post(cfg: BankConfig, path: str, *, headers: Optional[Dict[str, str]] = None,
                      params: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
-                     json_payload: Optional[Dict[str, Any]] = None) -> httpx.Response:
-    url = f"{cfg.base_url}{path}"
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        return await client.post(url, headers=headers, params=params, data=data, json=json_payload)
+                     json_payload: Optional[Dict[str, Any]] = None, operation: str = "default") -> httpx.Response:
+    return await bank_transport.request(cfg, "POST", path, operation=operation, headers=headers, params=params, data=data, json_payload=json_payload)
 
 async def _http_get(cfg: BankConfig, path: str, *, headers: Optional[Dict[str, str]] = None,
-                    params: Optional[Dict[str, Any]] = None) -> httpx.Response:
-    url = f"{cfg.base_url}{path}"
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        return await client.get(url, headers=headers, params=params)
+                    params: Optional[Dict[str, Any]] = None, operation: str = "default") -> httpx.Response:
+    return await bank_transport.request(cfg, "GET", path, operation=operation, headers=headers, params=params)
 
 async def _http_delete(cfg: BankConfig, path: str, *, headers: Optional[Dict[str, str]] = None,
-                       params: Optional[Dict[str, Any]] = None) -> httpx.Response:
-    url = f"{cfg.base_url}{path}"
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        return await client.delete(url, headers=headers, params=params)
-
-async def fetch_bank_token(cfg: BankConfig) -> BankTokenState:
-    params = {
-        "client_id": cfg.client_id,
-        "client_secret": cfg.client_secret,
-    }
-    
-    print(f"    🔑 Получаю токен для {cfg.code} с client_id={cfg.client_id}")
-    
-    response = await _http_post(cfg, "/auth/bank-token", params=params)
-    
-    if response.status_code >= 400:
-        # Некоторые банки требуют JSON body вместо query params
-        print(f"    ⚠️  Query params не сработали ({response.status_code}), пробую JSON body...")
-        response = await _http_post(cfg, "/auth/bank-token", json_payload=params)
-        
-        if response.status_code >= 400:
-            error_text = response.text
-            try:
-                error_data = response.json()
-                error_text = str(error_data)
-            except:
-                pass
-            print(f"    ❌ Ошибка получения токена для {cfg.code}: {response.status_code} - {error_text}")
-            raise Exception(f"Failed to get bank token for {cfg.code}: {response.status_code} - {error_text}")
-    
-    try:
-        data = response.json()
-    except Exception as e:
-        print(f"    ❌ Не удалось распарсить JSON ответ от {cfg.code}: {e}")
-        print(f"    Ответ: {response.text}")
-        raise
-    
-    token = data.get("access_token") or data.get("token")
-    if not token:
-        print(f"    ❌ Токен не найден в ответе от {cfg.code}. Данные: {data}")
-        raise Exception(f"No token in response from {cfg.code}")
-    
-    expires_in = int(data.get("expires_in") or 3600)
-    print(f"    ✅ Токен получен для {cfg.code}, expires_in={expires_in}s")
-    return BankTokenState(access_token=token, expires_at=datetime.utcnow() + timedelta(seconds=expires_in - 60))
-
-async def ensure_bank_token(bank_code: str) -> str:
-    cfg = BANK_CONFIGS[bank_code]
-    state = bank_tokens.get(bank_code)
-    if state and state.expires_at > datetime.utcnow():
-        return state.access_token
-    async with bank_token_locks[bank_code]:
-        state = bank_tokens.get(bank_code)
-        if state and state.expires_at > datetime.utcnow():
-            return state.access_token
-        state = await fetch_bank_token(cfg)
-        bank_tokens[bank_code] = state
-        return state.access_token
+                       params: Optional[Dict[str, Any]] = None, operation: str = "default") -> httpx.Response:
+    return await bank_transport.request(cfg, "DELETE", path, operation=operation, headers=headers, params=params)
 
 def _normalize_status(value: Optional[str]) -> ConsentStatus:
     if not value:
@@ -130,19 +69,20 @@ async def request_account_consent(cfg: BankConfig, token: str, client_id: str) -
         "Content-Type": "application/json"
     }
     
-    print(f"    📤 Отправляю запрос согласия для {cfg.code} с client_id={client_id}, token={token[:20]}...")
+    log.debug("consent.request", "📤 Отправляю запрос согласия", bank=cfg.code, client=client_id)
     
     response = await _http_post(cfg, "/account-consents/request", headers=headers, json_payload={
         "client_id": client_id,
         "permissions": ["ReadAccountsDetail", "ReadBalances", "ReadTransactions"],
-    })
+    }, operation="consent")
     
     if response.status_code >= 400:
-        print(f"    ❌ Ошибка от банка {cfg.code}: {response.status_code} - {response.text}")
+        log.error("consent.request_failed", "❌ Ошибка от банка", bank=cfg.code, status=response.status_code,
+                  body=response.text[:ERROR_BODY_LIMIT])
         raise Exception(f"Bank API error: {response.status_code}")
     
     data = response.json()
-    print(f"    📄 Полный ответ от {cfg.code}: {data}")
+    log.debug("consent.response", "📄 Ответ банка на запрос согласия", bank=cfg.code, keys=sorted(data), status=data.get("status"))
     
     consent_id = (
         data.get("consent_id") or 
@@ -154,16 +94,15 @@ async def request_account_consent(cfg: BankConfig, token: str, client_id: str) -
     status = _normalize_status(data.get("status"))
     
     if not consent_id and request_id:
-        print(f"    ℹ️  Согласие pending, request_id={request_id}, consent_id будет после одобрения")
-    existing_key = (cfg.code, client_id)
-    existing = bank_consents_by_key.get(existing_key)
+        log.info("consent.pending", "ℹ️  Согласие pending, consent_id будет после одобрения", bank=cfg.code, request_id=request_id)
+    existing = consent_registry.get(cfg.code, client_id)
     if existing and existing.consent_id == consent_id:
-        print(f"    ⚠️  Банк вернул существующее согласие {consent_id} (возможно, не удалось отозвать)")
+        log.warning("consent.reused", "⚠️  Банк вернул существующее согласие (возможно, не удалось отозвать)", bank=cfg.code, consent_id=consent_id)
     else:
         if consent_id:
-            print(f"    ✅ Банк вернул новое согласие {consent_id}")
+            log.info("consent.created", "✅ Банк вернул новое согласие", bank=cfg.code, consent_id=consent_id)
         else:
-            print(f"    ⚠️  Банк не вернул ID согласия. Данные: {data}")
+            log.warning("consent.no_id", "⚠️  Банк не вернул ID согласия", bank=cfg.code, keys=sorted(data))
     
     return BankConsentState(
         consent_id=consent_id, 
@@ -183,7 +122,7 @@ async def fetch_consent_status(cfg: BankConfig, token: str, consent_id: Optional
         return BankConsentState(consent_id=None, status=ConsentStatus.PENDING, bank_code=cfg.code, client_id=client_id, expires_at=None, last_synced_at=datetime.utcnow(), request_id=request_id)
     
     try:
-        response = await _http_get(cfg, f"/account-consents/{check_id}", headers=headers)
+        response = await _http_get(cfg, f"/account-consents/{check_id}", headers=headers, operation="consent")
         if response.status_code >= 400:
             return BankConsentState(consent_id=consent_id, status=ConsentStatus.PENDING, bank_code=cfg.code, client_id=client_id, expires_at=None, last_synced_at=datetime.utcnow(), request_id=request_id)
         data = response.json()
@@ -192,163 +131,489 @@ async def fetch_consent_status(cfg: BankConfig, token: str, consent_id: Optional
         updated_request_id = data.get("request_id") or request_id
         return BankConsentState(consent_id=updated_consent_id, status=status, bank_code=cfg.code, client_id=client_id, expires_at=None, last_synced_at=datetime.utcnow(), request_id=updated_request_id)
     except Exception as e:
-        print(f"    ⚠️  Ошибка при проверке статуса согласия {check_id}: {e}")
+        log.warning("consent.status_failed", "⚠️  Ошибка при проверке статуса согласия", bank=cfg.code, consent_id=check_id, error=repr(e))
         return BankConsentState(consent_id=consent_id, status=ConsentStatus.PENDING, bank_code=cfg.code, client_id=client_id, expires_at=None, last_synced_at=datetime.utcnow(), request_id=request_id)
 
 async def ensure_consent(bank_code: str, client_id: str, token: str, force_new: bool = False) -> BankConsentState:
     cfg = BANK_CONFIGS[bank_code]
-    key = (bank_code, client_id)
-    existing = bank_consents_by_key.get(key)
+    existing = await load_consent(bank_code, client_id)
     
     if force_new and existing and existing.consent_id:
-        print(f"    🔄 Отзываю старое согласие {existing.consent_id} для {bank_code}...")
+        log.info("consent.revoke", "🔄 Отзываю старое согласие", bank=bank_code, consent_id=existing.consent_id)
         try:
             await revoke_consent_remote(cfg, token, existing.consent_id)
-            bank_consents_by_key.pop(key, None)
-            bank_consents_by_id.pop(existing.consent_id, None)
-            print(f"    ✅ Старое согласие отозвано")
+            await forget_consent(existing)
+            log.info("consent.revoked", "✅ Старое согласие отозвано", bank=bank_code, consent_id=existing.consent_id)
         except Exception as e:
-            print(f"    ⚠️  Не удалось отозвать старое согласие (может быть уже отозвано): {e}")
+            log.warning("consent.revoke_failed", "⚠️  Не удалось отозвать старое согласие (может быть уже отозвано)",
+                        bank=bank_code, consent_id=existing.consent_id, error=repr(e))
     
     if existing and existing.status == ConsentStatus.ACTIVE and not force_new:
         return existing
     
     if existing and existing.status == ConsentStatus.PENDING and not force_new:
-        print(f"    ℹ️  Использую существующее pending согласие для {bank_code} (request_id={existing.request_id})")
+        log.debug("consent.pending_reused", "ℹ️  Использую существующее pending согласие", bank=bank_code, request_id=existing.request_id)
         return existing
     
-    async with _get_consent_lock(bank_code, client_id):
-        existing = bank_consents_by_key.get(key)
+    # Локальная блокировка выстраивает корутины процесса, общая — воркеры, чтобы согласие создал только один
+    async with consent_registry.locks.hold((bank_code, client_id)), state_backend.lock(f"consent:{bank_code}:{client_id}"):
+        existing = await load_consent(bank_code, client_id)
         if existing and existing.status == ConsentStatus.ACTIVE and not force_new:
             return existing
         
         if existing and existing.status == ConsentStatus.PENDING and not force_new:
-            print(f"    ℹ️  Использую существующее pending согласие для {bank_code} (request_id={existing.request_id})")
+            log.debug("consent.pending_reused", "ℹ️  Использую существующее pending согласие", bank=bank_code, request_id=existing.request_id)
             return existing
         
         if force_new and existing and existing.consent_id:
-            print(f"    🔄 Отзываю старое согласие {existing.consent_id} для {bank_code} (внутри lock)...")
+            log.info("consent.revoke", "🔄 Отзываю старое согласие (внутри lock)", bank=bank_code, consent_id=existing.consent_id)
             try:
                 await revoke_consent_remote(cfg, token, existing.consent_id)
-                print(f"    ✅ Старое согласие отозвано (внутри lock)")
+                log.info("consent.revoked", "✅ Старое согласие отозвано (внутри lock)", bank=bank_code, consent_id=existing.consent_id)
             except Exception as e:
-                print(f"    ⚠️  Не удалось отозвать старое согласие (внутри lock): {e}")
+                log.warning("consent.revoke_failed", "⚠️  Не удалось отозвать старое согласие (внутри lock)",
+                            bank=bank_code, consent_id=existing.consent_id, error=repr(e))
         
-        print(f"    📝 Запрашиваю новое согласие для {bank_code}...")
+        log.info("consent.requesting", "📝 Запрашиваю новое согласие", bank=bank_code, client=client_id)
         state = await request_account_consent(cfg, token, client_id)
-        print(f"    📋 Банк вернул: consentId={state.consent_id}, status={state.status.value}")
+        log.info("consent.received", "📋 Банк вернул согласие", bank=bank_code, consent_id=state.consent_id, status=state.status.value)
         
-        if not cfg.auto_approve:
-            bank_consents_by_key[key] = state
-            if state.consent_id:
-                bank_consents_by_id[state.consent_id] = state
-            return state
-        if state.status != ConsentStatus.ACTIVE:
-            if not state.consent_id and state.request_id:
-                print(f"    ⏳ Ожидаю активации согласия для {bank_code} (request_id={state.request_id})...")
-                for i in range(40):
-                    await asyncio.sleep(cfg.poll_interval)
-                    state = await fetch_consent_status(cfg, token, state.consent_id, client_id, state.request_id)
-                    if state.status == ConsentStatus.ACTIVE:
-                        print(f"    ✅ Согласие активировано для {bank_code}")
-                        break
-                    if i % 5 == 0:
-                        print(f"    ⏳ Проверка {i+1}/40: status={state.status.value}")
-            elif state.consent_id:
-                print(f"    ⏳ Ожидаю активации согласия для {bank_code}...")
-                for i in range(40):
-                    await asyncio.sleep(cfg.poll_interval)
-                    state = await fetch_consent_status(cfg, token, state.consent_id, client_id, state.request_id)
-                    if state.status == ConsentStatus.ACTIVE:
-                        print(f"    ✅ Согласие активировано для {bank_code}")
-                        break
-                    if i % 5 == 0:
-                        print(f"    ⏳ Проверка {i+1}/40: status={state.status.value}")
+        await save_consent(state)
+        if state.status == ConsentStatus.PENDING:
+            if state.consent_id or state.request_id:
+                log.info("consent.awaiting", "⏳ Согласие ожидает активации, проверка в фоне", bank=bank_code, request_id=state.request_id)
+                consent_scheduler.track(state)
             else:
-                print(f"    ⚠️  Банк {bank_code} не вернул ID согласия. Возможно, нужно подождать или проверить вручную.")
-        bank_consents_by_key[key] = state
-        if state.consent_id:
-            bank_consents_by_id[state.consent_id] = state
+                log.warning("consent.no_id", "⚠️  Банк не вернул ID согласия. Возможно, нужно подождать или проверить вручную", bank=bank_code)
+        else:
+            consent_scheduler.untrack(bank_code, client_id)
         return state
 
+def _consent_record(state: BankConsentState) -> Dict[str, Any]:
+    return {
+        "consent_id": state.consent_id,
+        "status": state.status.value,
+        "bank_code": state.bank_code,
+        "client_id": state.client_id,
+        "expires_at": state.expires_at.isoformat() if state.expires_at else None,
+        "last_synced_at": state.last_synced_at.isoformat(),
+        "request_id": state.request_id,
+    }
+
+def _consent_from_record(record: Dict[str, Any]) -> BankConsentState:
+    return BankConsentState(
+        consent_id=record.get("consent_id"),
+        status=ConsentStatus(record["status"]),
+        bank_code=record["bank_code"],
+        client_id=record["client_id"],
+        expires_at=datetime.fromisoformat(record["expires_at"]) if record.get("expires_at") else None,
+        last_synced_at=datetime.fromisoformat(record["last_synced_at"]),
+        request_id=record.get("request_id"),
+    )
+
+async def save_consent(state: BankConsentState) -> None:
+    """Запоминает согласие локально и в state_backend, чтобы его видели остальные воркеры"""
+    previous = consent_registry.get(state.bank_code, state.client_id)
+    consent_registry.put(state)
+    if previous is None or previous.status != state.status or previous.consent_id != state.consent_id:
+        _publish_consent(state, state.status.value)
+    ttl = consent_registry.ttl_for(state)
+    await state_backend.set("consents", f"{state.bank_code}:{state.client_id}", _consent_record(state), ttl=ttl)
+    for alias in (state.consent_id, state.request_id):
+        if alias:
+            await state_backend.set("consent_ids", alias, {"bank_code": state.bank_code, "client_id": state.client_id}, ttl=ttl)
+
+def _publish_consent(state: BankConsentState, status: str) -> None:
+    event_bus.publish(state.bank_code, state.client_id, "consent", {"consentId": state.consent_id, "requestId": state.request_id, "status": status})
+
+async def forget_consent(state: BankConsentState) -> None:
+    if consent_registry.remove(state):
+        _publish_consent(state, ConsentStatus.REVOKED.value)
+    for alias in (state.consent_id, state.request_id):
+        if alias:
+            await state_backend.delete("consent_ids", alias)
+    await state_backend.delete("consents", f"{state.bank_code}:{state.client_id}")
+
+async def load_consent(bank_code: str, client_id: str) -> Optional[BankConsentState]:
+    """Текущее согласие клиента; при общем state_backend сверяет локальную копию с тем, что записали другие воркеры"""
+    local = consent_registry.get(bank_code, client_id)
+    if not state_backend.shared:
+        return local
+    record = await state_backend.get("consents", f"{bank_code}:{client_id}")
+    return _reconcile_consent(bank_code, client_id, local, record)
+
+async def load_consents(pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[BankConsentState]]:
+    """Согласия многих пар (банк, клиент) одним обращением к state_backend вместо запроса на каждую"""
+    pairs = list(pairs)
+    if not state_backend.shared:
+        return {pair: consent_registry.get(*pair) for pair in pairs}
+    records = await state_backend.get_many("consents", [f"{bank_code}:{client_id}" for bank_code, client_id in pairs])
+    return {(bank_code, client_id): _reconcile_consent(bank_code, client_id, consent_registry.get(bank_code, client_id),
+                                                       records.get(f"{bank_code}:{client_id}"))
+            for bank_code, client_id in pairs}
+
+def _reconcile_consent(bank_code: str, client_id: str, local: Optional[BankConsentState],
+                       record: Optional[Dict[str, Any]]) -> Optional[BankConsentState]:
+    if record is None:
+        if local is not None:
+            # Согласие отозвали в другом воркере
+            consent_registry.remove(local)
+            consent_scheduler.untrack(bank_code, client_id)
+        return None
+    if local is not None and _consent_record(local) == record:
+        return local
+    state = _consent_from_record(record)
+    consent_registry.put(state)
+    if state.status == ConsentStatus.PENDING and (state.consent_id or state.request_id):
+        consent_scheduler.track(state)
+    return state
+
+async def find_consent(consent_id: str) -> Optional[BankConsentState]:
+    """Согласие по consent_id или request_id"""
+    state = consent_registry.find(consent_id)
+    if state is not None or not state_backend.shared:
+        return state
+    owner = await state_backend.get("consent_ids", consent_id)
+    if owner is None:
+        return None
+    return await load_consent(owner["bank_code"], owner["client_id"])
+
+async def _check_pending_consents(bank_code: str, states: List[BankConsentState]) -> List[BankConsentState]:
+    """Проверяет пачку pending-согласий банка одним токеном, не больше cfg.max_concurrency запросов одновременно"""
+    cfg = BANK_CONFIGS[bank_code]
+    token = await ensure_bank_token(bank_code)
+    semaphore = bank_fetch_semaphores[bank_code]
+
+    async def check(state: BankConsentState) -> BankConsentState:
+        async with semaphore:
+            return await fetch_consent_status(cfg, token, state.consent_id, state.client_id, state.request_id)
+
+    updated = await asyncio.gather(*(check(state) for state in states))
+    for old, new in zip(states, updated):
+        # Пока шла проверка, согласие могли пересоздать — не перетираем новое состояние
+        if consent_registry.get(old.bank_code, old.client_id) is old:
+            await save_consent(new)
+    return list(updated)
+
+consent_scheduler = ConsentScheduler(_check_pending_consents)
+
 async def revoke_consent_remote(cfg: BankConfig, token: str, consent_id: str) -> None:
     headers = {"Authorization": f"Bearer {token}", "X-Requesting-Bank": TEAM_LOGIN}
     try:
-        await _http_delete(cfg, f"/account-consents/{consent_id}", headers=headers)
+        await _http_delete(cfg, f"/account-consents/{consent_id}", headers=headers, operation="consent")
     except Exception:
         pass
 
-async def fetch_bank_accounts(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str) -> List[Dict[str, Any]]:
+async def fetch_bank_accounts(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str) -> List[Account]:
     headers = {"Authorization": f"Bearer {token}", "X-Requesting-Bank": TEAM_LOGIN, "X-Consent-Id": consent.consent_id}
-    resp = await _http_get(cfg, "/accounts", headers=headers, params={"client_id": client_id})
+    resp = await _http_get(cfg, "/accounts", headers=headers, params={"client_id": client_id}, operation="accounts")
+    # Ошибка банка — исключение, а не пустой список: иначе она стала бы «успешными» данными в bank_last_good
+    if resp.status_code >= 400:
+        raise Exception(f"Bank API error: {resp.status_code}")
     data = resp.json()
     if isinstance(data, dict) and "items" in data:
-        return data["items"]
-    return data if isinstance(data, list) else []
+        data = data["items"]
+    return parse_accounts(data if isinstance(data, list) else [], cfg.code, client_id)
 
-async def fetch_bank_transactions(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str,
-                                  account_id: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+def _page_has_more(data: Any, offset: int, count: int) -> Optional[bool]:
+    """Есть ли следующая страница по самому ответу: ссылка next или общее число записей; None — банк не сообщил"""
+    if not isinstance(data, dict):
+        return None
+    links = data.get("links") or data.get("Links")
+    if isinstance(links, dict) and links:
+        return bool(links.get("next") or links.get("Next"))
+    if "next" in data:
+        return bool(data["next"])
+    meta = data.get("meta") or data.get("Meta")
+    for source in (data, meta if isinstance(meta, dict) else {}):
+        for field_name in ("total", "totalCount", "totalRecords"):
+            total = source.get(field_name)
+            if total is not None:
+                try:
+                    return offset + count < int(total)
+                except (TypeError, ValueError):
+                    return None
+    return None
+
+async def _fetch_transactions_page(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str, account_id: str,
+                                   limit: int, offset: int, from_date: Optional[str] = None,
+                                   to_date: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[bool]]:
+    """Страница транзакций и признак следующей страницы (None, если банк его не передаёт)"""
     headers = {"Authorization": f"Bearer {token}", "X-Requesting-Bank": TEAM_LOGIN, "X-Consent-Id": consent.consent_id}
+    params: Dict[str, Any] = {"client_id": client_id, "limit": limit, "offset": offset}
+    if from_date and cfg.transactions_from_param:
+        params[cfg.transactions_from_param] = from_date
+    if to_date and cfg.transactions_to_param:
+        params[cfg.transactions_to_param] = to_date
+    resp = await _http_get(cfg, f"/accounts/{account_id}/transactions", headers=headers, params=params, operation="transactions")
+    if resp.status_code >= 400:
+        raise Exception(f"Bank API error: {resp.status_code}")
+    data = resp.json()
+    if isinstance(data, dict) and "items" in data:
+        items = data["items"]
+    else:
+        items = data if isinstance(data, list) else []
+    return items, _page_has_more(data, offset, len(items))
+
+@dataclass
+class TransactionWalk:
+    """Чем закончился обход iter_bank_transactions: complete=False — упёрлись в max_pages, offset — откуда продолжать"""
+    offset: int = 0
+    complete: bool = False
+
+async def iter_bank_transactions(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str, account_id: str,
+                                 *, from_date: Optional[str] = None, to_date: Optional[str] = None, offset: int = 0,
+                                 page_size: Optional[int] = None, max_pages: Optional[int] = None,
+                                 walk: Optional[TransactionWalk] = None) -> AsyncIterator[Transaction]:
+    """Транзакции счёта в порядке банка; следующая страница запрашивается только когда потребитель дочитал текущую"""
+    walk = walk if walk is not None else TransactionWalk()
+    walk.offset, walk.complete = offset, False
+    page_size = page_size or cfg.transactions_page_size
+    from_ts = parse_timestamp(from_date)
+    to_ts = parse_timestamp(to_date, end_of_day=True)
+    served_page_size: Optional[int] = None  # банк может урезать limit до своего максимума — узнаём его по первой странице
+    newest_first: Optional[bool] = None  # порядок банка — по первой странице, где даты различаются
+    for _ in range(max_pages or cfg.max_sync_pages):
+        page, has_more = await _fetch_transactions_page(cfg, token, consent, client_id, account_id, page_size, offset, from_date, to_date)
+        txs = [Transaction.from_raw(raw, cfg.code, account_id) for raw in page if isinstance(raw, dict)]
+        if newest_first is None:
+            stamps = [tx.timestamp for tx in txs if tx.timestamp is not None]
+            if stamps and stamps[0] != stamps[-1]:
+                newest_first = stamps[0] > stamps[-1]
+        for tx in txs:
+            # Фильтр повторяем на своей стороне: банк мог проигнорировать параметры
+            ts = tx.timestamp
+            if ts is not None and to_ts is not None and ts > to_ts:
+                continue
+            if ts is not None and from_ts is not None and ts < from_ts:
+                if newest_first:
+                    walk.complete = True
+                    return  # дальше только более старые — окно закончилось
+                continue  # от старых к новым (или порядок ещё неизвестен): нужное окно впереди
+            yield tx
+        # Страница короче запрошенной — ещё не конец: конец это пустая страница, has_more=False
+        # или страница короче той, что банк уже отдавал
+        offset += len(page)
+        walk.offset = offset
+        if not page or has_more is False or (has_more is None and served_page_size is not None and len(page) < served_page_size):
+            walk.complete = True
+            return
+        served_page_size = len(page) if served_page_size is None else min(served_page_size, len(page))
+
+async def fetch_bank_transactions(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str,
+                                  account_id: Optional[str] = None, limit: int = 50, offset: int = 0,
+                                  from_date: Optional[str] = None, to_date: Optional[str] = None) -> List[Transaction]:
     if account_id:
-        resp = await _http_get(cfg, f"/accounts/{account_id}/transactions", headers=headers, params={"client_id": client_id, "limit": limit, "offset": offset})
-        data = resp.json()
-        if isinstance(data, dict) and "items" in data:
-            return data["items"]
-        return data if isinstance(data, list) else []
+        collected: List[Transaction] = []
+        if limit <= 0:
+            return collected
+        async for tx in iter_bank_transactions(cfg, token, consent, client_id, account_id, from_date=from_date, to_date=to_date,
+                                               offset=offset, page_size=limit):
+            collected.append(tx)
+            if len(collected) >= limit:
+                break
+        return collected
     accounts = await fetch_bank_accounts(cfg, token, consent, client_id)
-    aggregated: List[Dict[str, Any]] = []
-    for acc in accounts:
-        acc_id = acc.get("id") or acc.get("account_id")
-        if not acc_id:
-            continue
-        nested = await fetch_bank_transactions(cfg, token, consent, client_id, acc_id, limit, offset)
-        for tx in nested:
-            tx.setdefault("accountId", acc_id)
-            aggregated.append(tx)
+    aggregated, errors = await _fetch_accounts_transactions(cfg, token, consent, client_id, accounts, limit, offset, from_date, to_date)
+    for err in errors:
+        log.warning("transactions.failed", "⚠️  Не удалось получить транзакции счёта", bank=cfg.code, account=err["accountId"], error=err["error"])
     return aggregated
 
-async def gather_bank_data(bank_code: str, client_id: str, *, account_limit: int = 50, transaction_limit: int = 100, force_new_consent: bool = False) -> Dict[str, Any]:
-    token = await ensure_bank_token(bank_code)
-    cfg = BANK_CONFIGS[bank_code]
-    consent = await ensure_consent(bank_code, client_id, token, force_new=force_new_consent)
-    if consent.status != ConsentStatus.ACTIVE:
-        return {"bank": bank_code, "accounts": [], "transactions": [], "consentStatus": consent.status.value}
-    accounts = await fetch_bank_accounts(cfg, token, consent, client_id)
-    accounts = accounts[:account_limit]
-    transactions: List[Dict[str, Any]] = []
-    for acc in accounts:
-        acc_id = acc.get("id") or acc.get("account_id")
-        if not acc_id:
+async def _fetch_accounts_transactions(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str,
+                                       accounts: List[Account], limit: int = 50, offset: int = 0,
+                                       from_date: Optional[str] = None, to_date: Optional[str] = None) -> Tuple[List[Transaction], List[Dict[str, Any]]]:
+    """Параллельно (не больше cfg.max_concurrency) загружает транзакции счетов, сохраняя порядок и ошибки по счетам"""
+    semaphore = bank_fetch_semaphores[cfg.code]
+
+    async def fetch_one(acc_id: str) -> List[Transaction]:
+        async with semaphore:
+            return await fetch_bank_transactions(cfg, token, consent, client_id, acc_id, limit, offset, from_date, to_date)
+
+    account_ids = [acc.account_id for acc in accounts if acc.account_id]
+    results = await asyncio.gather(*(fetch_one(acc_id) for acc_id in account_ids), return_exceptions=True)
+    transactions: List[Transaction] = []
+    errors: List[Dict[str, Any]] = []
+    for acc_id, res in zip(account_ids, results):
+        if isinstance(res, BaseException):
+            errors.append({"accountId": acc_id, "error": str(res) or res.__class__.__name__})
             continue
-        txs = await fetch_bank_transactions(cfg, token, consent, client_id, acc_id, transaction_limit)
-        for tx in txs:
-            tx.setdefault("bank", bank_code)
-            tx.setdefault("accountId", acc_id)
-            transactions.append(tx)
-    return {"bank": bank_code, "accounts": accounts, "transactions": transactions, "consentStatus": consent.status.value}
-
-async def aggregate_banks(client_mapping: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
-    mapping = client_mapping or DEFAULT_BANK_CLIENTS
-    results: List[Tuple[str, Any]] = []
-    tasks = [(code, asyncio.create_task(gather_bank_data(code, mapping.get(code)))) for code in BANK_CONFIGS if mapping.get(code)]
-    for bank_code, task in tasks:
+        transactions.extend(res)
+    return transactions, errors
+
+async def sync_account_transactions(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str, account_id: str,
+                                    *, page_size: Optional[int] = None, full: bool = False) -> int:
+    """Догружает в локальное хранилище только транзакции новее водяного знака; full=True — полная пересинхронизация"""
+    page_size = page_size or cfg.transactions_page_size
+    history = transaction_store.history(cfg.code, client_id, account_id)
+    async with history.lock:
+        if full:
+            history.clear()
+        # Водяной знак уходит в запрос как нижняя граница даты: банк не отдаёт то, что уже лежит в хранилище
+        since = format_timestamp(history.watermark) if history.synced_at is not None else None
+        # Прерванный лимитом страниц обход продолжается с того же смещения в том же окне. Новые транзакции
+        # сдвигают старые к концу списка, поэтому страницы могут повториться (их отсеет add), но не пропасть
+        walk = TransactionWalk()
+        fresh: List[Transaction] = []
+        async for tx in iter_bank_transactions(cfg, token, consent, client_id, account_id, from_date=since,
+                                               offset=history.resume_offset or 0, page_size=page_size, walk=walk):
+            if since and history.is_known(tx):
+                continue
+            if history.add((tx,)):
+                fresh.append(tx)
+        history.advance(datetime.utcnow(), resume_offset=None if walk.complete else walk.offset)
+        # Первичная загрузка клиент получает запросом, событием уходят только новые транзакции
+        if since and fresh:
+            event_bus.publish(cfg.code, client_id, "transactions", {"accountId": account_id, "items": fresh})
+        return len(fresh)
+
+async def _sync_accounts(cfg: BankConfig, token: str, consent: BankConsentState, client_id: str,
+                         accounts: List[Account], page_size: Optional[int] = None, full: bool = False) -> Tuple[List[Transaction], List[Dict[str, Any]]]:
+    """Синхронизирует счета клиента параллельно (не больше cfg.max_concurrency) и возвращает их историю из хранилища"""
+    # Ограничение на клиента, а не на банк: юрлица не ждут друг друга, общий поток к банку держат
+    # cfg.client_concurrency и планировщик исходящих запросов
+    semaphore = asyncio.Semaphore(cfg.max_concurrency)
+
+    async def sync_one(acc_id: str) -> int:
+        async with semaphore:
+            return await sync_account_transactions(cfg, token, consent, client_id, acc_id, page_size=page_size, full=full)
+
+    account_ids = [acc.account_id for acc in accounts if acc.account_id]
+    results = await asyncio.gather(*(sync_one(acc_id) for acc_id in account_ids), return_exceptions=True)
+    transactions: List[Transaction] = []
+    errors: List[Dict[str, Any]] = []
+    for acc_id, res in zip(account_ids, results):
+        if isinstance(res, BaseException):
+            errors.append({"accountId": acc_id, "error": str(res) or res.__class__.__name__})
+        # При ошибке отдаём то, что уже есть в хранилище
+        transactions.extend(transaction_store.transactions(cfg.code, client_id, acc_id))
+    return transactions, errors
+
+async def gather_bank_data(bank_code: str, client_id: str, *, account_limit: int = 50, transaction_limit: Optional[int] = None,
+                           force_new_consent: bool = False, full_sync: bool = False,
+                           consent: Optional[BankConsentState] = None) -> Dict[str, Any]:
+    """consent — уже загруженное согласие (aggregate_banks читает их пачкой), чтобы не перечитывать его из state_backend"""
+    if force_new_consent:
+        return await _gather_bank_data(bank_code, client_id, account_limit, transaction_limit, force_new_consent, full_sync, None)
+    key = (bank_code, client_id, account_limit, transaction_limit, full_sync)
+    return await bank_data_flight.do(key, lambda: _gather_bank_data(bank_code, client_id, account_limit, transaction_limit, False, full_sync, consent))
+
+async def _gather_bank_data(bank_code: str, client_id: str, account_limit: int, transaction_limit: Optional[int],
+                            force_new_consent: bool, full_sync: bool, consent: Optional[BankConsentState]) -> Dict[str, Any]:
+    # Клиенты одного банка собираются параллельно, но не больше cfg.client_concurrency: токен у них общий, лимит запросов тоже
+    async with bank_client_semaphores[bank_code]:
+        token = await ensure_bank_token(bank_code)
+        cfg = BANK_CONFIGS[bank_code]
+        if consent is None or consent.status != ConsentStatus.ACTIVE:
+            consent = await ensure_consent(bank_code, client_id, token, force_new=force_new_consent)
+        if consent.status != ConsentStatus.ACTIVE:
+            return {"bank": bank_code, "clientId": client_id, "accounts": [], "transactions": [], "errors": [], "consentStatus": consent.status.value}
+        accounts = await fetch_bank_accounts(cfg, token, consent, client_id)
+        accounts = accounts[:account_limit]
+        transactions, errors = await _sync_accounts(cfg, token, consent, client_id, accounts, transaction_limit, full=full_sync)
+    result = {"bank": bank_code, "clientId": client_id, "accounts": accounts, "transactions": transactions, "errors": errors,
+              "consentStatus": consent.status.value}
+    _publish_balance_deltas(bank_code, client_id, bank_last_good.get((bank_code, client_id)), accounts)
+    # Сохраняем даже если вызвавший уже не дождался (бюджет времени истёк) — пригодится следующему запросу
+    bank_last_good[(bank_code, client_id)] = {**result, "syncedAt": datetime.utcnow().isoformat()}
+    return result
+
+def _publish_balance_deltas(bank_code: str, client_id: str, previous: Optional[Dict[str, Any]], accounts: List[Account]) -> None:
+    if previous is None or not event_bus.has_subscribers(bank_code, client_id):
+        return
+    before = {acc.account_id: acc.balance for acc in previous.get("accounts", [])}
+    for acc in accounts:
+        old = before.get(acc.account_id)
+        if old is not None and old != acc.balance:
+            event_bus.publish(bank_code, client_id, "balance", {
+                "accountId": acc.account_id,
+                "balance": str(acc.balance),
+                "delta": str(acc.balance - old),
+                "currency": acc.currency,
+            })
+
+async def _gather_with_fallback(bank_code: str, client_id: str, full_sync: bool = False,
+                                consent: Optional[BankConsentState] = None) -> Dict[str, Any]:
+    """gather_bank_data в пределах бюджета банка; при разомкнутом breaker, таймауте или ошибке — последние успешные данные"""
+    cfg = BANK_CONFIGS[bank_code]
+    breaker = bank_breakers[bank_code]
+    if breaker.is_open():
+        return _stale_bank_data(bank_code, client_id, "circuit_open", BankUnavailableError(bank_code, breaker.retry_in()))
+    deadline = None if full_sync else cfg.deadline_seconds
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(gather_bank_data(bank_code, client_id, full_sync=full_sync, consent=consent), deadline)
+    except asyncio.TimeoutError:
+        bank_gather_seconds.observe(time.perf_counter() - started, bank=bank_code, outcome="deadline")
+        return _stale_bank_data(bank_code, client_id, "deadline", Exception(f"Bank {bank_code} did not answer within {cfg.deadline_seconds:.0f}s"))
+    except Exception as exc:
+        bank_gather_seconds.observe(time.perf_counter() - started, bank=bank_code, outcome="error")
+        return _stale_bank_data(bank_code, client_id, "error", exc)
+    bank_gather_seconds.observe(time.perf_counter() - started, bank=bank_code, outcome="ok")
+    return result
+
+async def refresh_account(bank_code: str, client_id: str, account_id: str) -> AccountHistory:
+    """Досинхронизирует один счёт, обращаясь только к его банку; при сбое остаётся уже сохранённая история"""
+    cfg = BANK_CONFIGS[bank_code]
+    history = transaction_store.history(bank_code, client_id, account_id)
+    if bank_breakers[bank_code].is_open():
+        return history
+    try:
+        token = await ensure_bank_token(bank_code)
+        consent = await ensure_consent(bank_code, client_id, token)
+        if consent.status == ConsentStatus.ACTIVE:
+            await asyncio.wait_for(sync_account_transactions(cfg, token, consent, client_id, account_id), cfg.deadline_seconds)
+    except Exception as exc:
+        log.warning("account.refresh_failed", "⚠️  Не удалось обновить счёт, отдаю сохранённую историю",
+                    bank=bank_code, account=account_id, error=repr(exc))
+    return history
+
+def _stale_bank_data(bank_code: str, client_id: str, reason: str, exc: Exception) -> Dict[str, Any]:
+    last = bank_last_good.get((bank_code, client_id))
+    if last is None:
+        raise exc
+    bank_stale_responses.inc(bank=bank_code, reason=reason)
+    log.warning("bank.stale", "⚠️  Отдаю последние успешные данные", bank=bank_code, synced_at=last["syncedAt"], reason=reason, error=repr(exc))
+    return {**last, "stale": True, "staleReason": reason}
+
+BankClients = Union[Dict[str, str], Iterable[Tuple[str, str]]]
+
+def _client_pairs(clients: Optional[BankClients]) -> List[Tuple[str, str]]:
+    """Уникальные пары (банк, клиент) в порядке BANK_CONFIGS; словарь bank -> client тоже принимается"""
+    items = clients or DEFAULT_BANK_CLIENTS
+    if isinstance(items, dict):
+        items = items.items()
+    order = {code: i for i, code in enumerate(BANK_CONFIGS)}
+    pairs = [(bank_code, client_id) for bank_code, client_id in dict.fromkeys(items) if client_id and bank_code in order]
+    return sorted(pairs, key=lambda pair: order[pair[0]])
+
+async def aggregate_banks(clients: Optional[BankClients] = None, *, full_sync: bool = False) -> Dict[str, Any]:
+    """Данные всех пар (банк, клиент) пользователя; пары собираются параллельно, так что время — по самой медленной"""
+    pairs = _client_pairs(clients)
+    started = time.perf_counter()
+    consents_by_pair = await load_consents(pairs)
+    results: List[Tuple[Tuple[str, str], Any]] = []
+    tasks = [(pair, asyncio.create_task(_gather_with_fallback(*pair, full_sync=full_sync, consent=consents_by_pair.get(pair))))
+             for pair in pairs]
+    for pair, task in tasks:
         try:
             res = await task
-            results.append((bank_code, res))
+            results.append((pair, res))
         except Exception as exc:
-            results.append((bank_code, exc))
-    accounts: List[Dict[str, Any]] = []
-    transactions: List[Dict[str, Any]] = []
+            results.append((pair, exc))
+    accounts: List[Account] = []
+    transactions: List[Transaction] = []
     consents: List[Dict[str, Any]] = []
-    for bank_code, res in results:
+    for (bank_code, client_id), res in results:
         if isinstance(res, Exception):
-            consents.append({"bank": bank_code, "error": str(res)})
+            consents.append({"bank": bank_code, "clientId": client_id, "error": str(res)})
             continue
-        for acc in res.get("accounts", []):
-            acc.setdefault("bank", bank_code)
-            accounts.append(acc)
-        for tx in res.get("transactions", []):
-            tx.setdefault("bank", bank_code)
-            transactions.append(tx)
-        consents.append({"bank": bank_code, "status": res.get("consentStatus")})
+        accounts.extend(res.get("accounts", []))
+        transactions.extend(res.get("transactions", []))
+        consent_entry = {"bank": bank_code, "clientId": client_id, "status": res.get("consentStatus")}
+        if res.get("errors"):
+            consent_entry["accountErrors"] = res["errors"]
+        if res.get("stale"):
+            consent_entry.update({"stale": True, "staleReason": res["staleReason"], "syncedAt": res["syncedAt"]})
+        consents.append(consent_entry)
+    aggregate_seconds.observe(time.perf_counter() - started)
     return {"accounts": accounts, "transactions": transactions, "consents": consents}
@@ -0,0 +1,111 @@
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ..banks.cache import Snapshot
+from ..banks.records import Account, Transaction
+
+
+def _timestamp(tx: Transaction) -> float:
+    return math.nan if tx.timestamp is None else tx.timestamp
+
+
+def _codes(values: List[Any], labels: Dict[Any, int]) -> np.ndarray:
+    return np.fromiter((labels.setdefault(v, len(labels)) for v in values), dtype=np.int32, count=len(values))
+
+
+@dataclass
+class SnapshotColumns:
+    """Колоночное представление снимка: суммы и коды в массивах NumPy, строятся один раз на версию снимка"""
+    balances: np.ndarray
+    account_banks: np.ndarray
+    tx_amounts: np.ndarray
+    tx_banks: np.ndarray
+    tx_accounts: np.ndarray
+    bank_labels: List[Any]
+    account_labels: List[Any]
+    account_clients: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+    tx_clients: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))  # -1 — счёт транзакции не найден
+    client_labels: List[Any] = field(default_factory=list)
+    _transactions: List[Transaction] = field(default_factory=list, repr=False)
+    _tx_timestamps: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @classmethod
+    def build(cls, accounts: List[Account], transactions: List[Transaction]) -> "SnapshotColumns":
+        banks: Dict[Any, int] = {}
+        account_ids: Dict[Any, int] = {}
+        clients: Dict[Any, int] = {}
+        balances = np.fromiter((float(a.balance) for a in accounts), dtype=np.float64, count=len(accounts))
+        tx_amounts = np.fromiter((float(t.amount) for t in transactions), dtype=np.float64, count=len(transactions))
+        account_clients = _codes([a.client_id for a in accounts], clients)
+        owners = {(a.bank, a.account_id): int(code) for a, code in zip(accounts, account_clients)}
+        return cls(
+            balances=balances,
+            account_banks=_codes([a.bank for a in accounts], banks),
+            tx_amounts=tx_amounts,
+            tx_banks=_codes([t.bank for t in transactions], banks),
+            tx_accounts=_codes([t.account_id for t in transactions], account_ids),
+            bank_labels=list(banks),
+            account_labels=list(account_ids),
+            account_clients=account_clients,
+            tx_clients=np.fromiter((owners.get((t.bank, t.account_id), -1) for t in transactions), dtype=np.int32, count=len(transactions)),
+            client_labels=list(clients),
+            _transactions=transactions,
+        )
+
+    @property
+    def tx_timestamps(self) -> np.ndarray:
+        """Unix-время транзакций (NaN без даты), строится по требованию"""
+        if self._tx_timestamps is None:
+            txs = self._transactions
+            self._tx_timestamps = np.fromiter((_timestamp(t) for t in txs), dtype=np.float64, count=len(txs))
+        return self._tx_timestamps
+
+    def summary(self) -> Dict[str, float]:
+        b = self.balances
+        return {
+            "netWorth": float(b.sum()),
+            "assets": float(b[b >= 0].sum()),
+            "liabilities": float(np.abs(b[b < 0]).sum()),
+            "cashflow": float(self.tx_amounts.sum()),
+        }
+
+    def by_client(self) -> List[Dict[str, Any]]:
+        """Те же суммы по каждому клиенту банка (юрлицу) — разбивка общего summary"""
+        size = len(self.client_labels)
+        b = self.balances
+        codes = self.account_clients
+        net = np.bincount(codes, weights=b, minlength=size)
+        assets = np.bincount(codes, weights=np.where(b >= 0, b, 0.0), minlength=size)
+        counts = np.bincount(codes, minlength=size)
+        known = self.tx_clients >= 0
+        cashflow = np.bincount(self.tx_clients[known], weights=self.tx_amounts[known], minlength=size)
+        return [{
+            "clientId": label,
+            "netWorth": float(net[i]),
+            "assets": float(assets[i]),
+            "liabilities": float(assets[i] - net[i]),
+            "cashflow": float(cashflow[i]),
+            "accounts": int(counts[i]),
+        } for i, label in enumerate(self.client_labels)]
+
+    def income_outcome(self) -> Dict[str, float]:
+        a = self.tx_amounts
+        return {"totalPositive": float(a[a > 0].sum()), "totalNegative": float(a[a < 0].sum())}
+
+    def top_account(self) -> Optional[int]:
+        """Индекс счёта с наибольшим балансом (при равенстве — первый, как у стабильной сортировки)"""
+        if not len(self.balances):
+            return None
+        return int(np.argmax(self.balances))
+
+    def unique_banks(self) -> int:
+        return sum(1 for code in np.unique(self.account_banks) if self.bank_labels[code])
+
+
+def snapshot_columns(snapshot: Snapshot) -> SnapshotColumns:
+    columns = snapshot.derived.get("columns")
+    if columns is None:
+        columns = SnapshotColumns.build(snapshot.data["accounts"], snapshot.data["transactions"])
+        snapshot.derived["columns"] = columns
+    return columns
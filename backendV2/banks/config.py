@@ -1,11 +1,34 @@
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
 TEAM_LOGIN = "team217"
 TEAM_PASSWORD = "YPbqtBmr3GdLOTTGTjXG6veu2MUlc1JJ"
 
 BANK_CLIENT_IDS: List[str] = [f"{TEAM_LOGIN}-{i}" for i in range(1, 11)]
 
+ClientPairs = Tuple[Tuple[str, str], ...]  # (bank_code, client_id) всех клиентов пользователя
+
+# Адрес банка можно подменить (например, на локальный mock-банк из benchmarks/mock_bank.py):
+# MONETRIX_BANK_BASE_URL=http://127.0.0.1:9000/{code} — для всех банков, MONETRIX_VBANK_BASE_URL — для одного
+BANK_BASE_URL_TEMPLATE = os.getenv("MONETRIX_BANK_BASE_URL")
+
+# Таймауты (секунды) для отдельных типов запросов к банку
+DEFAULT_BANK_TIMEOUTS: Dict[str, float] = {
+    "default": 30.0,
+    "token": 10.0,
+    "consent": 15.0,
+    "accounts": 20.0,
+    "transactions": 30.0,
+}
+ERROR_BODY_LIMIT = 500  # сколько символов ответа банка с ошибкой попадает в лог
+
+# Кэш агрегированных снимков данных пользователя
+SNAPSHOT_TTL_SECONDS: float = 30.0  # снимок считается свежим
+SNAPSHOT_STALE_TTL_SECONDS: float = 300.0  # сколько ещё отдаём устаревший снимок, обновляя его в фоне
+SNAPSHOT_MAX_ENTRIES: int = 1000
+SNAPSHOT_MAX_ITEMS: int = 1_000_000  # суммарное число счетов и транзакций во всех снимках
+
 
 @dataclass
 class BankConfig:
@@ -17,13 +40,51 @@ class BankConfig:
     auto_approve: bool = True
     poll_interval: float = 2.0
     poll_timeout: float = 60.0
+    poll_max_interval: float = 30.0  # верхняя граница паузы между проверками pending-согласия
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    http2: bool = False
+    max_concurrency: int = 4  # одновременных запросов транзакций по счетам одного банка
+    client_concurrency: int = 8  # одновременно собираемых клиентов банка в aggregate_banks (юрлица бизнес-пользователя)
+    bootstrap_concurrency: int = 4  # одновременных создаваемых согласий при массовом подключении клиентов
+    transactions_page_size: int = 100
+    max_sync_pages: int = 50  # ограничение глубины одной синхронизации счёта
+    # Имена query-параметров фильтра по дате бронирования; None — банк фильтр не поддерживает, режем на своей стороне
+    transactions_from_param: Optional[str] = "from_booking_date_time"
+    transactions_to_param: Optional[str] = "to_booking_date_time"
+    timeouts: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_BANK_TIMEOUTS))
+    deadline_seconds: float = 8.0  # бюджет времени банка внутри aggregate_banks; дальше отдаём последние данные
+    breaker_window: int = 20
+    breaker_min_calls: int = 5
+    breaker_failure_rate: float = 0.5
+    breaker_slow_call_seconds: float = 5.0  # более медленный ответ считается неудачным
+    breaker_open_seconds: float = 30.0
+    rate_limit_per_second: float = 20.0
+    rate_limit_burst: int = 40
+    max_retries: int = 3  # повторы только для идемпотентных GET
+    retry_backoff_base: float = 0.5
+    retry_backoff_max: float = 10.0
+
+    def timeout_for(self, operation: str) -> float:
+        return self.timeouts.get(operation) or self.timeouts.get("default") or DEFAULT_BANK_TIMEOUTS["default"]
+
+
+def bank_base_url(code: str, default: str) -> str:
+    override = os.getenv(f"MONETRIX_{code.upper()}_BASE_URL")
+    if override:
+        return override
+    if BANK_BASE_URL_TEMPLATE:
+        return BANK_BASE_URL_TEMPLATE.format(code=code)
+    return default
 
 
 BANK_CONFIGS: Dict[str, BankConfig] = {
     "vbank": BankConfig(
         code="vbank",
         name="VBank",
-        base_url="https://vbank.open.bankingapi.ru",
+        base_url=bank_base_url("vbank", "https://vbank.open.bankingapi.ru"),
         client_id=TEAM_LOGIN,
         client_secret=TEAM_PASSWORD,
         auto_approve=True,
@@ -31,7 +92,7 @@ BANK_CONFIGS: Dict[str, BankConfig] = {
     "abank": BankConfig(
         code="abank",
         name="ABank",
-        base_url="https://abank.open.bankingapi.ru",
+        base_url=bank_base_url("abank", "https://abank.open.bankingapi.ru"),
         client_id=TEAM_LOGIN,
         client_secret=TEAM_PASSWORD,
         auto_approve=True,
@@ -39,7 +100,7 @@ BANK_CONFIGS: Dict[str, BankConfig] = {
     "sbank": BankConfig(
         code="sbank",
         name="SBank",
-        base_url="https://sbank.open.bankingapi.ru",
+        base_url=bank_base_url("sbank", "https://sbank.open.bankingapi.ru"),
         client_id=TEAM_LOGIN,
         client_secret=TEAM_PASSWORD,
         auto_approve=False,
@@ -51,6 +112,11 @@ BANK_CONFIGS: Dict[str, BankConfig] = {
 DEFAULT_BANK_CLIENTS: Dict[str, str] = {code: BANK_CLIENT_IDS[0] for code in BANK_CONFIGS}
 
 
-def resolve_bank_clients(preferred_client: Optional[str] = None) -> Dict[str, str]:
-    target = preferred_client or BANK_CLIENT_IDS[0]
-    return {code: target for code in BANK_CONFIGS}
+def user_client_ids(user: Dict[str, Any]) -> List[str]:
+    """Клиенты пользователя в банках: bankClientIds у бизнеса с несколькими юрлицами, иначе один bankClientId"""
+    client_ids = user.get("bankClientIds") or [user.get("bankClientId") or BANK_CLIENT_IDS[0]]
+    return list(dict.fromkeys(client_id for client_id in client_ids if client_id))
+
+
+def resolve_user_clients(user: Dict[str, Any]) -> ClientPairs:
+    return tuple((code, client_id) for code in BANK_CONFIGS for client_id in user_client_ids(user))
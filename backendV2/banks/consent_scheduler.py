@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from ..banks.config import BANK_CONFIGS
+from ..banks.outbound import Priority, request_priority
+from ..banks.registry import ConsentKey
+from ..core.logs import get_logger
+from ..core.models import ConsentStatus
+
+# Проверка статусов пачки согласий одного банка; возвращает обновлённые состояния в том же порядке
+StatusChecker = Callable[[str, List[Any]], Awaitable[List[Any]]]
+
+log = get_logger(__name__)
+
+
+@dataclass
+class _PendingConsent:
+    state: Any
+    seq: int
+    next_check: float
+    delay: float
+    deadline: float
+
+
+class ConsentScheduler:
+    """Фоновая проверка pending-согласий: очередь по времени следующей проверки, экспоненциальная пауза до poll_timeout"""
+
+    def __init__(self, checker: StatusChecker) -> None:
+        self._checker = checker
+        self._heap: List[Tuple[float, int, ConsentKey]] = []
+        self._pending: Dict[ConsentKey, _PendingConsent] = {}
+        self._waiters: Dict[ConsentKey, List[asyncio.Future]] = {}
+        self._listeners: List[Callable[[Any, Any], None]] = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[Any, Any], None]) -> None:
+        """listener(old_state, new_state) вызывается, когда согласие вышло из pending"""
+        self._listeners.append(listener)
+
+    def track(self, state: Any) -> None:
+        cfg = BANK_CONFIGS[state.bank_code]
+        key = (state.bank_code, state.client_id)
+        now = time.monotonic()
+        entry = _PendingConsent(
+            state=state,
+            seq=next(self._seq),
+            next_check=now + cfg.poll_interval,
+            delay=cfg.poll_interval,
+            deadline=now + cfg.poll_timeout,
+        )
+        self._pending[key] = entry
+        heapq.heappush(self._heap, (entry.next_check, entry.seq, key))
+        self._ensure_running()
+        self._wake.set()
+
+    def untrack(self, bank_code: str, client_id: str) -> None:
+        # Запись в куче останется, но будет пропущена: seq больше не совпадает
+        self._pending.pop((bank_code, client_id), None)
+
+    def is_pending(self, bank_code: str, client_id: str) -> bool:
+        return (bank_code, client_id) in self._pending
+
+    async def wait(self, bank_code: str, client_id: str, timeout: Optional[float] = None) -> Optional[Any]:
+        """Ждёт выхода согласия из pending (или окончания poll_timeout); None — если согласие не отслеживается или истёк timeout"""
+        key = (bank_code, client_id)
+        if key not in self._pending:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[key]
+
+    async def start(self) -> None:
+        self._ensure_running()
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._wake = None
+
+    def _ensure_running(self) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        request_priority.set(Priority.POLLING)
+        while True:
+            self._wake.clear()
+            if not self._heap:
+                await self._wake.wait()
+                continue
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due = self._pop_due()
+            by_bank: Dict[str, List[Tuple[ConsentKey, _PendingConsent]]] = {}
+            for key, entry in due:
+                by_bank.setdefault(key[0], []).append((key, entry))
+            await asyncio.gather(*(self._check_bank(bank_code, items) for bank_code, items in by_bank.items()))
+
+    def _pop_due(self) -> List[Tuple[ConsentKey, _PendingConsent]]:
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._pending.get(key)
+            if entry is not None and entry.seq == seq:
+                due.append((key, entry))
+        return due
+
+    async def _check_bank(self, bank_code: str, items: List[Tuple[ConsentKey, _PendingConsent]]) -> None:
+        states = [entry.state for _, entry in items]
+        try:
+            updated = await self._checker(bank_code, states)
+        except Exception as e:
+            log.warning("consent.poll_failed", "⚠️  Не удалось проверить согласия", bank=bank_code, error=repr(e))
+            updated = states
+        cfg = BANK_CONFIGS[bank_code]
+        now = time.monotonic()
+        for (key, entry), new_state in zip(items, updated):
+            if self._pending.get(key) is not entry:
+                continue  # согласие пересоздали или отозвали, пока шла проверка
+            old_state, entry.state = entry.state, new_state
+            if new_state.status != ConsentStatus.PENDING:
+                self._finish(key, new_state)
+                for listener in self._listeners:
+                    listener(old_state, new_state)
+            elif now >= entry.deadline:
+                log.info("consent.poll_timeout", "⌛ Согласие не активировано, фоновая проверка остановлена",
+                         bank=bank_code, client=key[1], timeout=cfg.poll_timeout)
+                self._finish(key, new_state)
+            else:
+                entry.delay = min(entry.delay * 2, cfg.poll_max_interval)
+                entry.next_check = min(now + entry.delay, entry.deadline)
+                entry.seq = next(self._seq)
+                heapq.heappush(self._heap, (entry.next_check, entry.seq, key))
+
+    def _finish(self, key: ConsentKey, state: Any) -> None:
+        self._pending.pop(key, None)
+        for future in self._waiters.pop(key, []):
+            if not future.done():
+                future.set_result(state)
@@ -0,0 +1,73 @@
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set
+from ..banks.registry import ConsentKey
+EVENT_QUEUE_SIZE = 256  # событий в очереди подписчика; при переполнении клиент получает resync
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: Dict[str, Any]
+
+
+@dataclass
+class Subscription:
+    keys: Set[ConsentKey]
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=EVENT_QUEUE_SIZE))
+    dropped: int = 0
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Следующее событие; None, если за timeout ничего не пришло"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """Рассылка изменений по подпискам на (bank, client): каждое событие уходит только тем, кого оно касается"""
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[ConsentKey, List[Subscription]] = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, keys: Iterable[ConsentKey]) -> Subscription:
+        subscription = Subscription(keys=set(keys))
+        for key in subscription.keys:
+            self._subscribers.setdefault(key, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for key in subscription.keys:
+            subscribers = self._subscribers.get(key)
+            if subscribers and subscription in subscribers:
+                subscribers.remove(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def has_subscribers(self, bank_code: str, client_id: str) -> bool:
+        return (bank_code, client_id) in self._subscribers
+
+    def publish(self, bank_code: str, client_id: str, event_type: str, data: Dict[str, Any]) -> None:
+        subscribers = self._subscribers.get((bank_code, client_id))
+        if not subscribers:
+            return
+        event = Event(id=next(self._ids), type=event_type, data={"bank": bank_code, "clientId": client_id, **data})
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент: вместо накопления очереди просим его перечитать данные целиком
+                subscription.dropped += 1
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(Event(id=event.id, type="resync", data={}))
+
+    def __len__(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+event_bus = EventBus()
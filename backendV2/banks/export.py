@@ -0,0 +1,42 @@
+import asyncio
+import csv
+import io
+from typing import Any, AsyncIterator, Dict, Iterable, List
+from ..banks.records import Transaction, dumps
+
+EXPORT_BATCH_ROWS = 500  # строк в одном куске ответа
+CSV_COLUMNS: List[str] = ["date", "bank", "accountId", "transactionId", "amount", "currency", "description"]
+
+
+def export_row(tx: Transaction) -> Dict[str, Any]:
+    return tx.to_dict()
+
+
+async def iter_ndjson(rows: Iterable[Transaction]) -> AsyncIterator[bytes]:
+    buffer: List[bytes] = []
+    for tx in rows:
+        buffer.append(dumps(tx))  # тот же сериализатор, что у JSON-ответов API
+        if len(buffer) >= EXPORT_BATCH_ROWS:
+            yield b"\n".join(buffer) + b"\n"
+            buffer.clear()
+            await asyncio.sleep(0)
+    if buffer:
+        yield b"\n".join(buffer) + b"\n"
+
+
+async def iter_csv(rows: Iterable[Transaction]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    pending = 0
+    for tx in rows:
+        writer.writerow(export_row(tx))
+        pending += 1
+        if pending >= EXPORT_BATCH_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+            await asyncio.sleep(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
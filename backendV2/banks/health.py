@@ -0,0 +1,106 @@
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, Optional
+from ..banks.config import BANK_CONFIGS, BankConfig
+from ..core.logs import get_logger
+
+log = get_logger(__name__)
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class BankUnavailableError(Exception):
+    """Запрос не отправлен: circuit breaker банка разомкнут"""
+
+    def __init__(self, bank_code: str, retry_in: float) -> None:
+        super().__init__(f"Bank {bank_code} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.bank_code = bank_code
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Здоровье банка по последним вызовам: доля ошибок и медленных ответов в скользящем окне"""
+
+    def __init__(self, cfg: BankConfig) -> None:
+        self.bank_code = cfg.code
+        self.window = cfg.breaker_window
+        self.min_calls = cfg.breaker_min_calls
+        self.failure_rate = cfg.breaker_failure_rate
+        self.slow_call_seconds = cfg.breaker_slow_call_seconds
+        self.open_seconds = cfg.breaker_open_seconds
+        self.state = BreakerState.CLOSED
+        self.opened_at: Optional[float] = None
+        self._outcomes: Deque[bool] = deque(maxlen=self.window)  # True — неудачный или слишком медленный вызов
+        self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        if self.state != BreakerState.OPEN or self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        """Разомкнут и ещё не готов к пробному запросу"""
+        return self.state == BreakerState.OPEN and self.retry_in() > 0
+
+    def allow(self) -> bool:
+        if self.state == BreakerState.CLOSED:
+            return True
+        if self.state == BreakerState.OPEN:
+            if self.retry_in() > 0:
+                return False
+            self.state = BreakerState.HALF_OPEN
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record(self, success: bool, latency: float) -> None:
+        failed = not success or latency > self.slow_call_seconds
+        if self.state == BreakerState.HALF_OPEN:
+            self._probe_in_flight = False
+            if failed:
+                self._open()
+            else:
+                self._close()
+            return
+        if self.state == BreakerState.OPEN:
+            return
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+            self._open()
+
+    def release(self) -> None:
+        """Вызов прерван не по вине банка (отмена): исход не учитываем, пробный запрос можно повторить"""
+        if self.state == BreakerState.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _open(self) -> None:
+        if self.state != BreakerState.OPEN:
+            log.warning("breaker.open", "🔌 Circuit breaker разомкнут", bank=self.bank_code, open_seconds=self.open_seconds)
+        self.state = BreakerState.OPEN
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def _close(self) -> None:
+        log.info("breaker.closed", "🔌 Circuit breaker снова замкнут", bank=self.bank_code)
+        self.state = BreakerState.CLOSED
+        self.opened_at = None
+        self._outcomes.clear()
+
+    def describe(self) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        return {
+            "bank": self.bank_code,
+            "state": self.state.value,
+            "failureRate": (sum(self._outcomes) / calls) if calls else 0.0,
+            "calls": calls,
+            "retryIn": self.retry_in(),
+        }
+
+
+bank_breakers: Dict[str, CircuitBreaker] = {code: CircuitBreaker(cfg) for code, cfg in BANK_CONFIGS.items()}
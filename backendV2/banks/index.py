@@ -0,0 +1,127 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from ..banks.cache import Snapshot
+from ..banks.records import Transaction, parse_timestamp
+from ..banks.store import AccountHistory
+
+IndexKey = Tuple[float, str]  # (-timestamp, стабильный ключ транзакции): от новых к старым
+_MISSING_TS = float("-inf")
+
+
+def encode_cursor(key: IndexKey) -> str:
+    raw = json.dumps([key[0], key[1]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> IndexKey:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    neg_ts, tie = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    return float(neg_ts), str(tie)
+
+
+class _Postings:
+    __slots__ = ("keys", "rows")
+
+    def __init__(self) -> None:
+        self.keys: List[IndexKey] = []
+        self.rows: List[Transaction] = []
+
+
+class TransactionIndex:
+    """Транзакции снимка, отсортированные по времени, с вторичными индексами по счёту и банку"""
+
+    def __init__(self, transactions: Iterable[Transaction]) -> None:
+        keyed = []
+        for tx in transactions:
+            ts = tx.timestamp
+            tie = f"{tx.bank}:{tx.account_id}:{tx.key}"
+            keyed.append(((-(ts if ts is not None else _MISSING_TS), tie), tx))
+        keyed.sort(key=lambda item: item[0])
+        self._all = _Postings()
+        self._by_account: Dict[str, _Postings] = {}
+        self._by_bank: Dict[str, _Postings] = {}
+        self._by_bank_account: Dict[Tuple[str, str], _Postings] = {}
+        for key, tx in keyed:
+            bank = str(tx.bank)
+            account = str(tx.account_id)
+            for postings in (
+                self._all,
+                self._by_account.setdefault(account, _Postings()),
+                self._by_bank.setdefault(bank, _Postings()),
+                self._by_bank_account.setdefault((bank, account), _Postings()),
+            ):
+                postings.keys.append(key)
+                postings.rows.append(tx)
+
+    def __len__(self) -> int:
+        return len(self._all.keys)
+
+    def _postings(self, account_id: Optional[str], bank: Optional[str]) -> Optional[_Postings]:
+        if account_id and bank:
+            return self._by_bank_account.get((str(bank), str(account_id)))
+        if account_id:
+            return self._by_account.get(str(account_id))
+        if bank:
+            return self._by_bank.get(str(bank))
+        return self._all
+
+    def query(self, *, from_date: Optional[str] = None, to_date: Optional[str] = None,
+              account_id: Optional[str] = None, bank: Optional[str] = None,
+              limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Страница транзакций за O(log n + limit); cursor продолжает выдачу после последней записи предыдущей страницы"""
+        postings = self._postings(account_id, bank)
+        if postings is None:
+            return {"items": [], "total": 0, "nextCursor": None}
+        lo, hi = self._range(postings, from_date, to_date)
+        start = lo + max(offset, 0)
+        if cursor:
+            start = max(lo, bisect_right(postings.keys, decode_cursor(cursor), lo, hi))
+        end = min(hi, start + max(limit, 0))
+        items = postings.rows[start:end]
+        next_cursor = encode_cursor(postings.keys[end - 1]) if end < hi and end > start else None
+        return {"items": items, "total": hi - lo, "nextCursor": next_cursor}
+
+    def iter_range(self, *, from_date: Optional[str] = None, to_date: Optional[str] = None,
+                   account_id: Optional[str] = None, bank: Optional[str] = None) -> Iterator[Transaction]:
+        """Ленивый обход всех транзакций диапазона без копирования в список"""
+        postings = self._postings(account_id, bank)
+        if postings is None:
+            return
+        lo, hi = self._range(postings, from_date, to_date)
+        for pos in range(lo, hi):
+            yield postings.rows[pos]
+
+    @staticmethod
+    def _range(postings: _Postings, from_date: Optional[str], to_date: Optional[str]) -> Tuple[int, int]:
+        lo, hi = 0, len(postings.keys)
+        to_ts = parse_timestamp(to_date, end_of_day=True)
+        from_ts = parse_timestamp(from_date)
+        if to_ts is not None:
+            lo = bisect_left(postings.keys, (-to_ts, ""))
+        if from_ts is not None:
+            # "\U0010ffff" больше любого ключа — включаем все транзакции ровно в from_ts
+            hi = bisect_right(postings.keys, (-from_ts, "\U0010ffff"))
+        if from_ts is not None or to_ts is not None:
+            # Транзакции без даты лежат в конце и под фильтр по датам не попадают
+            hi = min(hi, bisect_left(postings.keys, (-_MISSING_TS, "")))
+        return lo, max(lo, hi)
+
+
+def transaction_index(snapshot: Snapshot) -> TransactionIndex:
+    """Индекс строится один раз на версию снимка"""
+    index = snapshot.derived.get("transactions_index")
+    if index is None:
+        index = TransactionIndex(snapshot.data["transactions"])
+        snapshot.derived["transactions_index"] = index
+    return index
+
+
+def account_index(history: AccountHistory) -> TransactionIndex:
+    """Индекс истории одного счёта; перестраивается только после появления новых транзакций"""
+    index = history.derived.get("transactions_index")
+    if index is None:
+        index = TransactionIndex(history.ordered())
+        history.derived["transactions_index"] = index
+    return index
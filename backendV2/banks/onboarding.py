@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from ..banks.cache import snapshot_cache
+from ..banks.client import ensure_bank_token, ensure_consent
+from ..banks.config import BANK_CONFIGS
+from ..banks.outbound import Priority, priority
+from ..core.logs import get_logger
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+log = get_logger(__name__)
+
+bank_bootstrap_semaphores: Dict[str, asyncio.Semaphore] = {code: asyncio.Semaphore(cfg.bootstrap_concurrency) for code, cfg in BANK_CONFIGS.items()}
+
+
+def _log_progress(event: Dict[str, Any]) -> None:
+    log.info("onboarding.progress", f"[{event['completed']}/{event['total']}]", bank=event["bank"], client=event["clientId"],
+             status=event.get("status"), error=event.get("error"))
+
+
+async def bootstrap_consents(client_ids: Iterable[str], *, banks: Optional[Iterable[str]] = None, force_new: bool = False,
+                             on_progress: Optional[ProgressCallback] = _log_progress) -> Dict[str, Any]:
+    """Создаёт согласия для всех пар (банк, клиент) параллельно: банки независимы, внутри банка — не больше cfg.bootstrap_concurrency"""
+    bank_codes = [code for code in (banks or BANK_CONFIGS) if code in BANK_CONFIGS]
+    clients = list(dict.fromkeys(client_ids))
+    total = len(bank_codes) * len(clients)
+    progress = {"completed": 0}
+    results: Dict[str, List[Dict[str, Any]]] = {code: [] for code in bank_codes}
+
+    async def bootstrap_bank(bank_code: str) -> None:
+        try:
+            token = await ensure_bank_token(bank_code)
+        except Exception as e:
+            for client_id in clients:
+                report(bank_code, {"clientId": client_id, "error": f"token: {e}"})
+            return
+        await asyncio.gather(*(bootstrap_one(bank_code, client_id, token) for client_id in clients))
+
+    async def bootstrap_one(bank_code: str, client_id: str, token: str) -> None:
+        async with bank_bootstrap_semaphores[bank_code]:
+            try:
+                state = await ensure_consent(bank_code, client_id, token, force_new=force_new)
+                snapshot_cache.invalidate(bank_code, client_id)
+                entry = {"clientId": client_id, "consentId": state.consent_id, "status": state.status.value, "requestId": state.request_id}
+            except Exception as e:
+                entry = {"clientId": client_id, "error": str(e)}
+        report(bank_code, entry)
+
+    def report(bank_code: str, entry: Dict[str, Any]) -> None:
+        results[bank_code].append(entry)
+        progress["completed"] += 1
+        if on_progress:
+            on_progress({"bank": bank_code, "completed": progress["completed"], "total": total, **entry})
+
+    # Массовое подключение не должно отнимать лимит запросов у интерактивных пользователей
+    with priority(Priority.BACKGROUND):
+        await asyncio.gather(*(bootstrap_bank(code) for code in bank_codes))
+    # Порядок внутри банка — как во входном списке, независимо от порядка завершения
+    order = {client_id: i for i, client_id in enumerate(clients)}
+    for entries in results.values():
+        entries.sort(key=lambda entry: order[entry["clientId"]])
+    return {"total": total, "completed": progress["completed"], "results": results}
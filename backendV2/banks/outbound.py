@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from ..banks.config import BANK_CONFIGS, BankConfig
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # запросы пользователя (дашборд, согласия из UI)
+    BACKGROUND = 1  # фоновая синхронизация, прогрев, массовое подключение
+    POLLING = 2  # опрос статусов pending-согласий
+
+
+request_priority: ContextVar[Priority] = ContextVar("bank_request_priority", default=Priority.INTERACTIVE)
+shared_priority: ContextVar[Optional["SharedPriority"]] = ContextVar("bank_shared_priority", default=None)
+
+
+@contextmanager
+def priority(level: Priority) -> Iterator[None]:
+    """Все запросы к банкам внутри блока (и в созданных в нём задачах) идут в указанной полосе,
+    даже если блок выполняется внутри общего вызова с более высокой полосой"""
+    token = request_priority.set(level)
+    shared_token = shared_priority.set(None)
+    try:
+        yield
+    finally:
+        shared_priority.reset(shared_token)
+        request_priority.reset(token)
+
+
+class SharedPriority:
+    """Полоса общего вызова (SingleFlight): присоединившийся более срочный запрос повышает её для всех запросов вызова,
+    в том числе уже стоящих в очереди и вложенных общих вызовов"""
+
+    def __init__(self, level: Priority, parent: Optional["SharedPriority"] = None) -> None:
+        self.level = level
+        self._children: "weakref.WeakSet[SharedPriority]" = weakref.WeakSet()
+        self._queued: Dict[asyncio.Future, "OutboundScheduler"] = {}
+        if parent is not None:
+            parent._children.add(self)
+
+    def raise_to(self, level: Priority) -> None:
+        if level >= self.level:
+            return
+        self.level = level
+        for future, scheduler in list(self._queued.items()):
+            scheduler._requeue(future, level)
+        for child in list(self._children):
+            child.raise_to(level)
+
+
+def current_priority() -> Priority:
+    """Полоса текущего запроса с учётом повышения общего вызова, внутри которого он выполняется"""
+    level = request_priority.get()
+    shared = shared_priority.get()
+    return Priority(min(level, shared.level)) if shared is not None else level
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(cfg: BankConfig, attempt: int, retry_after: Optional[float] = None) -> float:
+    """Экспоненциальная пауза с джиттером, но не меньше Retry-After"""
+    delay = min(cfg.retry_backoff_max, cfg.retry_backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.5)
+    return max(delay, retry_after or 0.0)
+
+
+class OutboundScheduler:
+    """Token bucket банка с очередью по приоритетам: свободный слот всегда получает самая приоритетная полоса"""
+
+    def __init__(self, cfg: BankConfig) -> None:
+        self.bank_code = cfg.code
+        self.rate = cfg.rate_limit_per_second
+        self.burst = cfg.rate_limit_burst
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"granted": 0, "queued": 0, "throttled": 0, "retries": 0}
+
+    async def acquire(self, level: Optional[Priority] = None) -> None:
+        shared = shared_priority.get() if level is None else None
+        level = current_priority() if level is None else level
+        if not self._waiters and self._wait_time() <= 0:
+            self._take()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(level), next(self._seq), future))
+        self.stats["queued"] += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if shared is None:
+            await future
+            return
+        shared._queued[future] = self
+        try:
+            await future
+        finally:
+            shared._queued.pop(future, None)
+
+    def defer(self, seconds: float) -> None:
+        """Банк попросил подождать (429 / Retry-After): приостанавливаем все полосы"""
+        self.stats["throttled"] += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def queued(self) -> Dict[str, int]:
+        counts = {level.name.lower(): 0 for level in Priority}
+        seen = set()
+        # Повышенный ожидающий лежит в куче дважды; считаем его по первой (самой приоритетной) записи
+        for level, _, future in sorted(self._waiters, key=lambda waiter: waiter[:2]):
+            if not future.done() and id(future) not in seen:
+                seen.add(id(future))
+                counts[Priority(level).name.lower()] += 1
+        return counts
+
+    def _requeue(self, future: asyncio.Future, level: Priority) -> None:
+        """Повышение полосы: новая запись в куче; старая останется и будет пропущена, когда future уже выполнен"""
+        if not future.done():
+            heapq.heappush(self._waiters, (int(level), next(self._seq), future))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _wait_time(self) -> float:
+        self._refill()
+        blocked = self._blocked_until - time.monotonic()
+        missing = (1.0 - self._tokens) / self.rate if self._tokens < 1.0 else 0.0
+        return max(blocked, missing, 0.0)
+
+    def _take(self) -> None:
+        self._tokens -= 1.0
+        self.stats["granted"] += 1
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            wait = self._wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # ожидающий отменён
+            self._take()
+            future.set_result(None)
+
+
+bank_outbound: Dict[str, OutboundScheduler] = {code: OutboundScheduler(cfg) for code, cfg in BANK_CONFIGS.items()}
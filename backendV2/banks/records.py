@@ -0,0 +1,194 @@
+import hashlib
+import json
+import re
+import sys
+from datetime import datetime, time as dt_time, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import orjson  # быстрый сериализатор ответов (pip install orjson), без него работает stdlib json
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+ZERO = Decimal(0)
+_DEBIT_INDICATORS = frozenset({"debit", "dbit"})
+_PARTIAL_DATE = re.compile(r"^(\d{4})(?:-(\d{2}))?$")  # "2024" или "2024-01", как принимал фильтр дашборда
+
+
+def transaction_date(tx: Dict[str, Any]) -> str:
+    return str(tx.get("bookingDateTime") or tx.get("date") or tx.get("transactionDate") or "")
+
+
+def parse_timestamp(value: Optional[str], *, end_of_day: bool = False) -> Optional[float]:
+    if not value:
+        return None
+    text = str(value).strip()
+    partial = _PARTIAL_DATE.match(text)
+    try:
+        if partial:
+            # Неполная дата — начало года или месяца, с end_of_day — последний момент периода
+            year, month = int(partial.group(1)), int(partial.group(2) or 0)
+            moment = datetime(year, month or 1, 1)
+            if end_of_day:
+                following = datetime(year + month // 12, month % 12 + 1, 1) if month else datetime(year + 1, 1, 1)
+                moment = following - timedelta(microseconds=1)
+        elif len(text) == 10:
+            day = datetime.fromisoformat(text).date()
+            moment = datetime.combine(day, dt_time.max if end_of_day else dt_time.min)
+        else:
+            moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def transaction_key(tx: Dict[str, Any]) -> str:
+    tx_id = tx.get("transactionId") or tx.get("transaction_id") or tx.get("id")
+    if tx_id:
+        return str(tx_id)
+    # Банк не дал идентификатор — используем стабильный хэш содержимого
+    raw = json.dumps(tx, sort_keys=True, default=str, ensure_ascii=False)
+    return "h:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def parse_amount(value: Any) -> Decimal:
+    """Сумма без потерь точности; вложенный {"amount": ..., "currency": ...} разворачивается, мусор считается нулём"""
+    if isinstance(value, dict):
+        value = value.get("amount", value.get("value"))
+    if value is None or isinstance(value, bool):
+        return ZERO
+    try:
+        amount = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return ZERO
+    return amount if amount.is_finite() else ZERO
+
+
+def _intern(value: Any) -> Optional[str]:
+    return sys.intern(str(value)) if value else None
+
+
+def _currency(raw: Dict[str, Any], *fields: str) -> Optional[str]:
+    for name in fields:
+        value = raw.get(name)
+        if isinstance(value, dict) and value.get("currency"):
+            return _intern(value["currency"])
+    return _intern(raw.get("currency"))
+
+
+def format_timestamp(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class Account:
+    """Счёт в нормализованном виде; исходный JSON банка не хранится"""
+    __slots__ = ("account_id", "bank", "name", "account_type", "balance", "currency", "client_id")
+
+    def __init__(self, account_id: str, bank: str, name: Optional[str], account_type: Optional[str],
+                 balance: Decimal, currency: Optional[str], client_id: Optional[str] = None) -> None:
+        self.account_id = account_id
+        self.bank = bank
+        self.name = name
+        self.account_type = account_type
+        self.balance = balance
+        self.currency = currency
+        self.client_id = client_id  # клиент банка (юрлицо), чьи данные вернул банк
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any], bank: str, client_id: Optional[str] = None) -> "Account":
+        account_id = raw.get("id") or raw.get("accountId") or raw.get("account_id") or raw.get("number")
+        return cls(
+            account_id=str(account_id) if account_id else "",
+            bank=_intern(raw.get("bank") or bank),
+            name=raw.get("name") or raw.get("nickname"),
+            account_type=_intern(raw.get("accountType") or raw.get("type") or raw.get("productType")),
+            balance=parse_amount(raw.get("balance")),
+            currency=_currency(raw, "balance"),
+            client_id=client_id,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.account_id,
+            "bank": self.bank,
+            "name": self.name,
+            "accountType": self.account_type,
+            "balance": str(self.balance),
+            "currency": self.currency,
+            "clientId": self.client_id,
+        }
+
+
+class Transaction:
+    """Транзакция в нормализованном виде: сумма в Decimal со знаком, время в unix-секундах, стабильный ключ"""
+    __slots__ = ("key", "bank", "account_id", "amount", "currency", "timestamp", "description")
+
+    def __init__(self, key: str, bank: str, account_id: str, amount: Decimal, currency: Optional[str],
+                 timestamp: Optional[float], description: str) -> None:
+        self.key = key
+        self.bank = bank
+        self.account_id = account_id
+        self.amount = amount
+        self.currency = currency
+        self.timestamp = timestamp
+        self.description = description
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any], bank: str, account_id: str) -> "Transaction":
+        amount_field = raw.get("amount", raw.get("transactionAmount"))
+        amount = parse_amount(amount_field)
+        # Open Banking отдаёт сумму без знака и направление отдельным полем
+        indicator = str(raw.get("creditDebitIndicator") or "").lower()
+        if indicator in _DEBIT_INDICATORS and amount > 0:
+            amount = -amount
+        return cls(
+            key=transaction_key(raw),
+            bank=_intern(raw.get("bank") or bank),
+            account_id=str(raw.get("accountId") or account_id),
+            amount=amount,
+            currency=_currency(raw, "amount", "transactionAmount"),
+            timestamp=parse_timestamp(transaction_date(raw)),
+            description=raw.get("description") or raw.get("reference") or raw.get("transactionInformation") or "",
+        )
+
+    @property
+    def date(self) -> Optional[str]:
+        return format_timestamp(self.timestamp)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "transactionId": self.key,
+            "bank": self.bank,
+            "accountId": self.account_id,
+            "date": self.date,
+            "amount": str(self.amount),
+            "currency": self.currency,
+            "description": self.description,
+        }
+
+
+def parse_accounts(raw_accounts: Iterable[Dict[str, Any]], bank: str, client_id: Optional[str] = None) -> List[Account]:
+    return [Account.from_raw(raw, bank, client_id) for raw in raw_accounts if isinstance(raw, dict)]
+
+
+def _encode_record(value: Any) -> Any:
+    if isinstance(value, (Account, Transaction)):
+        return value.to_dict()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    """JSON ответа API: записи сериализуются напрямую, без jsonable_encoder и промежуточных копий"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload, default=_encode_record, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_encode_record).encode("utf-8")
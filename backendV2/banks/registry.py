@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+from ..core.models import ConsentStatus
+from ..core.state import KeyedLocks
+
+ConsentKey = Tuple[str, str]  # (bank_code, client_id)
+CONSENT_TERMINAL_TTL_SECONDS = 600.0  # сколько помним отозванное/истёкшее согласие, чтобы отвечать на запросы статуса
+CONSENT_PRUNE_EVERY = 256  # операций записи между проходами очистки
+_TERMINAL_STATUSES = frozenset({ConsentStatus.REVOKED, ConsentStatus.EXPIRED})
+
+
+@dataclass
+class BankConsentState:
+    consent_id: Optional[str]
+    status: ConsentStatus
+    bank_code: str
+    client_id: str
+    expires_at: Optional[datetime]
+    last_synced_at: datetime
+    request_id: Optional[str] = None  # SBank возвращает request_id для pending согласий
+
+
+class ConsentRegistry:
+    """Согласия с индексами по (bank, client), consent_id и request_id; индексы меняются только вместе"""
+
+    def __init__(self, terminal_ttl: float = CONSENT_TERMINAL_TTL_SECONDS) -> None:
+        self.terminal_ttl = terminal_ttl
+        self.locks = KeyedLocks()  # блокировки создания согласия на (bank, client), живут пока нужны
+        self._by_key: Dict[ConsentKey, BankConsentState] = {}
+        self._by_consent_id: Dict[str, ConsentKey] = {}
+        self._by_request_id: Dict[str, ConsentKey] = {}
+        self._writes = 0
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def __iter__(self) -> Iterator[BankConsentState]:
+        return iter(list(self._by_key.values()))
+
+    def get(self, bank_code: str, client_id: Optional[str]) -> Optional[BankConsentState]:
+        return self._by_key.get((bank_code, client_id))
+
+    def by_consent_id(self, consent_id: str) -> Optional[BankConsentState]:
+        key = self._by_consent_id.get(consent_id)
+        return self._by_key.get(key) if key else None
+
+    def by_request_id(self, request_id: str) -> Optional[BankConsentState]:
+        key = self._by_request_id.get(request_id)
+        return self._by_key.get(key) if key else None
+
+    def find(self, consent_or_request_id: str) -> Optional[BankConsentState]:
+        return self.by_consent_id(consent_or_request_id) or self.by_request_id(consent_or_request_id)
+
+    def put(self, state: BankConsentState) -> None:
+        key = (state.bank_code, state.client_id)
+        previous = self._by_key.get(key)
+        if previous is not None and previous is not state:
+            self._unindex(previous, key)
+        self._by_key[key] = state
+        if state.consent_id:
+            self._by_consent_id[state.consent_id] = key
+        if state.request_id:
+            self._by_request_id[state.request_id] = key
+        self._writes += 1
+        if self._writes % CONSENT_PRUNE_EVERY == 0:
+            self.prune()
+
+    def remove(self, state: BankConsentState) -> bool:
+        """Удаляет согласие, только если оно всё ещё текущее для своего (bank, client)"""
+        key = (state.bank_code, state.client_id)
+        if self._by_key.get(key) is not state:
+            return False
+        del self._by_key[key]
+        self._unindex(state, key)
+        return True
+
+    def ttl_for(self, state: BankConsentState) -> Optional[float]:
+        """Сколько секунд хранить запись о согласии; None — пока его явно не удалят"""
+        if state.status in _TERMINAL_STATUSES:
+            return self.terminal_ttl
+        if state.expires_at is not None:
+            return max((state.expires_at - datetime.utcnow()).total_seconds(), 1.0)
+        return None
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """Убирает истёкшие и давно отозванные согласия"""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.terminal_ttl)
+        stale = [
+            state for state in self._by_key.values()
+            if (state.status in _TERMINAL_STATUSES and state.last_synced_at <= cutoff)
+            or (state.expires_at is not None and state.expires_at <= now)
+        ]
+        for state in stale:
+            self.remove(state)
+        return len(stale)
+
+    def _unindex(self, state: BankConsentState, key: ConsentKey) -> None:
+        if state.consent_id and self._by_consent_id.get(state.consent_id) == key:
+            del self._by_consent_id[state.consent_id]
+        if state.request_id and self._by_request_id.get(state.request_id) == key:
+            del self._by_request_id[state.request_id]
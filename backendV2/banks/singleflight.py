@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from ..banks.outbound import SharedPriority, current_priority, shared_priority
+
+
+class SingleFlight:
+    """Объединяет одновременные вызовы с одинаковым ключом в один общий запрос.
+    Полоса общего запроса — самая приоритетная из полос присоединившихся: пользователь не ждёт в фоновой очереди"""
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._priorities: Dict[Hashable, SharedPriority] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            self._priorities[key].raise_to(current_priority())
+        else:
+            self.stats["executed"] += 1
+            shared = self._priorities[key] = SharedPriority(current_priority(), shared_priority.get())
+            # Отдельная задача: отмена одного ожидающего не должна отменять запрос для остальных
+            task = asyncio.ensure_future(self._run(shared, factory))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _run(shared: SharedPriority, factory: Callable[[], Awaitable[Any]]) -> Any:
+        shared_priority.set(shared)  # контекст задачи свой: ожидающие его не видят
+        return await factory()
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._priorities[key]
+        if not task.cancelled():
+            task.exception()  # помечаем исключение как полученным, даже если все ожидающие ушли
@@ -0,0 +1,103 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from ..banks.records import Transaction
+
+AccountKey = Tuple[str, str, str]  # (bank_code, client_id, account_id)
+
+
+def _sort_key(tx: Transaction) -> float:
+    return tx.timestamp if tx.timestamp is not None else float("-inf")
+
+
+@dataclass
+class AccountHistory:
+    transactions: Dict[str, Transaction] = field(default_factory=dict)
+    watermark: Optional[float] = None  # время самой новой известной транзакции
+    synced_at: Optional[datetime] = None
+    resume_offset: Optional[int] = None  # обход прерван лимитом страниц — следующая синхронизация продолжит с этого смещения
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    _pending_watermark: Optional[float] = None
+    _ordered: Optional[List[Transaction]] = None
+    derived: Dict[str, Any] = field(default_factory=dict)  # производные структуры (индекс), сбрасываются при изменениях
+
+    def add(self, txs: Iterable[Transaction]) -> int:
+        added = 0
+        for tx in txs:
+            if tx.key in self.transactions:
+                continue
+            self.transactions[tx.key] = tx
+            added += 1
+            ts = tx.timestamp
+            if ts is not None and (self._pending_watermark is None or ts > self._pending_watermark):
+                self._pending_watermark = ts
+        if added:
+            self._ordered = None
+            self.derived.clear()
+        return added
+
+    def is_known(self, tx: Transaction) -> bool:
+        if tx.key in self.transactions:
+            return True
+        return tx.timestamp is not None and self.watermark is not None and tx.timestamp < self.watermark
+
+    def advance(self, synced_at: datetime, resume_offset: Optional[int] = None) -> None:
+        """Фиксирует синхронизацию. Водяной знак сдвигается только после полного обхода: пока обход не дошёл
+        до конца (resume_offset), следующая синхронизация продолжает его в том же окне, и старая история не теряется"""
+        self.synced_at = synced_at
+        self.resume_offset = resume_offset
+        if resume_offset is not None:
+            return
+        if self._pending_watermark is not None and (self.watermark is None or self._pending_watermark > self.watermark):
+            self.watermark = self._pending_watermark
+        self._pending_watermark = None
+
+    def clear(self) -> None:
+        self.transactions.clear()
+        self.watermark = None
+        self.synced_at = None
+        self.resume_offset = None
+        self._pending_watermark = None
+        self._ordered = None
+        self.derived.clear()
+
+    def ordered(self) -> List[Transaction]:
+        """Транзакции от новых к старым"""
+        if self._ordered is None:
+            self._ordered = sorted(self.transactions.values(), key=_sort_key, reverse=True)
+        return self._ordered
+
+
+class TransactionStore:
+    """Локальная история транзакций по (bank, client_id, accountId) с водяным знаком синхронизации"""
+
+    def __init__(self) -> None:
+        self._accounts: Dict[AccountKey, AccountHistory] = {}
+
+    def history(self, bank_code: str, client_id: str, account_id: str) -> AccountHistory:
+        key = (bank_code, client_id, account_id)
+        history = self._accounts.get(key)
+        if history is None:
+            history = AccountHistory()
+            self._accounts[key] = history
+        return history
+
+    def transactions(self, bank_code: str, client_id: str, account_id: str) -> List[Transaction]:
+        history = self._accounts.get((bank_code, client_id, account_id))
+        return history.ordered() if history else []
+
+    def locate(self, account_id: str, clients: Iterable[Tuple[str, str]]) -> Optional[Tuple[str, str]]:
+        """(bank, client_id) уже синхронизированного счёта среди пар клиента — без обхода всех банков"""
+        for bank_code, client_id in clients:
+            history = self._accounts.get((bank_code, client_id, account_id))
+            if history is not None and history.synced_at is not None:
+                return bank_code, client_id
+        return None
+
+    def drop(self, bank_code: str, client_id: Optional[str] = None) -> None:
+        for key in [k for k in self._accounts if k[0] == bank_code and (client_id is None or k[1] == client_id)]:
+            del self._accounts[key]
+
+
+transaction_store = TransactionStore()
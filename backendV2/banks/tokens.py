@@ -0,0 +1,216 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import httpx
+from ..banks.config import BANK_CONFIGS, ERROR_BODY_LIMIT, BankConfig
+from ..banks.outbound import Priority, priority, request_priority
+from ..banks.transport import bank_transport
+from ..core.logs import LOG_SAMPLE_RATE, get_logger
+from ..core.metrics import metrics
+from ..core.state import state_backend
+
+TOKEN_REFRESH_MARGIN_SECONDS = 120.0  # обновляем токен заранее, до истечения expires_at (не больше половины срока жизни)
+TOKEN_REFRESH_RETRY_SECONDS = 15.0
+TOKEN_MIN_REFRESH_INTERVAL_SECONDS = 30.0  # фоновое обновление не запрашивает токен у банка чаще этого
+TOKEN_EXPIRY_SKEW_SECONDS = 60.0  # запас на расхождение часов с банком (не больше половины expires_in)
+AUTH_STYLES: Tuple[str, str] = ("query", "json")  # client_id/secret в query params или в JSON body
+
+log = get_logger(__name__)
+bank_token_fetches = metrics.counter("monetrix_bank_token_fetches_total", "Запросы токена к банку по результату", ("bank", "result"))
+
+
+@dataclass
+class BankTokenState:
+    access_token: str
+    expires_at: datetime
+    issued_at: Optional[datetime] = None
+
+    def refresh_at(self, margin: float) -> datetime:
+        """Когда обновлять: за margin до истечения, но не раньше середины срока жизни токена"""
+        if self.issued_at is not None:
+            margin = min(margin, (self.expires_at - self.issued_at).total_seconds() / 2)
+        return self.expires_at - timedelta(seconds=max(margin, 0.0))
+
+
+bank_tokens: Dict[str, BankTokenState] = {}  # локальная копия; источник правды — state_backend
+bank_token_locks: Dict[str, asyncio.Lock] = {code: asyncio.Lock() for code in BANK_CONFIGS}
+bank_auth_styles: Dict[str, str] = {}  # какой способ передачи учётных данных принял банк
+
+
+async def _request_token(cfg: BankConfig, style: str) -> httpx.Response:
+    params = {
+        "client_id": cfg.client_id,
+        "client_secret": cfg.client_secret,
+    }
+    if style == "json":
+        return await bank_transport.request(cfg, "POST", "/auth/bank-token", json_payload=params, operation="token")
+    return await bank_transport.request(cfg, "POST", "/auth/bank-token", params=params, operation="token")
+
+
+async def fetch_bank_token(cfg: BankConfig) -> BankTokenState:
+    log.debug("token.fetch", "🔑 Получаю токен", bank=cfg.code)
+
+    known_style = bank_auth_styles.get(cfg.code)
+    styles: List[str] = [known_style] if known_style else list(AUTH_STYLES)
+    response: Optional[httpx.Response] = None
+    for style in styles:
+        response = await _request_token(cfg, style)
+        if response.status_code < 400:
+            bank_auth_styles[cfg.code] = style
+            break
+        if style == "query" and not known_style:
+            # Некоторые банки требуют JSON body вместо query params
+            log.info("token.auth_style", "⚠️  Query params не сработали, пробую JSON body", bank=cfg.code, status=response.status_code)
+
+    if response.status_code >= 400:
+        # Запомненный способ перестал работать — в следующий раз пробуем оба
+        bank_auth_styles.pop(cfg.code, None)
+        error_text = response.text
+        try:
+            error_data = response.json()
+            error_text = str(error_data)
+        except:
+            pass
+        log.error("token.failed", "❌ Ошибка получения токена", bank=cfg.code, status=response.status_code, body=error_text[:ERROR_BODY_LIMIT])
+        raise Exception(f"Failed to get bank token for {cfg.code}: {response.status_code} - {error_text}")
+
+    try:
+        data = response.json()
+    except Exception as e:
+        log.error("token.bad_response", "❌ Не удалось распарсить JSON ответ", bank=cfg.code, error=repr(e), body=response.text[:ERROR_BODY_LIMIT])
+        raise
+
+    token = data.get("access_token") or data.get("token")
+    if not token:
+        log.error("token.missing", "❌ Токен не найден в ответе", bank=cfg.code, keys=sorted(data))
+        raise Exception(f"No token in response from {cfg.code}")
+
+    expires_in = int(data.get("expires_in") or 3600)
+    log.info("token.fetched", "✅ Токен получен", bank=cfg.code, expires_in=expires_in)
+    issued_at = datetime.utcnow()
+    lifetime = expires_in - min(TOKEN_EXPIRY_SKEW_SECONDS, expires_in / 2)
+    return BankTokenState(access_token=token, expires_at=issued_at + timedelta(seconds=lifetime), issued_at=issued_at)
+
+
+class BankTokenManager:
+    """Кэш токенов банков с прогревом при старте и фоновым обновлением до истечения срока"""
+
+    def __init__(self, refresh_margin: float = TOKEN_REFRESH_MARGIN_SECONDS) -> None:
+        self.refresh_margin = refresh_margin
+        self.refresh_count: Dict[str, int] = {code: 0 for code in BANK_CONFIGS}
+        self._retry_at: Dict[str, datetime] = {}
+        self._fetched_at: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure(self, bank_code: str) -> str:
+        state = bank_tokens.get(bank_code)
+        if state and state.expires_at > datetime.utcnow():
+            log.debug("token.cached", "🔑 Токен из кэша", bank=bank_code, sample=LOG_SAMPLE_RATE)
+            return state.access_token
+        async with bank_token_locks[bank_code]:
+            state = bank_tokens.get(bank_code)
+            if state and state.expires_at > datetime.utcnow():
+                return state.access_token
+            state = await self._adopt_shared(bank_code, datetime.utcnow())
+            if state is None:
+                async with state_backend.lock(f"token:{bank_code}"):
+                    # Пока ждали блокировку, токен мог получить другой воркер
+                    state = await self._adopt_shared(bank_code, datetime.utcnow()) or await self._fetch(bank_code)
+            return state.access_token
+
+    async def refresh(self, bank_code: str) -> BankTokenState:
+        async with bank_token_locks[bank_code]:
+            async with state_backend.lock(f"token:{bank_code}"):
+                # Другой воркер уже обновил токен — берём его вместо ещё одного запроса к банку
+                return await self._adopt_shared(bank_code, datetime.utcnow(), margin=self.refresh_margin) or await self._fetch(bank_code)
+
+    async def _adopt_shared(self, bank_code: str, now: datetime, margin: float = 0.0) -> Optional[BankTokenState]:
+        """Токен другого воркера, если его не пора обновлять (margin) или хотя бы он ещё действует (margin=0)"""
+        if not state_backend.shared:
+            return None
+        record = await state_backend.get("tokens", bank_code)
+        if record is None:
+            return None
+        issued_at = record.get("issued_at")
+        state = BankTokenState(access_token=record["access_token"], expires_at=datetime.fromisoformat(record["expires_at"]),
+                               issued_at=datetime.fromisoformat(issued_at) if issued_at else None)
+        if state.refresh_at(margin) <= now:
+            return None
+        bank_tokens[bank_code] = state
+        self._retry_at.pop(bank_code, None)
+        return state
+
+    async def _fetch(self, bank_code: str) -> BankTokenState:
+        try:
+            state = await fetch_bank_token(BANK_CONFIGS[bank_code])
+        except Exception:
+            bank_token_fetches.inc(bank=bank_code, result="error")
+            raise
+        bank_token_fetches.inc(bank=bank_code, result="ok")
+        bank_tokens[bank_code] = state
+        self._fetched_at[bank_code] = datetime.utcnow()
+        ttl = (state.expires_at - datetime.utcnow()).total_seconds()
+        if ttl > 0:
+            record = {"access_token": state.access_token, "expires_at": state.expires_at.isoformat(),
+                      "issued_at": state.issued_at.isoformat() if state.issued_at else None}
+            await state_backend.set("tokens", bank_code, record, ttl=ttl)
+        self.refresh_count[bank_code] = self.refresh_count.get(bank_code, 0) + 1
+        self._retry_at.pop(bank_code, None)
+        return state
+
+    async def warm_up(self) -> None:
+        with priority(Priority.BACKGROUND):
+            results = await asyncio.gather(*(self.ensure(code) for code in BANK_CONFIGS), return_exceptions=True)
+        for code, res in zip(BANK_CONFIGS, results):
+            if isinstance(res, Exception):
+                log.warning("token.warmup_failed", "⚠️  Не удалось прогреть токен", bank=code, error=repr(res))
+                self._retry_at[code] = datetime.utcnow() + timedelta(seconds=TOKEN_REFRESH_RETRY_SECONDS)
+
+    async def start(self) -> None:
+        """Прогрев и обновление — в фоновой задаче: зависший банк не задерживает запуск приложения"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _refresh_due_at(self, bank_code: str) -> datetime:
+        retry_at = self._retry_at.get(bank_code)
+        if retry_at:
+            return retry_at
+        state = bank_tokens.get(bank_code)
+        if state is None:
+            return datetime.utcnow()
+        # Короткоживущий токен не должен превращать фоновый цикл в непрерывные запросы к банку
+        fetched_at = self._fetched_at.get(bank_code)
+        earliest = fetched_at + timedelta(seconds=TOKEN_MIN_REFRESH_INTERVAL_SECONDS) if fetched_at else datetime.utcnow()
+        return max(state.refresh_at(self.refresh_margin), earliest)
+
+    async def _run(self) -> None:
+        request_priority.set(Priority.BACKGROUND)
+        await self.warm_up()
+        while True:
+            due = {code: self._refresh_due_at(code) for code in BANK_CONFIGS}
+            next_at = min(due.values())
+            delay = (next_at - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            now = datetime.utcnow()
+            codes = [code for code, at in due.items() if at <= now]
+            results = await asyncio.gather(*(self.refresh(code) for code in codes), return_exceptions=True)
+            for code, res in zip(codes, results):
+                if isinstance(res, Exception):
+                    log.warning("token.refresh_failed", "⚠️  Фоновое обновление токена не удалось", bank=code, error=repr(res))
+                    self._retry_at[code] = datetime.utcnow() + timedelta(seconds=TOKEN_REFRESH_RETRY_SECONDS)
+
+
+bank_token_manager = BankTokenManager()
+
+
+async def ensure_bank_token(bank_code: str) -> str:
+    return await bank_token_manager.ensure(bank_code)
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional
+import httpx
+from ..banks.config import BANK_CONFIGS, BankConfig
+from ..banks.health import BankUnavailableError, bank_breakers
+from ..banks.outbound import backoff_delay, bank_outbound, parse_retry_after
+from ..core.metrics import metrics
+
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+bank_request_seconds = metrics.histogram(
+    "monetrix_bank_request_duration_seconds", "Латентность одного HTTP-запроса к банку", ("bank", "operation"))
+bank_request_errors = metrics.counter(
+    "monetrix_bank_request_errors_total", "Неудачные запросы к банкам по виду ошибки", ("bank", "operation", "kind"))
+
+try:
+    import h2  # noqa: F401  # HTTP/2 в httpx требует пакет h2 (pip install httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class BankTransport:
+    """Держит по одному долгоживущему httpx.AsyncClient с пулом соединений на каждый банк."""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.transport = transport  # подмена сети (например, httpx.ASGITransport с mock-банком в бенчмарках)
+
+    def _build_client(self, cfg: BankConfig) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=cfg.max_connections,
+            max_keepalive_connections=cfg.max_keepalive_connections,
+            keepalive_expiry=cfg.keepalive_expiry,
+        )
+        return httpx.AsyncClient(
+            base_url=cfg.base_url,
+            limits=limits,
+            http2=cfg.http2 and HTTP2_AVAILABLE,
+            timeout=self._timeout(cfg, "default"),
+            transport=self.transport,
+        )
+
+    def _timeout(self, cfg: BankConfig, operation: str) -> httpx.Timeout:
+        return httpx.Timeout(cfg.timeout_for(operation), connect=cfg.connect_timeout)
+
+    def client(self, cfg: BankConfig) -> httpx.AsyncClient:
+        client = self._clients.get(cfg.code)
+        if client is None or client.is_closed:
+            client = self._build_client(cfg)
+            self._clients[cfg.code] = client
+        return client
+
+    async def request(self, cfg: BankConfig, method: str, path: str, *, operation: str = "default",
+                      headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None,
+                      data: Optional[Dict[str, Any]] = None, json_payload: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        outbound = bank_outbound[cfg.code]
+        attempt = 0
+        while True:
+            await outbound.acquire()
+            try:
+                response = await self._send(cfg, method, path, operation=operation, headers=headers,
+                                            params=params, data=data, json_payload=json_payload)
+            except httpx.TransportError:
+                if method != "GET" or attempt >= cfg.max_retries:
+                    raise
+                retry_after = None
+            else:
+                retry_after = parse_retry_after(response.headers.get("Retry-After")) if response.status_code in RETRYABLE_STATUSES else None
+                if retry_after is not None or response.status_code == 429:
+                    outbound.defer(retry_after if retry_after is not None else backoff_delay(cfg, attempt))
+                if response.status_code not in RETRYABLE_STATUSES or method != "GET" or attempt >= cfg.max_retries:
+                    return response
+            outbound.stats["retries"] += 1
+            await asyncio.sleep(backoff_delay(cfg, attempt, retry_after))
+            attempt += 1
+
+    async def _send(self, cfg: BankConfig, method: str, path: str, *, operation: str,
+                    headers: Optional[Dict[str, str]], params: Optional[Dict[str, Any]],
+                    data: Optional[Dict[str, Any]], json_payload: Optional[Dict[str, Any]]) -> httpx.Response:
+        breaker = bank_breakers[cfg.code]
+        if not breaker.allow():
+            bank_request_errors.inc(bank=cfg.code, operation=operation, kind="circuit_open")
+            raise BankUnavailableError(cfg.code, breaker.retry_in())
+        started = time.monotonic()
+        try:
+            response = await self.client(cfg).request(
+                method,
+                path,
+                headers=headers,
+                params=params,
+                data=data,
+                json=json_payload,
+                timeout=self._timeout(cfg, operation),
+            )
+        except asyncio.CancelledError:
+            # Отмену вызывает наша сторона (клиент ушёл, сработал deadline_seconds): быстрый вызов о здоровье банка
+            # не говорит, а вызов, который уже медленнее slow_call_seconds, — такой же медленный ответ, как дождавшийся
+            latency = time.monotonic() - started
+            if latency > breaker.slow_call_seconds:
+                breaker.record(False, latency)
+                bank_request_seconds.observe(latency, bank=cfg.code, operation=operation)
+                bank_request_errors.inc(bank=cfg.code, operation=operation, kind="slow_cancelled")
+            else:
+                breaker.release()
+                bank_request_errors.inc(bank=cfg.code, operation=operation, kind="cancelled")
+            raise
+        except Exception as exc:
+            latency = time.monotonic() - started
+            breaker.record(False, latency)
+            bank_request_seconds.observe(latency, bank=cfg.code, operation=operation)
+            kind = "timeout" if isinstance(exc, httpx.TimeoutException) else "transport"
+            bank_request_errors.inc(bank=cfg.code, operation=operation, kind=kind)
+            raise
+        latency = time.monotonic() - started
+        breaker.record(response.status_code < 500 and response.status_code != 429, latency)
+        bank_request_seconds.observe(latency, bank=cfg.code, operation=operation)
+        if response.status_code >= 400:
+            bank_request_errors.inc(bank=cfg.code, operation=operation, kind=f"http_{response.status_code}")
+        return response
+
+    async def start(self) -> None:
+        for cfg in BANK_CONFIGS.values():
+            self.client(cfg)
+
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+bank_transport = BankTransport()
@@ -0,0 +1,146 @@
+"""Сравнение колоночной аналитики с прежним построчным расчётом и памяти записей с сырыми словарями.
+
+Запуск: python -m backendV2.benchmarks.analytics --transactions 100000
+"""
+import argparse
+import math
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+from ..banks.columnar import SnapshotColumns
+from ..banks.records import Account, Transaction, parse_accounts
+
+
+def _legacy_safe_amount(value: Any) -> float:
+    try:
+        return float(value)
+    except Exception:
+        return 0.0
+
+
+def _legacy_balance(account: Dict[str, Any]) -> float:
+    if "balance" in account:
+        return _legacy_safe_amount(account.get("balance"))
+    return 0.0
+
+
+def legacy_summary(accounts: List[Dict[str, Any]], transactions: List[Dict[str, Any]]) -> Dict[str, float]:
+    return {
+        "netWorth": sum(_legacy_balance(a) for a in accounts),
+        "assets": sum(v for v in map(_legacy_balance, accounts) if v >= 0),
+        "liabilities": sum(abs(v) for v in map(_legacy_balance, accounts) if v < 0),
+        "cashflow": sum(_legacy_safe_amount(t.get("amount", 0)) for t in transactions),
+    }
+
+
+def legacy_recommendation_inputs(accounts: List[Dict[str, Any]], transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    total_positive = sum(_legacy_safe_amount(tx.get("amount", 0)) for tx in transactions if _legacy_safe_amount(tx.get("amount", 0)) > 0)
+    total_negative = sum(_legacy_safe_amount(tx.get("amount", 0)) for tx in transactions if _legacy_safe_amount(tx.get("amount", 0)) < 0)
+    largest = sorted(accounts, key=lambda acc: _legacy_safe_amount(acc.get("balance", 0)), reverse=True)[:3]
+    unique_banks = set(acc.get("bank") for acc in accounts if acc.get("bank"))
+    return {
+        "totalPositive": total_positive,
+        "totalNegative": total_negative,
+        "top": largest[0]["id"] if largest else None,
+        "uniqueBanks": len(unique_banks),
+    }
+
+
+def columnar_recommendation_inputs(columns: SnapshotColumns, accounts: List[Account]) -> Dict[str, Any]:
+    flows = columns.income_outcome()
+    top = columns.top_account()
+    return {
+        "totalPositive": flows["totalPositive"],
+        "totalNegative": flows["totalNegative"],
+        "top": accounts[top].account_id if top is not None else None,
+        "uniqueBanks": columns.unique_banks(),
+    }
+
+
+def make_dataset(n_accounts: int, n_transactions: int, seed: int = 42) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    rnd = random.Random(seed)
+    banks = ["vbank", "abank", "sbank"]
+    accounts = [
+        {"id": f"acc-{i}", "bank": banks[i % 3], "balance": f"{rnd.uniform(-50_000, 500_000):.2f}"}
+        for i in range(n_accounts)
+    ]
+    transactions = []
+    for i in range(n_transactions):
+        acc = accounts[i % n_accounts]
+        amount: Any = f"{rnd.uniform(-20_000, 20_000):.2f}"
+        if i % 1000 == 0:
+            amount = "n/a"  # некорректные суммы должны считаться нулём
+        transactions.append({
+            "transactionId": f"tx-{i}",
+            "accountId": acc["id"],
+            "bank": acc["bank"],
+            "amount": amount,
+            "date": f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T12:00:00Z",
+        })
+    return accounts, transactions
+
+
+def to_records(accounts: List[Dict[str, Any]], transactions: List[Dict[str, Any]]) -> Tuple[List[Account], List[Transaction]]:
+    return (
+        parse_accounts(accounts, "unknown"),
+        [Transaction.from_raw(tx, tx["bank"], tx["accountId"]) for tx in transactions],
+    )
+
+
+def _allocated(fn: Callable[[], Any]) -> Tuple[int, Any]:
+    tracemalloc.start()
+    try:
+        result = fn()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best = math.inf
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _close(a: Any, b: Any) -> bool:
+    if isinstance(a, float) and isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--accounts", type=int, default=30)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw_size, (accounts, transactions) = _allocated(lambda: make_dataset(args.accounts, args.transactions))
+    parse_time, _ = _best_of(lambda: to_records(accounts, transactions), 1)
+    records_size, (account_records, tx_records) = _allocated(lambda: to_records(accounts, transactions))
+    legacy_time, legacy = _best_of(lambda: (legacy_summary(accounts, transactions), legacy_recommendation_inputs(accounts, transactions)), args.repeat)
+    build_time, columns = _best_of(lambda: SnapshotColumns.build(account_records, tx_records), args.repeat)
+    query_time, columnar = _best_of(lambda: (columns.summary(), columnar_recommendation_inputs(columns, account_records)), args.repeat)
+
+    for legacy_part, columnar_part in zip(legacy, columnar):
+        for key, value in legacy_part.items():
+            if not _close(value, columnar_part[key]):
+                raise SystemExit(f"Расхождение в {key}: legacy={value} columnar={columnar_part[key]}")
+
+    print(f"accounts={args.accounts} transactions={args.transactions}")
+    print(f"память: словари банка {raw_size / 2**20:7.1f} MiB, записи {records_size / 2**20:7.1f} MiB")
+    print(f"разбор в записи (один раз при загрузке): {parse_time * 1000:9.2f} ms")
+    print(f"legacy (summary + recommendations):   {legacy_time * 1000:9.2f} ms на запрос")
+    print(f"columnar build (один раз на снимок):  {build_time * 1000:9.2f} ms")
+    print(f"columnar (summary + recommendations): {query_time * 1000:9.2f} ms на запрос")
+    print(f"ускорение на запрос: x{legacy_time / max(query_time, 1e-9):.0f}")
+
+
+if __name__ == "__main__":
+    main()
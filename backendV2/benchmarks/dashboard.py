@@ -0,0 +1,157 @@
+"""Нагрузочный бенчмарк дашборда против локального mock-банка: пропускная способность и p50/p95/p99.
+
+Приложение и mock-банк работают в одном процессе через httpx.ASGITransport, сеть не нужна.
+Запуск: python -m backendV2.benchmarks.dashboard --users 1,10,50 --sizes 3x100,10x1000 --latency-ms 20
+--entities 1,10 сравнивает пользователя с одним клиентом и бизнес с десятью юрлицами в каждом банке.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+import httpx
+from ..banks.config import BANK_CLIENT_IDS, BANK_CONFIGS
+from ..banks.outbound import bank_outbound
+from ..banks.transport import bank_transport
+from ..core.logs import setup_logging
+from .mock_bank import MockBankSettings, create_app
+
+ENDPOINTS: Tuple[str, ...] = ("/api/dashboard/summary", "/api/dashboard/transactions", "/api/recommendations")
+PERCENTILES: Tuple[int, ...] = (50, 95, 99)
+
+
+@dataclass
+class Result:
+    scenario: str
+    phase: str
+    endpoint: str
+    latencies: List[float]
+    errors: int
+    elapsed: float
+
+    def percentile(self, p: int) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "scenario": self.scenario,
+            "phase": self.phase,
+            "endpoint": self.endpoint,
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "rps": len(self.latencies) / self.elapsed if self.elapsed else 0.0,
+            **{f"p{p}_ms": self.percentile(p) * 1000 for p in PERCENTILES},
+        }
+
+
+def _parse_sizes(value: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in value.split(","):
+        accounts, _, transactions = item.partition("x")
+        sizes.append((int(accounts), int(transactions)))
+    return sizes
+
+
+async def _timed(client: httpx.AsyncClient, path: str, headers: Dict[str, str]) -> Tuple[float, bool]:
+    started = time.perf_counter()
+    response = await client.get(path, headers=headers)
+    return time.perf_counter() - started, response.status_code == 200
+
+
+async def _measure(client: httpx.AsyncClient, scenario: str, phase: str, endpoint: str,
+                   tokens: Sequence[Dict[str, str]], rounds: int) -> Result:
+    started = time.perf_counter()
+    latencies: List[float] = []
+    errors = 0
+    for _ in range(rounds):
+        # Все пользователи одновременно — как пик открытия дашбордов
+        for latency, ok in await asyncio.gather(*(_timed(client, endpoint, headers) for headers in tokens)):
+            latencies.append(latency)
+            errors += 0 if ok else 1
+    return Result(scenario, phase, endpoint, latencies, errors, time.perf_counter() - started)
+
+
+async def _register(client: httpx.AsyncClient, scenario: str, users: int, entities: int) -> List[Dict[str, str]]:
+    headers = []
+    for i in range(users):
+        payload: Dict[str, Any] = {"email": f"bench-{scenario}-{i}@example.com", "password": "bench"}
+        if entities > 1:
+            client_ids = [f"bench-{scenario}-{i}-e{e}" for e in range(entities)]
+            payload.update(companyName=f"Bench {i}", inn="7700000000", contact=f"Bench {i}", bankClientIds=client_ids)
+        else:
+            client_ids = [f"bench-{scenario}-{i}"]
+            payload.update(fullName=f"Bench {i}", bankClientId=client_ids[0])
+        BANK_CLIENT_IDS.extend(client_ids)  # mock-банк знает любых клиентов: добавляем их в пул, иначе регистрация их отклонит
+        response = await client.post("/api/auth/register", json=payload)
+        headers.append({"Authorization": f"Bearer {response.json()['accessToken']}"})
+    return headers
+
+
+async def run_scenario(client: httpx.AsyncClient, users: int, entities: int, accounts: int, transactions: int, rounds: int,
+                       mock_settings: MockBankSettings) -> List[Result]:
+    scenario = f"u{users}-e{entities}-a{accounts}-t{transactions}"
+    mock_settings.accounts_per_client = accounts
+    mock_settings.transactions_per_account = transactions
+    tokens = await _register(client, scenario, users, entities)
+    results = [await _measure(client, scenario, "cold", ENDPOINTS[0], tokens, 1)]
+    for endpoint in ENDPOINTS:
+        results.append(await _measure(client, scenario, "warm", endpoint, tokens, rounds))
+    return results
+
+
+async def run(args: argparse.Namespace) -> List[Result]:
+    from ..app import app  # импорт здесь: пользователи бенчмарка пишутся во временную базу, заданную в main
+
+    mock_settings = MockBankSettings(latency_ms=args.latency_ms, error_rate=args.error_rate, max_page_size=args.page_size)
+    bank_transport.transport = httpx.ASGITransport(app=create_app(mock_settings))
+    for code, cfg in BANK_CONFIGS.items():
+        cfg.base_url = f"http://mock-bank/{code}"
+        if args.bank_rps:
+            bank_outbound[code].rate = args.bank_rps
+            bank_outbound[code].burst = int(args.bank_rps * 2)
+
+    results: List[Result] = []
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://monetrix") as client:
+            for accounts, transactions in _parse_sizes(args.sizes):
+                for users in (int(u) for u in args.users.split(",")):
+                    for entities in (int(e) for e in args.entities.split(",")):
+                        results.extend(await run_scenario(client, users, entities, accounts, transactions, args.rounds, mock_settings))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1,10,50", help="число одновременных пользователей, через запятую")
+    parser.add_argument("--entities", default="1", help="клиентов (юрлиц) на пользователя в каждом банке, через запятую")
+    parser.add_argument("--sizes", default="3x100,10x1000", help="счетов x транзакций на счёт, через запятую")
+    parser.add_argument("--rounds", type=int, default=20, help="тёплых запросов каждого пользователя к каждому endpoint")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="средняя задержка mock-банка")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503 от mock-банка")
+    parser.add_argument("--page-size", type=int, default=100, help="максимальный размер страницы транзакций у банка")
+    parser.add_argument("--bank-rps", type=float, default=0.0, help="переопределить лимит запросов к банку (0 — как в BANK_CONFIGS)")
+    parser.add_argument("--json", action="store_true", help="результаты в JSON (для сравнения между коммитами)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONETRIX_USER_DB", os.path.join(tempfile.mkdtemp(prefix="monetrix-bench-"), "users.db"))
+    setup_logging(level="WARNING")  # lifespan приложения повторно логи не настраивает
+    results = asyncio.run(run(args))
+
+    rows = [result.as_dict() for result in results]
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    print(f"{'сценарий':<24} {'фаза':<5} {'endpoint':<28} {'запросов':>8} {'ошибок':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        print(f"{row['scenario']:<24} {row['phase']:<5} {row['endpoint']:<28} {row['requests']:>8} {row['errors']:>6} "
+              f"{row['rps']:>8.1f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
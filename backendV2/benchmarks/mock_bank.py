@@ -0,0 +1,203 @@
+"""Локальный mock-банк с API как у *.open.bankingapi.ru: токен, согласия, счета и постраничные транзакции.
+
+Все банки обслуживаются одним приложением под префиксом /{bank}:
+    MOCK_BANK_LATENCY_MS=30 uvicorn backendV2.benchmarks.mock_bank:app --port 9000
+    MONETRIX_BANK_BASE_URL=http://127.0.0.1:9000/{code} uvicorn backendV2.app:app --port 8080
+"""
+import asyncio
+import itertools
+import math
+import os
+import random
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import Body, FastAPI, Query
+from fastapi.responses import JSONResponse, Response
+from ..banks.records import format_timestamp, parse_timestamp
+
+TRANSACTION_STEP_SECONDS = 6 * 3600  # транзакции счёта идут от новых к старым с этим шагом
+
+
+@dataclass
+class MockBankSettings:
+    latency_ms: float = 0.0  # средняя задержка ответа
+    latency_jitter: float = 0.5  # разброс задержки: ±доля от latency_ms
+    error_rate: float = 0.0  # доля ответов 503
+    max_page_size: int = 100  # банк не отдаёт больше за одну страницу, даже если limit больше
+    accounts_per_client: int = 3
+    transactions_per_account: int = 200
+    approve_after_polls: int = 0  # 0 — согласие сразу approved, иначе pending до N-й проверки статуса
+    token_ttl_seconds: int = 3600
+    seed: int = 42
+
+    @classmethod
+    def from_env(cls) -> "MockBankSettings":
+        return cls(
+            latency_ms=float(os.getenv("MOCK_BANK_LATENCY_MS", "0")),
+            latency_jitter=float(os.getenv("MOCK_BANK_LATENCY_JITTER", "0.5")),
+            error_rate=float(os.getenv("MOCK_BANK_ERROR_RATE", "0")),
+            max_page_size=int(os.getenv("MOCK_BANK_PAGE_SIZE", "100")),
+            accounts_per_client=int(os.getenv("MOCK_BANK_ACCOUNTS", "3")),
+            transactions_per_account=int(os.getenv("MOCK_BANK_TRANSACTIONS", "200")),
+            approve_after_polls=int(os.getenv("MOCK_BANK_APPROVE_AFTER_POLLS", "0")),
+            seed=int(os.getenv("MOCK_BANK_SEED", "42")),
+        )
+
+
+@dataclass
+class _Consent:
+    consent_id: str
+    client_id: str
+    status: str
+    polls: int = 0
+
+
+def _hash(*parts: Any) -> int:
+    return zlib.crc32(":".join(map(str, parts)).encode("utf-8"))
+
+
+class MockBank:
+    """Данные детерминированы по (bank, client, account, номер): страницы строятся на лету, без хранения истории"""
+
+    def __init__(self, settings: MockBankSettings) -> None:
+        self.settings = settings
+        self.anchor = float(math.floor(time.time() / 86400) * 86400)  # полночь UTC — даты стабильны в течение дня
+        self.requests: Dict[str, int] = {}
+        self._consents: Dict[Tuple[str, str], _Consent] = {}
+        self._ids = itertools.count(1)
+        self._random = random.Random(settings.seed)
+
+    async def simulate(self, bank: str, operation: str) -> Optional[Response]:
+        """Задержка и случайная ошибка; None — запрос обрабатывается как обычно"""
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+        settings = self.settings
+        if settings.latency_ms > 0:
+            spread = settings.latency_ms * settings.latency_jitter
+            await asyncio.sleep(max(0.0, self._random.uniform(settings.latency_ms - spread, settings.latency_ms + spread)) / 1000)
+        if settings.error_rate > 0 and self._random.random() < settings.error_rate:
+            return JSONResponse({"error": "service_unavailable", "bank": bank}, status_code=503)
+        return None
+
+    def request_consent(self, bank: str, client_id: str) -> Dict[str, Any]:
+        consent_id = f"consent-{bank}-{next(self._ids)}"
+        status = "pending" if self.settings.approve_after_polls > 0 else "approved"
+        self._consents[(bank, consent_id)] = _Consent(consent_id=consent_id, client_id=client_id, status=status)
+        if status == "pending":
+            return {"request_id": consent_id, "status": status}
+        return {"consent_id": consent_id, "status": status}
+
+    def consent_status(self, bank: str, consent_id: str) -> Optional[Dict[str, Any]]:
+        consent = self._consents.get((bank, consent_id))
+        if consent is None:
+            return None
+        consent.polls += 1
+        if consent.status == "pending" and consent.polls >= self.settings.approve_after_polls:
+            consent.status = "approved"
+        return {"consent_id": consent.consent_id, "request_id": consent.consent_id, "status": consent.status}
+
+    def revoke_consent(self, bank: str, consent_id: str) -> None:
+        consent = self._consents.get((bank, consent_id))
+        if consent is not None:
+            consent.status = "revoked"
+
+    def accounts(self, bank: str, client_id: str) -> List[Dict[str, Any]]:
+        items = []
+        for i in range(self.settings.accounts_per_client):
+            account_id = f"{bank}-{client_id}-acc{i}"
+            h = _hash(self.settings.seed, account_id)
+            balance = (h % 50_000_000) / 100 - (100_000 if i % 4 == 3 else 0)  # каждый четвёртый — кредитный
+            items.append({
+                "accountId": account_id,
+                "nickname": f"Счёт {i + 1}",
+                "accountType": "Credit" if i % 4 == 3 else "Personal",
+                "balance": {"amount": f"{balance:.2f}", "currency": "RUB"},
+            })
+        return items
+
+    def _transaction(self, account_id: str, index: int) -> Dict[str, Any]:
+        h = _hash(self.settings.seed, account_id, index)
+        debit = h % 5 < 3
+        return {
+            "transactionId": f"{account_id}-tx{index}",
+            "accountId": account_id,
+            "amount": {"amount": f"{(h % 2_000_000) / 100 + 1:.2f}", "currency": "RUB"},
+            "creditDebitIndicator": "Debit" if debit else "Credit",
+            "bookingDateTime": format_timestamp(self.anchor - index * TRANSACTION_STEP_SECONDS),
+            "transactionInformation": f"{'Оплата' if debit else 'Поступление'} #{index}",
+        }
+
+    def transactions(self, account_id: str, limit: int, offset: int,
+                     from_date: Optional[str], to_date: Optional[str]) -> List[Dict[str, Any]]:
+        total = self.settings.transactions_per_account
+        first, last = 0, total - 1
+        to_ts = parse_timestamp(to_date, end_of_day=True)
+        from_ts = parse_timestamp(from_date)
+        if to_ts is not None:
+            first = max(first, math.ceil((self.anchor - to_ts) / TRANSACTION_STEP_SECONDS))
+        if from_ts is not None:
+            last = min(last, math.floor((self.anchor - from_ts) / TRANSACTION_STEP_SECONDS))
+        start = first + offset
+        stop = min(last + 1, start + min(limit, self.settings.max_page_size))
+        return [self._transaction(account_id, index) for index in range(start, stop)]
+
+
+def create_app(settings: Optional[MockBankSettings] = None) -> FastAPI:
+    bank = MockBank(settings or MockBankSettings.from_env())
+    app = FastAPI(title="Mock Open Banking API")
+    app.state.bank = bank
+
+    @app.post("/{bank_code}/auth/bank-token")
+    async def token(bank_code: str):
+        failure = await bank.simulate(bank_code, "token")
+        if failure is not None:
+            return failure
+        return {"access_token": f"mock-{bank_code}-{next(bank._ids)}", "token_type": "bearer", "expires_in": bank.settings.token_ttl_seconds}
+
+    @app.post("/{bank_code}/account-consents/request")
+    async def request_consent(bank_code: str, payload: Dict[str, Any] = Body(...)):
+        failure = await bank.simulate(bank_code, "consent")
+        if failure is not None:
+            return failure
+        return bank.request_consent(bank_code, str(payload.get("client_id") or ""))
+
+    @app.get("/{bank_code}/account-consents/{consent_id}")
+    async def consent_status(bank_code: str, consent_id: str):
+        failure = await bank.simulate(bank_code, "consent")
+        if failure is not None:
+            return failure
+        status = bank.consent_status(bank_code, consent_id)
+        if status is None:
+            return JSONResponse({"error": "consent_not_found"}, status_code=404)
+        return status
+
+    @app.delete("/{bank_code}/account-consents/{consent_id}")
+    async def revoke_consent(bank_code: str, consent_id: str):
+        failure = await bank.simulate(bank_code, "consent")
+        if failure is not None:
+            return failure
+        bank.revoke_consent(bank_code, consent_id)
+        return Response(status_code=204)
+
+    @app.get("/{bank_code}/accounts")
+    async def accounts(bank_code: str, client_id: str):
+        failure = await bank.simulate(bank_code, "accounts")
+        if failure is not None:
+            return failure
+        return JSONResponse({"items": bank.accounts(bank_code, client_id)})
+
+    @app.get("/{bank_code}/accounts/{account_id}/transactions")
+    async def transactions(bank_code: str, account_id: str,
+                           limit: int = Query(50, ge=1), offset: int = Query(0, ge=0),
+                           from_booking_date_time: Optional[str] = None, to_booking_date_time: Optional[str] = None):
+        failure = await bank.simulate(bank_code, "transactions")
+        if failure is not None:
+            return failure
+        # JSONResponse напрямую: без jsonable_encoder mock не упирается в CPU и не искажает замеры
+        return JSONResponse({"items": bank.transactions(account_id, limit, offset, from_booking_date_time, to_booking_date_time)})
+
+    return app
+
+
+app = create_app()
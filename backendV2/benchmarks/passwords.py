@@ -0,0 +1,93 @@
+"""Отзывчивость event loop во время всплеска входов: scrypt прямо в обработчике против пула потоков.
+
+Фоновый «пульс» просыпается каждые --tick-ms и записывает, насколько опоздал; это задержка,
+которую увидел бы любой другой запрос, пока идут проверки паролей.
+Запуск: python -m backendV2.benchmarks.passwords --logins 50 --n 16384
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+from ..core.passwords import PASSWORD_HASH_WORKERS, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_P, PASSWORD_SCRYPT_R, PasswordHasher
+
+
+def _percentile(values: List[float], p: int) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+async def _heartbeat(interval: float, lags: List[float], stop: asyncio.Event) -> None:
+    expected = time.perf_counter() + interval
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        lags.append(max(0.0, now - expected))
+        expected = now + interval
+
+
+async def _burst(name: str, login: Callable[[], Awaitable[bool]], logins: int, interval: float) -> Dict[str, Any]:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(interval, lags, stop))
+    await asyncio.sleep(interval * 2)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await heartbeat
+    return {
+        "mode": name,
+        "logins": logins,
+        "ok": sum(results),
+        "logins_per_s": logins / elapsed if elapsed else 0.0,
+        "elapsed_ms": elapsed * 1000,
+        "lag_p50_ms": _percentile(lags, 50) * 1000,
+        "lag_p99_ms": _percentile(lags, 99) * 1000,
+        "lag_max_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    hasher = PasswordHasher(n=args.n, r=args.r, p=args.p, workers=args.workers)
+    encoded = hasher.hash_sync("bench-password")
+    interval = args.tick_ms / 1000
+
+    async def inline() -> bool:
+        # Прежний путь с KDF прямо в async-обработчике
+        return hasher.verify_sync("bench-password", encoded)
+
+    async def pooled() -> bool:
+        return await hasher.verify("bench-password", encoded)
+
+    try:
+        return [await _burst("inline", inline, args.logins, interval), await _burst("pool", pooled, args.logins, interval)]
+    finally:
+        await hasher.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50, help="одновременных проверок пароля")
+    parser.add_argument("--n", type=int, default=PASSWORD_SCRYPT_N, help="параметр N scrypt")
+    parser.add_argument("--r", type=int, default=PASSWORD_SCRYPT_R, help="параметр r scrypt")
+    parser.add_argument("--p", type=int, default=PASSWORD_SCRYPT_P, help="параметр p scrypt")
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS, help="потоков в пуле хэширования")
+    parser.add_argument("--tick-ms", type=float, default=5.0, help="период пульса event loop")
+    parser.add_argument("--json", action="store_true", help="результаты в JSON")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    print(f"{'режим':<8} {'входов':>6} {'вход/с':>8} {'всего ms':>9} {'лаг p50':>8} {'лаг p99':>8} {'лаг max':>8}")
+    for row in rows:
+        print(f"{row['mode']:<8} {row['ok']:>6} {row['logins_per_s']:>8.1f} {row['elapsed_ms']:>9.1f} "
+              f"{row['lag_p50_ms']:>8.2f} {row['lag_p99_ms']:>8.2f} {row['lag_max_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,130 @@
+import os
+import secrets
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Any
 import jwt
 from jwt import PyJWTError
-from fastapi import HTTPException, Depends
+from typing import Any, Dict, Optional
+from fastapi import HTTPException, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from .state import state_backend
+from .users import user_repository
 
 JWT_SECRET = "SECRET_KEY"
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
+REFRESH_TOKEN_TYPE = "refresh"
+TOKEN_CACHE_SIZE = int(os.getenv("MONETRIX_TOKEN_CACHE_SIZE", "4096"))  # проверенных токенов в LRU
+# Как часто закэшированный токен перепроверяется по общему denylist и перечитывает пользователя
+TOKEN_RECHECK_SECONDS = float(os.getenv("MONETRIX_TOKEN_RECHECK_SECONDS", "30"))
+REVOKED_NAMESPACE = "revoked_tokens"
+# Одноразовый билет для EventSource: в URL (и в логах прокси) не попадает долгоживущий access-токен
+STREAM_TICKET_TTL_SECONDS = float(os.getenv("MONETRIX_STREAM_TICKET_TTL", "30"))
+STREAM_TICKET_NAMESPACE = "stream_tickets"
 
 security = HTTPBearer()
-users_db: Dict[str, Any] = {}
+optional_security = HTTPBearer(auto_error=False)
+
+@dataclass
+class _VerifiedToken:
+    payload: Dict[str, Any]
+    expires_at: float
+    user: Optional[Dict[str, Any]] = None
+    checked_until: float = 0.0
+
+class VerifiedTokenCache:
+    """LRU проверенных JWT: подпись проверяется один раз, запись живёт не дольше exp токена"""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _VerifiedToken]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str, now: float) -> Optional[_VerifiedToken]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return entry
+
+    def put(self, token: str, payload: Dict[str, Any]) -> _VerifiedToken:
+        entry = _VerifiedToken(payload=payload, expires_at=float(payload.get("exp", 0)))
+        self._entries[token] = entry
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def forget_user(self, user_id: str) -> None:
+        """Пользователь изменился — следующий запрос перечитает его из хранилища"""
+        for entry in self._entries.values():
+            if entry.payload.get("sub") == user_id:
+                entry.checked_until = 0.0
+
+    def drop(self, jti: str) -> None:
+        for token in [token for token, entry in self._entries.items() if entry.payload.get("jti") == jti]:
+            del self._entries[token]
+
+class TokenDenylist:
+    """Отозванные jti до истечения их exp: локально для быстрых проверок и в state_backend для остальных воркеров"""
+
+    def __init__(self) -> None:
+        self._local: Dict[str, float] = {}
+
+    def _prune(self, now: float) -> None:
+        for jti in [jti for jti, exp in self._local.items() if exp <= now]:
+            del self._local[jti]
+
+    def is_revoked_locally(self, jti: Optional[str]) -> bool:
+        return bool(jti) and jti in self._local
+
+    async def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti:
+            return False
+        if jti in self._local:
+            return True
+        record = await state_backend.get(REVOKED_NAMESPACE, jti)
+        if record is None:
+            return False
+        self._prune(time.time())
+        self._local[jti] = float(record["exp"])
+        return True
+
+    async def revoke(self, payload: Dict[str, Any]) -> None:
+        jti = payload.get("jti")
+        exp = float(payload.get("exp", 0))
+        now = time.time()
+        if not jti or exp <= now:
+            return
+        self._prune(now)
+        self._local[jti] = exp
+        token_cache.drop(jti)
+        await state_backend.set(REVOKED_NAMESPACE, jti, {"exp": exp}, ttl=exp - now)
+
+token_cache = VerifiedTokenCache()
+token_denylist = TokenDenylist()
 
 def create_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def issue_tokens(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Пара access/refresh для пользователя"""
+    access = create_token({"sub": user["id"], "type": user["userType"]})
+    refresh = create_token({"sub": user["id"], "type": REFRESH_TOKEN_TYPE}, expires_minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
+    return {"accessToken": access, "refreshToken": refresh, "expiresIn": ACCESS_TOKEN_EXPIRE_MINUTES * 60}
+
 def verify_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -27,10 +134,60 @@ def verify_token(token: str) -> dict:
     except PyJWTError as exc:
         raise HTTPException(status_code=401, detail="Invalid token") from exc
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+async def _user_from_token(token: str):
+    now = time.time()
+    entry = token_cache.get(token, now)
+    if entry is None:
+        payload = verify_token(token)
+        if payload.get("type") == REFRESH_TOKEN_TYPE:
+            raise HTTPException(status_code=401, detail="Refresh token cannot be used for API access")
+        entry = token_cache.put(token, payload)
+    elif token_denylist.is_revoked_locally(entry.payload.get("jti")):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    if entry.user is None or entry.checked_until <= now:
+        # Раз в TOKEN_RECHECK_SECONDS: отзыв в другом воркере и изменения пользователя
+        if await token_denylist.is_revoked(entry.payload.get("jti")):
+            raise HTTPException(status_code=401, detail="Token revoked")
+        user_id = entry.payload.get("sub")
+        user = await user_repository.get(user_id) if user_id else None
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        entry.user, entry.checked_until = user, now + TOKEN_RECHECK_SECONDS
+    return entry.user
+
+async def verify_refresh_token(token: str) -> Dict[str, Any]:
     payload = verify_token(token)
-    user_id = payload.get("sub")
-    if not user_id or user_id not in users_db:
+    if payload.get("type") != REFRESH_TOKEN_TYPE:
+        raise HTTPException(status_code=401, detail="Not a refresh token")
+    if await token_denylist.is_revoked(payload.get("jti")):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await _user_from_token(credentials.credentials)
+
+async def issue_stream_ticket(user: Dict[str, Any]) -> Dict[str, Any]:
+    ticket = secrets.token_urlsafe(32)
+    await state_backend.set(STREAM_TICKET_NAMESPACE, ticket, {"sub": user["id"]}, ttl=STREAM_TICKET_TTL_SECONDS)
+    return {"ticket": ticket, "expiresIn": STREAM_TICKET_TTL_SECONDS}
+
+async def _user_from_stream_ticket(ticket: str):
+    # Под блокировкой: два подключения с одним билетом не пройдут даже из разных воркеров
+    async with state_backend.lock(f"stream_ticket:{ticket}"):
+        record = await state_backend.get(STREAM_TICKET_NAMESPACE, ticket)
+        if record is None:
+            raise HTTPException(status_code=401, detail="Invalid or used stream ticket")
+        await state_backend.delete(STREAM_TICKET_NAMESPACE, ticket)
+    user = await user_repository.get(record["sub"])
+    if not user:
         raise HTTPException(status_code=401, detail="User not found")
-    return users_db[user_id]
+    return user
+
+async def get_stream_user(ticket: Optional[str] = Query(None),
+                          credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Для EventSource: браузер не даёт задать заголовок, поэтому в query принимается только одноразовый билет"""
+    if credentials:
+        return await _user_from_token(credentials.credentials)
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await _user_from_stream_ticket(ticket)
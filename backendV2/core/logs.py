@@ -0,0 +1,132 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Any, Optional
+
+LOG_LEVEL = os.getenv("MONETRIX_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("MONETRIX_LOG_FORMAT", "text")  # text | json
+LOG_QUEUE_SIZE = int(os.getenv("MONETRIX_LOG_QUEUE_SIZE", "10000"))  # при переполнении записи отбрасываются, а не ждут
+# Доля записей частых событий (каждый запрос к API, попадания в кэш снимков и токенов), которая попадает в лог
+LOG_SAMPLE_RATE = float(os.getenv("MONETRIX_LOG_SAMPLE_RATE", "0.01"))
+ROOT_LOGGER = __name__.split(".")[0]
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Кладёт запись в очередь и сразу возвращается; вывод делает отдельный поток QueueListener"""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трейсбек фиксируем сразу, форматирование полей остаётся потоку вывода
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = f"{stamp} {record.levelname:<7} {getattr(record, 'event', record.name)} {record.getMessage()}"
+        if fields:
+            line = f"{line} {fields}"
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": getattr(record, "event", None),
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredLogger:
+    """Логгер событий: имя события, короткое сообщение и поля; sample < 1 пропускает только долю записей"""
+
+    def __init__(self, name: str) -> None:
+        self._logger = logging.getLogger(name)
+
+    def log(self, level: int, event: str, message: str = "", *, sample: float = 1.0, exc_info: Any = None, **fields: Any) -> None:
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample < 1.0 and random.random() >= sample:
+            return
+        if sample < 1.0:
+            fields["sample"] = sample
+        self._logger.log(level, message, exc_info=exc_info, extra={"event": event, "fields": fields})
+
+    def debug(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log(logging.DEBUG, event, message, **fields)
+
+    def info(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log(logging.INFO, event, message, **fields)
+
+    def warning(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log(logging.WARNING, event, message, **fields)
+
+    def error(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log(logging.ERROR, event, message, **fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """Подключает очередь к логгеру пакета и запускает поток вывода; повторный вызов ничего не делает"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    logger.addHandler(_handler)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь и останавливает поток вывода"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+    if _handler is not None:
+        logging.getLogger(ROOT_LOGGER).removeHandler(_handler)
+        logging.getLogger(ROOT_LOGGER).propagate = True
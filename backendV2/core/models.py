@@ -1,6 +1,6 @@
 from enum import Enum
 from pydantic import BaseModel, EmailStr
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 
 class UserType(str, Enum):
     INDIVIDUAL = "individual"
@@ -31,8 +31,17 @@ class RegisterBusinessRequest(BaseModel):
     email: EmailStr
     password: str
     bankClientId: Optional[str] = None
+    bankClientIds: Optional[List[str]] = None  # клиенты банка по всем юрлицам компании
     userType: Literal["business"] = "business"
 
+class RefreshRequest(BaseModel):
+    refreshToken: str
+
 class ConsentRequest(BaseModel):
     bankCode: str
     clientId: Optional[str] = None
+
+class BulkConsentRequest(BaseModel):
+    clientIds: Optional[List[str]] = None
+    banks: Optional[List[str]] = None
+    forceNew: bool = False
@@ -0,0 +1,96 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from .metrics import metrics
+
+# Стоимость scrypt: N — память и время (степень двойки), r — размер блока, p — параллелизм.
+# При изменении старые хэши пересчитываются при следующем успешном входе.
+PASSWORD_SCRYPT_N = int(os.getenv("MONETRIX_PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv("MONETRIX_PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("MONETRIX_PASSWORD_SCRYPT_P", "1"))
+PASSWORD_HASH_WORKERS = int(os.getenv("MONETRIX_PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+SALT_BYTES = 16
+KEY_BYTES = 32
+SCHEME = "scrypt"
+
+password_hash_seconds = metrics.histogram(
+    "monetrix_password_hash_seconds", "Время scrypt в пуле, включая ожидание свободного потока", ("operation",))
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # OpenSSL по умолчанию ограничивает память 32 МБ; задаём ровно столько, сколько нужно для N и r
+    maxmem = 128 * r * (n + p + 2) + (1 << 20)
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=KEY_BYTES)
+
+
+def _parse(encoded: str) -> Optional[Tuple[int, int, int, bytes, bytes]]:
+    try:
+        scheme, n, r, p, salt, key = encoded.split("$")
+        if scheme != SCHEME:
+            return None
+        return int(n), int(r), int(p), _b64decode(salt), _b64decode(key)
+    except (AttributeError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """scrypt в ограниченном пуле потоков: OpenSSL отпускает GIL, и event loop не ждёт KDF"""
+
+    def __init__(self, n: int = PASSWORD_SCRYPT_N, r: int = PASSWORD_SCRYPT_R, p: int = PASSWORD_SCRYPT_P,
+                 workers: int = PASSWORD_HASH_WORKERS) -> None:
+        self.n, self.r, self.p = n, r, p
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Вход по неизвестному email тратит столько же времени, сколько по известному
+        self._dummy = f"{SCHEME}${n}${r}${p}${_b64encode(bytes(SALT_BYTES))}${_b64encode(bytes(KEY_BYTES))}"
+
+    def hash_sync(self, password: str) -> str:
+        salt = os.urandom(SALT_BYTES)
+        key = _scrypt(password, salt, self.n, self.r, self.p)
+        return f"{SCHEME}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify_sync(self, password: str, encoded: Optional[str]) -> bool:
+        parsed = _parse(encoded or self._dummy)
+        if parsed is None:
+            parsed = _parse(self._dummy)
+            encoded = None
+        n, r, p, salt, expected = parsed
+        key = _scrypt(password, salt, n, r, p)
+        return hmac.compare_digest(key, expected) and encoded is not None
+
+    def needs_rehash(self, encoded: Optional[str]) -> bool:
+        parsed = _parse(encoded or "")
+        return parsed is None or parsed[:3] != (self.n, self.r, self.p)
+
+    async def _run(self, operation: str, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="passwords")
+        with password_hash_seconds.time(operation=operation):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.hash_sync, password)
+
+    async def verify(self, password: str, encoded: Optional[str]) -> bool:
+        """None или нераспознанный хэш — False, но после полного расчёта scrypt"""
+        return await self._run("verify", self.verify_sync, password, encoded)
+
+    async def close(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import os
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from ..banks.records import dumps
+
+try:
+    import brotli  # сжатие br доступно, если установлен пакет brotli (pip install brotli)
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESS_MIN_BYTES = int(os.getenv("MONETRIX_COMPRESS_MIN_BYTES", "1024"))  # ответы меньше порога отдаём как есть
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Версии снимков считаются в каждом процессе заново: соль не даёт ETag одного воркера совпасть с другим
+_ETAG_SALT = uuid.uuid4().hex[:8]
+_VARY = "Accept-Encoding, Authorization"
+_CACHE_CONTROL = "private, no-cache"
+
+
+def _accepted_encodings(request: Request) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(request: Request) -> Optional[str]:
+    accepted = _accepted_encodings(request)
+    if BROTLI_AVAILABLE and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Сжимает тело выбранным кодированием; короткие ответы не сжимаются"""
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+
+
+def snapshot_etag(request: Request, version: int, *scope: Any) -> str:
+    """Строгий ETag по версии снимка, пути, параметрам запроса и тому, для кого собран ответ"""
+    parts = [_ETAG_SALT, str(version), request.url.path, request.url.query, *map(str, scope)]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def content_etag(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+def _representation_etag(etag: str, encoding: Optional[str]) -> str:
+    # Сжатое и несжатое представления — разные байты, поэтому и строгие ETag у них разные
+    return f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+
+
+def if_none_match(request: Request, etag: str) -> Optional[str]:
+    """ETag из If-None-Match, совпавший с текущим (любое из представлений), иначе None"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return _representation_etag(etag, None)
+        value = candidate[2:] if candidate.startswith("W/") else candidate
+        value = value.strip('"')
+        if value == etag or value.startswith(f"{etag}-"):
+            return f'"{value}"'
+    return None
+
+
+def _headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Vary": _VARY, "Cache-Control": _CACHE_CONTROL}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 Not Modified, если у клиента уже есть эта версия ответа"""
+    matched = if_none_match(request, etag)
+    if matched is None:
+        return None
+    return Response(status_code=304, headers=_headers(matched))
+
+
+def encoded_response(body: bytes, etag: str, encoding: Optional[str]) -> Response:
+    headers = _headers(_representation_etag(etag, encoding))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def json_response(request: Request, payload: Any, *, etag: Optional[str] = None) -> Response:
+    """JSON-ответ со сжатием и ETag; без etag он считается по содержимому"""
+    body = dumps(payload)
+    etag = etag or content_etag(body)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    body, encoding = compress(body, choose_encoding(request))
+    return encoded_response(body, etag, encoding)
+
+
+def snapshot_response(request: Request, cache: Dict[Any, Any], name: str, version: int,
+                      build: Callable[[], Any], *scope: Any) -> Response:
+    """Ответ без параметров по снимку: 304 без сборки данных, иначе сжатое тело из кэша снимка"""
+    etag = snapshot_etag(request, version, *scope)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    encoding = choose_encoding(request)
+    key = ("response", name, encoding)
+    entry = cache.get(key)
+    if entry is None:
+        entry = cache[key] = compress(dumps(build()), encoding)
+    body, used_encoding = entry
+    return encoded_response(body, etag, used_encoding)
@@ -0,0 +1,45 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+
+class SQLiteWorkerPool:
+    """Файл SQLite в режиме WAL: своё соединение на каждый поток пула, запросы не блокируют event loop"""
+    schema: Tuple[str, ...] = ()  # CREATE ... IF NOT EXISTS, выполняются при открытии соединения
+    thread_name_prefix = "sqlite"
+
+    def __init__(self, path: str, workers: int) -> None:
+        self.path = path
+        self.workers = workers
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._connections.append(conn)
+        return conn
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.thread_name_prefix)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def close(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+        for conn in self._connections:
+            conn.close()
+        self._connections.clear()
+        self._local = threading.local()
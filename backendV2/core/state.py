@@ -0,0 +1,256 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional, Tuple
+from .logs import get_logger
+from .sqlite import SQLiteWorkerPool
+
+STATE_BACKEND = os.getenv("MONETRIX_STATE_BACKEND", "memory")  # memory | sqlite
+STATE_DB_PATH = os.getenv("MONETRIX_STATE_DB", "monetrix_state.db")
+STATE_DB_WORKERS = int(os.getenv("MONETRIX_STATE_DB_WORKERS", "4"))
+LOCK_TIMEOUT_SECONDS = 30.0  # сколько ждём чужую блокировку
+LOCK_LEASE_SECONDS = 60.0  # блокировка упавшего процесса освобождается по истечении аренды
+LOCK_RENEW_FRACTION = 3  # живой владелец продлевает аренду каждые lease / 3, пока держит блокировку
+LOCK_POLL_SECONDS = 0.05
+SQL_BATCH_SIZE = 500  # ключей в одном IN (...) — ниже лимита параметров SQLite
+# Как часто set заодно удаляет истёкшие записи (отозванные jti, одноразовые ключи): без этого они копятся до рестарта
+STATE_SWEEP_INTERVAL_SECONDS = float(os.getenv("MONETRIX_STATE_SWEEP_INTERVAL", "60"))
+
+log = get_logger(__name__)
+
+
+class KeyedLocks:
+    """asyncio.Lock на ключ; запись удаляется, как только у блокировки не остаётся держателя и ожидающих"""
+
+    def __init__(self) -> None:
+        self._locks: Dict[Hashable, List[Any]] = {}  # key -> [lock, refcount]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].acquire(), timeout)
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._locks.get(key) is entry:
+                del self._locks[key]
+
+
+class StateBackend(ABC):
+    """Общее состояние воркеров (токены банков, согласия) и именованные блокировки"""
+    shared = False  # видят ли состояние другие процессы
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    async def get_many(self, namespace: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Несколько ключей за одно обращение; отсутствующие в ответ не попадают"""
+        values = {}
+        for key in keys:
+            value = await self.get(namespace, key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    @abstractmethod
+    async def set(self, namespace: str, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, namespace: str, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def lock(self, name: str, *, timeout: float = LOCK_TIMEOUT_SECONDS, lease: float = LOCK_LEASE_SECONDS):
+        """Асинхронный контекстный менеджер; TimeoutError, если блокировку не удалось взять за timeout.
+        Аренда lease ограничивает время жизни блокировки упавшего владельца, а не длину критической секции"""
+
+    async def close(self) -> None:
+        pass
+
+
+class InProcessStateBackend(StateBackend):
+    def __init__(self) -> None:
+        self._values: Dict[Tuple[str, str], Tuple[Dict[str, Any], Optional[float]]] = {}
+        self._locks = KeyedLocks()
+        self._next_sweep = time.time() + STATE_SWEEP_INTERVAL_SECONDS
+
+    def _sweep(self, now: float) -> None:
+        expired = [item for item, (_, expires_at) in self._values.items() if expires_at is not None and expires_at <= now]
+        for item in expired:
+            del self._values[item]
+        self._next_sweep = now + STATE_SWEEP_INTERVAL_SECONDS
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._values.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._values.pop((namespace, key), None)
+            return None
+        return value
+
+    async def set(self, namespace: str, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        now = time.time()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        self._values[(namespace, key)] = (value, now + ttl if ttl else None)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        self._values.pop((namespace, key), None)
+
+    @asynccontextmanager
+    async def lock(self, name: str, *, timeout: float = LOCK_TIMEOUT_SECONDS, lease: float = LOCK_LEASE_SECONDS) -> AsyncIterator[None]:
+        async with self._locks.hold(name, timeout):
+            yield
+
+
+class SQLiteStateBackend(SQLiteWorkerPool, StateBackend):
+    """Состояние в файле SQLite (WAL), общее для всех воркеров на машине; блокировки — строки с арендой"""
+    shared = True
+    schema = (
+        "CREATE TABLE IF NOT EXISTS state ("
+        " namespace TEXT NOT NULL,"
+        " key TEXT NOT NULL,"
+        " value TEXT NOT NULL,"
+        " expires_at REAL,"
+        " PRIMARY KEY (namespace, key))",
+        "CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)",
+        "CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+    )
+    thread_name_prefix = "state-db"
+
+    def __init__(self, path: str = STATE_DB_PATH, workers: int = STATE_DB_WORKERS) -> None:
+        super().__init__(path, workers)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local_locks = KeyedLocks()
+        self._next_sweep = time.time() + STATE_SWEEP_INTERVAL_SECONDS
+
+    def _get_sync(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _get_many_sync(self, namespace: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        values: Dict[str, Dict[str, Any]] = {}
+        now = time.time()
+        conn = self._connect()
+        for start in range(0, len(keys), SQL_BATCH_SIZE):
+            batch = keys[start:start + SQL_BATCH_SIZE]
+            rows = conn.execute(
+                f"SELECT key, value FROM state WHERE namespace = ? AND key IN ({','.join('?' * len(batch))})"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, *batch, now),
+            ).fetchall()
+            values.update((key, json.loads(value)) for key, value in rows)
+        return values
+
+    def _set_sync(self, namespace: str, key: str, value: Dict[str, Any], ttl: Optional[float]) -> None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None),
+        )
+        if now >= self._next_sweep:
+            self._sweep_sync(conn, now)
+
+    def _sweep_sync(self, conn: sqlite3.Connection, now: float) -> None:
+        # Срок следующей чистки сдвигается до DELETE, чтобы параллельные set её не повторяли
+        self._next_sweep = now + STATE_SWEEP_INTERVAL_SECONDS
+        conn.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM locks WHERE expires_at <= ?", (now,))
+
+    def _delete_sync(self, namespace: str, key: str) -> None:
+        self._connect().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _try_lock_sync(self, name: str, lease: float) -> bool:
+        conn = self._connect()
+        now = time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM locks WHERE name = ? AND expires_at <= ?", (name, now))
+            conn.execute("INSERT OR IGNORE INTO locks (name, owner, expires_at) VALUES (?, ?, ?)", (name, self.owner, now + lease))
+            row = conn.execute("SELECT owner FROM locks WHERE name = ?", (name,)).fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return bool(row and row[0] == self.owner)
+
+    def _renew_sync(self, name: str, lease: float) -> bool:
+        cur = self._connect().execute(
+            "UPDATE locks SET expires_at = ? WHERE name = ? AND owner = ?", (time.time() + lease, name, self.owner)
+        )
+        return cur.rowcount == 1
+
+    async def _keep_lease(self, name: str, lease: float) -> None:
+        """Продлевает аренду, пока блокировка удерживается: долгая секция не отдаёт её другому процессу"""
+        while True:
+            await asyncio.sleep(lease / LOCK_RENEW_FRACTION)
+            if not await self._run(self._renew_sync, name, lease):
+                log.warning("state.lock_lost", "⚠️  Аренда блокировки истекла до продления", lock=name)
+                return
+
+    def _unlock_sync(self, name: str) -> None:
+        self._connect().execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, self.owner))
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_sync, namespace, key)
+
+    async def get_many(self, namespace: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await self._run(self._get_many_sync, namespace, keys) if keys else {}
+
+    async def set(self, namespace: str, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        await self._run(self._set_sync, namespace, key, value, ttl)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._run(self._delete_sync, namespace, key)
+
+    @asynccontextmanager
+    async def lock(self, name: str, *, timeout: float = LOCK_TIMEOUT_SECONDS, lease: float = LOCK_LEASE_SECONDS) -> AsyncIterator[None]:
+        # Корутины своего процесса ждут на локальной блокировке и не опрашивают базу
+        deadline = time.monotonic() + timeout
+        async with self._local_locks.hold(name, timeout):
+            while not await self._run(self._try_lock_sync, name, lease):
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"State lock {name} is held by another process")
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+            renewal = asyncio.create_task(self._keep_lease(name, lease))
+            try:
+                yield
+            finally:
+                renewal.cancel()
+                await asyncio.shield(self._run(self._unlock_sync, name))
+
+
+def create_state_backend(backend: str = STATE_BACKEND) -> StateBackend:
+    if backend == "memory":
+        return InProcessStateBackend()
+    if backend == "sqlite":
+        return SQLiteStateBackend()
+    raise ValueError(f"Unknown state backend: {backend}")
+
+
+state_backend = create_state_backend()
@@ -0,0 +1,192 @@
+import itertools
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+from .sqlite import SQLiteWorkerPool
+
+USER_STORE_BACKEND = os.getenv("MONETRIX_USER_STORE", "sqlite")  # sqlite | memory
+USER_DB_PATH = os.getenv("MONETRIX_USER_DB", "monetrix_users.db")
+USER_DB_WORKERS = int(os.getenv("MONETRIX_USER_DB_WORKERS", "4"))
+SECRET_FIELDS = ("password", "passwordHash")  # никогда не покидают сервер
+
+
+class UserAlreadyExists(Exception):
+    pass
+
+
+def normalize_email(email: str) -> str:
+    return str(email).strip().lower()
+
+
+def bank_client_ids(user: Dict[str, Any]) -> List[str]:
+    """Клиенты банка, указанные в записи пользователя (без клиента по умолчанию)"""
+    return list(dict.fromkeys(filter(None, user.get("bankClientIds") or [user.get("bankClientId")])))
+
+
+def public_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Пользователь для ответа API — без пароля и его хэша"""
+    return {key: value for key, value in user.items() if key not in SECRET_FIELDS}
+
+
+class UserRepository(ABC):
+    """Хранилище пользователей: поиск по id и email за O(1), выдача новых id"""
+
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_by_bank_client(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """Пользователь, за которым записан клиент банка; у общего клиента таких может быть несколько — вернётся любой"""
+
+    @abstractmethod
+    async def create(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Сохраняет пользователя, присваивая ему id; UserAlreadyExists, если email занят"""
+
+    @abstractmethod
+    async def update(self, user: Dict[str, Any]) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryUserRepository(UserRepository):
+    def __init__(self) -> None:
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_email: Dict[str, str] = {}
+        self._by_client: Dict[str, str] = {}
+        self._ids = itertools.count(1)
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(user_id)
+
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        user_id = self._by_email.get(normalize_email(email))
+        return self._by_id.get(user_id) if user_id else None
+
+    async def get_by_bank_client(self, client_id: str) -> Optional[Dict[str, Any]]:
+        user_id = self._by_client.get(client_id)
+        return self._by_id.get(user_id) if user_id else None
+
+    def _index_clients(self, user: Dict[str, Any]) -> None:
+        for client_id in [client_id for client_id, user_id in self._by_client.items() if user_id == user["id"]]:
+            del self._by_client[client_id]
+        for client_id in bank_client_ids(user):
+            self._by_client.setdefault(client_id, user["id"])
+
+    async def create(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        key = normalize_email(user["email"])
+        if key in self._by_email:
+            raise UserAlreadyExists(user["email"])
+        user = {**user, "id": f"u-{next(self._ids)}"}
+        self._by_id[user["id"]] = user
+        self._by_email[key] = user["id"]
+        self._index_clients(user)
+        return user
+
+    async def update(self, user: Dict[str, Any]) -> None:
+        self._by_id[user["id"]] = user
+        self._index_clients(user)
+
+
+class SQLiteUserRepository(SQLiteWorkerPool, UserRepository):
+    """Пользователи в таблице users; id выдаётся по AUTOINCREMENT-последовательности"""
+    schema = (
+        "CREATE TABLE IF NOT EXISTS users ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " id TEXT UNIQUE,"
+        " email TEXT NOT NULL UNIQUE,"
+        " data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS user_clients (client_id TEXT NOT NULL, user_id TEXT NOT NULL, PRIMARY KEY (client_id, user_id))",
+        # Базы, созданные до user_clients: клиенты переносятся из JSON пользователей один раз, пока таблица пуста
+        "INSERT OR IGNORE INTO user_clients (client_id, user_id)"
+        " SELECT json_each.value, users.id FROM users, json_each(users.data, '$.bankClientIds')"
+        " WHERE NOT EXISTS (SELECT 1 FROM user_clients)"
+        " UNION SELECT json_extract(data, '$.bankClientId'), id FROM users"
+        " WHERE json_extract(data, '$.bankClientIds') IS NULL AND json_extract(data, '$.bankClientId') IS NOT NULL"
+        " AND NOT EXISTS (SELECT 1 FROM user_clients)",
+    )
+    thread_name_prefix = "users-db"
+
+    def __init__(self, path: str = USER_DB_PATH, workers: int = USER_DB_WORKERS) -> None:
+        super().__init__(path, workers)
+
+    def _get_sync(self, column: str, value: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(f"SELECT data FROM users WHERE {column} = ?", (value,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _get_by_bank_client_sync(self, client_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM users JOIN user_clients ON user_clients.user_id = users.id WHERE user_clients.client_id = ? LIMIT 1",
+            (client_id,),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _index_clients_sync(conn: sqlite3.Connection, user: Dict[str, Any]) -> None:
+        conn.execute("DELETE FROM user_clients WHERE user_id = ?", (user["id"],))
+        conn.executemany("INSERT INTO user_clients (client_id, user_id) VALUES (?, ?)",
+                         [(client_id, user["id"]) for client_id in bank_client_ids(user)])
+
+    def _create_sync(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute("INSERT INTO users (email, data) VALUES (?, '{}')", (normalize_email(user["email"]),))
+            user = {**user, "id": f"u-{cur.lastrowid}"}
+            conn.execute("UPDATE users SET id = ?, data = ? WHERE seq = ?", (user["id"], json.dumps(user, ensure_ascii=False), cur.lastrowid))
+            self._index_clients_sync(conn, user)
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise UserAlreadyExists(user["email"]) from exc
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return user
+
+    def _update_sync(self, user: Dict[str, Any]) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE users SET data = ? WHERE id = ?", (json.dumps(user, ensure_ascii=False), user["id"]))
+            self._index_clients_sync(conn, user)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_sync, "id", user_id)
+
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_sync, "email", normalize_email(email))
+
+    async def get_by_bank_client(self, client_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_by_bank_client_sync, client_id)
+
+    async def create(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._run(self._create_sync, user)
+
+    async def update(self, user: Dict[str, Any]) -> None:
+        await self._run(self._update_sync, user)
+
+
+def create_user_repository(backend: str = USER_STORE_BACKEND) -> UserRepository:
+    if backend == "memory":
+        return InMemoryUserRepository()
+    if backend == "sqlite":
+        return SQLiteUserRepository()
+    raise ValueError(f"Unknown user store backend: {backend}")
+
+
+user_repository = create_user_repository()
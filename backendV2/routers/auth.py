@@ -1,85 +1,116 @@
 import asyncio
-import logging
-from fastapi import APIRouter, BackgroundTasks
-from typing import Dict
-from ..core.models import LoginRequest, RegisterIndividualRequest, RegisterBusinessRequest, UserType
-from ..core.auth import create_token, users_db
-from ..banks.config import BANK_CLIENT_IDS, BANK_CONFIGS, resolve_bank_clients
-from ..banks.client import ensure_bank_token, ensure_consent
+import hmac
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from typing import Any, Dict, List, Optional
+from ..core.models import LoginRequest, RefreshRequest, RegisterIndividualRequest, RegisterBusinessRequest, UserType
+from ..core.auth import issue_tokens, optional_security, token_cache, token_denylist, verify_refresh_token, verify_token
+from ..core.passwords import password_hasher
+from ..core.state import state_backend
+from ..core.logs import get_logger
+from ..core.users import UserAlreadyExists, bank_client_ids, public_user, user_repository
+from ..banks.config import BANK_CLIENT_IDS, user_client_ids
+from ..banks.onboarding import bootstrap_consents
 
-logger = logging.getLogger(__name__)
+log = get_logger(__name__)
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
-async def _create_consents_for_user(bank_client_id: str):
-    """Автоматически создает согласия для всех банков после регистрации"""
-    print(f"\n🔄 Начинаю создание согласий для bankClientId: {bank_client_id}")
-    client_mapping = resolve_bank_clients(bank_client_id)
-    results = []
-    for bank_code in BANK_CONFIGS:
-        try:
-            client_id = client_mapping.get(bank_code)
-            if not client_id:
-                continue
-            print(f"  ⏳ Создаю согласие для {bank_code} (client: {client_id})...")
-            token = await ensure_bank_token(bank_code)
-            state = await ensure_consent(bank_code, client_id, token, force_new=True)
-            status_emoji = "✅" if state.status.value == "active" else "⏳" if state.status.value == "pending" else "❌"
-            print(f"  {status_emoji} {bank_code}: consentId={state.consent_id}, status={state.status.value}")
-            results.append({"bank": bank_code, "consentId": state.consent_id, "status": state.status.value})
-        except Exception as e:
-            print(f"  ❌ Ошибка при создании согласия для {bank_code}: {e}")
-            results.append({"bank": bank_code, "error": str(e)})
-    print(f"✅ Создание согласий завершено. Результаты: {results}\n")
+async def _create_consents_for_user(client_ids: List[str]):
+    """Автоматически создает согласия для всех банков и всех клиентов пользователя после регистрации"""
+    log.info("onboarding.start", "🔄 Начинаю создание согласий", client_ids=client_ids)
+    # Без force_new: действующее или ожидающее согласие клиента (например, общего демо-клиента) не отзывается
+    report = await bootstrap_consents(client_ids)
+    statuses = {f"{bank_code}:{entry['clientId']}": entry.get("status") or "error"
+                for bank_code, entries in report["results"].items() for entry in entries}
+    log.info("onboarding.done", "✅ Создание согласий завершено", client_ids=client_ids, statuses=statuses)
+
+async def _claim_error(client_ids: List[str]) -> Optional[str]:
+    """Клиента можно указать, только если он есть в пуле команды и не записан за другим пользователем"""
+    unknown = [client_id for client_id in client_ids if client_id not in BANK_CLIENT_IDS]
+    if unknown:
+        return f"Unknown bank clients: {', '.join(unknown)}"
+    # Клиент по умолчанию общий для всех, кто не указал своего, — его не закрепляем
+    owners = await asyncio.gather(*(user_repository.get_by_bank_client(client_id) for client_id in client_ids
+                                    if client_id != BANK_CLIENT_IDS[0]))
+    taken = sorted({client_id for owner in owners if owner for client_id in bank_client_ids(owner) if client_id in client_ids})
+    return f"Bank clients are already linked to another account: {', '.join(taken)}" if taken else None
 
 @router.post("/register")
 async def register(request: RegisterIndividualRequest | RegisterBusinessRequest, background_tasks: BackgroundTasks) -> Dict:
-    for user in users_db.values():
-        if user["email"] == request.email:
-            return {"error": "Email already registered"}
-    user_id = f"u-{len(users_db)+1}"
-    bank_client_id = request.bankClientId or BANK_CLIENT_IDS[0]
+    client_ids = list(dict.fromkeys(filter(None, [request.bankClientId, *(getattr(request, "bankClientIds", None) or [])])))
+    bank_client_id = client_ids[0] if client_ids else BANK_CLIENT_IDS[0]
     user = {
-        "id": user_id,
         "userType": UserType.INDIVIDUAL.value if isinstance(request, RegisterIndividualRequest) else UserType.BUSINESS.value,
         "fullName": getattr(request, "fullName", None) or getattr(request, "contact", None),
         "companyName": getattr(request, "companyName", None),
         "email": request.email,
-        "password": request.password,
+        "passwordHash": await password_hasher.hash(request.password),
         "bankClientId": bank_client_id,
     }
-    users_db[user_id] = user
-    access = create_token({"sub": user_id, "type": user["userType"]})
-    refresh = create_token({"sub": user_id, "type": "refresh"}, expires_minutes=60*24*7)
-    #Логирование для отладки
-    print("\n" + "="*80)
-    print("🔑 НОВЫЙ ПОЛЬЗОВАТЕЛЬ ЗАРЕГИСТРИРОВАН")
-    print("="*80)
-    print(f"User ID: {user_id}")
-    print(f"Email: {user['email']}")
-    print(f"Bank Client ID: {bank_client_id}")
-    print(f"\n📝 ACCESS TOKEN (используй в curl):")
-    print(f"{access}")
-    print("="*80 + "\n")
+    if len(client_ids) > 1:
+        user["bankClientIds"] = client_ids
+    # Под общей блокировкой: два одновременных запроса не закрепят одного клиента за разными пользователями
+    async with state_backend.lock("register:bank_clients"):
+        error = await _claim_error(client_ids)
+        if error:
+            log.warning("auth.clients_rejected", "⛔ Регистрация с чужими или неизвестными клиентами", clients=len(client_ids))
+            return {"error": error}
+        try:
+            user = await user_repository.create(user)
+        except UserAlreadyExists:
+            return {"error": "Email already registered"}
+    log.info("auth.registered", "🔑 Новый пользователь зарегистрирован", user_id=user["id"], bank_client_id=bank_client_id,
+             clients=len(client_ids) or 1)
     
-    background_tasks.add_task(_create_consents_for_user, bank_client_id)
+    background_tasks.add_task(_create_consents_for_user, user_client_ids(user))
     
-    return {"accessToken": access, "refreshToken": refresh, "expiresIn": 3600, "user": user}
+    return {**issue_tokens(user), "user": public_user(user)}
+
+async def _authenticate(email: str, password: str) -> Optional[Dict[str, Any]]:
+    """Проверка пароля в пуле; при смене стоимости scrypt или старом пароле в открытом виде хэш пересчитывается"""
+    user = await user_repository.get_by_email(email)
+    if user is not None and "passwordHash" not in user:
+        # Записи, созданные до хэширования: сравнение за постоянное время и перевод на scrypt
+        valid = hmac.compare_digest(str(user.get("password", "")).encode("utf-8"), password.encode("utf-8"))
+    else:
+        valid = await password_hasher.verify(password, user["passwordHash"] if user else None)
+    if not valid:
+        return None
+    if password_hasher.needs_rehash(user.get("passwordHash")):
+        user = {key: value for key, value in user.items() if key != "password"}
+        user["passwordHash"] = await password_hasher.hash(password)
+        await user_repository.update(user)
+        token_cache.forget_user(user["id"])
+        log.info("auth.rehashed", "🔁 Хэш пароля пересчитан", user_id=user["id"])
+    return user
 
 @router.post("/login")
 async def login(request: LoginRequest) -> Dict:
-    for uid, user in users_db.items():
-        if user["email"] == request.email and user["password"] == request.password and user["userType"] == request.userType.value:
-            access = create_token({"sub": uid, "type": user["userType"]})
-            refresh = create_token({"sub": uid, "type": "refresh"}, expires_minutes=60*24*7)
-            
-            print("\n" + "="*80)
-            print("🔐 ПОЛЬЗОВАТЕЛЬ ВОШЕЛ В СИСТЕМУ")
-            print("="*80)
-            print(f"User ID: {uid}")
-            print(f"Email: {user['email']}")
-            print(f"\n📝 ACCESS TOKEN (используй в curl):")
-            print(f"{access}")
-            print("="*80 + "\n")
-            
-            return {"accessToken": access, "refreshToken": refresh, "expiresIn": 3600, "user": user}
+    user = await _authenticate(request.email, request.password)
+    if user and user["userType"] == request.userType.value:
+        log.info("auth.login", "🔐 Пользователь вошёл в систему", user_id=user["id"])
+        return {**issue_tokens(user), "user": public_user(user)}
     return {"error": "Invalid credentials"}
+
+@router.post("/refresh")
+async def refresh(request: RefreshRequest) -> Dict:
+    """Новая пара токенов по refresh-токену; старый refresh-токен отзывается (ротация)"""
+    payload = await verify_refresh_token(request.refreshToken)
+    async with state_backend.lock(f"refresh:{payload['jti']}"):
+        # Под блокировкой: одновременные запросы с одним токеном получают новую пару только один раз
+        if await token_denylist.is_revoked(payload["jti"]):
+            raise HTTPException(status_code=401, detail="Token revoked")
+        user = await user_repository.get(payload["sub"])
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        await token_denylist.revoke(payload)
+    return issue_tokens(user)
+
+@router.post("/logout")
+async def logout(request: RefreshRequest,
+                 credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Dict:
+    """Отзывает refresh-токен и, если передан, текущий access-токен"""
+    await token_denylist.revoke(await verify_refresh_token(request.refreshToken))
+    if credentials is not None:
+        await token_denylist.revoke(verify_token(credentials.credentials))
+    return {"revoked": True}
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Dict
-from ..core.models import ConsentRequest
+from ..core.models import BulkConsentRequest, ConsentRequest, UserType
 from ..core.auth import get_current_user
-from ..banks.client import ensure_bank_token, ensure_consent, fetch_consent_status, revoke_consent_remote, bank_consents_by_id, bank_consents_by_key
-from ..banks.config import BANK_CONFIGS, resolve_bank_clients
+from ..core.logs import get_logger
+from ..banks.client import ensure_bank_token, ensure_consent, fetch_consent_status, find_consent, forget_consent, revoke_consent_remote, save_consent, consent_scheduler
+from ..banks.cache import snapshot_cache
+from ..banks.config import BANK_CONFIGS, resolve_user_clients, user_client_ids
+from ..banks.onboarding import bootstrap_consents
 
+log = get_logger(__name__)
 router = APIRouter(prefix="/api/consents", tags=["consents"])
 
 @router.post("")
@@ -12,43 +16,61 @@ async def create_consent(request: ConsentRequest, current_user = Depends(get_cur
     bank_code = request.bankCode.lower()
     if bank_code not in BANK_CONFIGS:
         raise HTTPException(status_code=400, detail=f"Unknown bank code: {bank_code}")
-    client_mapping = resolve_bank_clients(current_user.get("bankClientId"))
-    client_id = request.clientId or client_mapping.get(bank_code)
+    client_id = request.clientId or next((client for bank, client in resolve_user_clients(current_user) if bank == bank_code), None)
     if not client_id:
         raise HTTPException(status_code=400, detail="Client ID is required")
     token = await ensure_bank_token(bank_code)
     state = await ensure_consent(bank_code, client_id, token, force_new=True)
+    snapshot_cache.invalidate(bank_code, client_id)
     return {"consentId": state.consent_id, "status": state.status.value, "bank": bank_code}
 
+@router.post("/bootstrap")
+async def bootstrap(request: BulkConsentRequest, current_user = Depends(get_current_user)) -> Dict:
+    if current_user.get("userType") != UserType.BUSINESS.value:
+        raise HTTPException(status_code=403, detail="Bulk onboarding is available for business accounts only")
+    banks = [code.lower() for code in request.banks] if request.banks else list(BANK_CONFIGS)
+    unknown = [code for code in banks if code not in BANK_CONFIGS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown bank code: {', '.join(unknown)}")
+    client_ids = list(dict.fromkeys(request.clientIds or []))
+    if not client_ids:
+        raise HTTPException(status_code=400, detail="clientIds is required")
+    # Подключать (а с forceNew — и перевыпускать) можно только своих клиентов: чужие согласия не трогаем
+    foreign = [client_id for client_id in client_ids if client_id not in user_client_ids(current_user)]
+    if foreign:
+        log.warning("onboarding.forbidden", "⛔ Попытка подключить чужих клиентов", user_id=current_user.get("id"), clients=len(foreign))
+        raise HTTPException(status_code=403, detail=f"Clients are not linked to this account: {', '.join(foreign)}")
+    log.info("onboarding.bulk", "🔄 Массовое подключение", clients=len(client_ids), banks=len(banks))
+    return await bootstrap_consents(client_ids, banks=banks, force_new=request.forceNew)
+
 @router.get("/{consent_id}/status")
-async def status(consent_id: str, current_user = Depends(get_current_user)) -> Dict:
-    state = bank_consents_by_id.get(consent_id)
+async def status(consent_id: str, current_user = Depends(get_current_user),
+                 wait: float = Query(0, ge=0, le=30)) -> Dict:
+    state = await find_consent(consent_id)
     if not state:
-        state = None
-        for s in bank_consents_by_key.values():
-            if s.request_id == consent_id:
-                state = s
-                break
-        if not state:
-            raise HTTPException(status_code=404, detail="Consent not found")
+        raise HTTPException(status_code=404, detail="Consent not found")
+    if wait and consent_scheduler.is_pending(state.bank_code, state.client_id):
+        # Ждём результата фоновой проверки вместо собственного опроса банка
+        resolved = await consent_scheduler.wait(state.bank_code, state.client_id, timeout=wait)
+        if resolved is not None:
+            return {"consentId": resolved.consent_id, "status": resolved.status.value, "bank": resolved.bank_code, "requestId": resolved.request_id}
     token = await ensure_bank_token(state.bank_code)
     cfg = BANK_CONFIGS[state.bank_code]
     updated = await fetch_consent_status(cfg, token, state.consent_id, state.client_id, state.request_id)
-    bank_consents_by_key[(updated.bank_code, updated.client_id)] = updated
-    if updated.consent_id:
-        bank_consents_by_id[updated.consent_id] = updated
-    if updated.request_id:
-        bank_consents_by_id[updated.request_id] = updated
+    if updated.status != state.status or updated.consent_id != state.consent_id:
+        snapshot_cache.invalidate(updated.bank_code, updated.client_id)
+    await save_consent(updated)
     return {"consentId": updated.consent_id, "status": updated.status.value, "bank": updated.bank_code, "requestId": updated.request_id}
 
 @router.delete("/{consent_id}")
 async def revoke(consent_id: str, current_user = Depends(get_current_user)) -> Dict:
-    state = bank_consents_by_id.get(consent_id)
+    state = await find_consent(consent_id)
     if not state:
         raise HTTPException(status_code=404, detail="Consent not found")
     token = await ensure_bank_token(state.bank_code)
     cfg = BANK_CONFIGS[state.bank_code]
     await revoke_consent_remote(cfg, token, consent_id)
-    bank_consents_by_id.pop(consent_id, None)
-    bank_consents_by_key.pop((state.bank_code, state.client_id), None)
+    await forget_consent(state)
+    consent_scheduler.untrack(state.bank_code, state.client_id)
+    snapshot_cache.invalidate(state.bank_code, state.client_id)
     return {"message": "ok"}
@@ -1,84 +1,138 @@
-from fastapi import APIRouter, Depends, Query
-from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Literal, Optional
 from ..core.auth import get_current_user
-from ..banks.client import aggregate_banks
-from ..banks.config import resolve_bank_clients
+from ..core.responses import json_response, not_modified, snapshot_etag, snapshot_response
+from ..banks.cache import Snapshot, snapshot_cache
+from ..banks.columnar import SnapshotColumns, snapshot_columns
+from ..banks.export import iter_csv, iter_ndjson
+from ..banks.client import refresh_account
+from ..banks.index import TransactionIndex, account_index, parse_timestamp, transaction_index
+from ..banks.store import transaction_store
+from ..banks.config import resolve_user_clients
 
 router = APIRouter(prefix="/api", tags=["dashboard"])
 
 
-def _safe_amount(value: Any) -> float:
-    try:
-        return float(value)
-    except Exception:
-        return 0.0
+async def _load_snapshot(current_user: Dict[str, Any]) -> Snapshot:
+    return await snapshot_cache.get(resolve_user_clients(current_user))
+
 
+async def _account_index(current_user: Dict[str, Any], account_id: Optional[str], bank: Optional[str]) -> Optional[TransactionIndex]:
+    """Пока снимка нет, запрос по известному счёту обслуживаем одним банком, не собирая данные остальных"""
+    if not account_id:
+        return None
+    clients = resolve_user_clients(current_user)
+    if snapshot_cache.peek(clients) is not None:
+        return None
+    owner = transaction_store.locate(account_id, clients)
+    if owner is None or (bank and owner[0] != bank):
+        return None
+    history = await refresh_account(owner[0], owner[1], account_id)
+    return account_index(history)
 
-def _extract_account_balance(account: Dict[str, Any]) -> float:
-    if "balance" in account:
-        return _safe_amount(account.get("balance"))
-    return 0.0
 
+def _validate_dates(*values: Optional[str]) -> None:
+    for value in values:
+        if value and parse_timestamp(value) is None:
+            raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
 
-def _calculate_summary(accounts: List[Dict[str, Any]], transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
-    net_worth = sum(_extract_account_balance(a) for a in accounts)
-    assets = sum(v for v in map(_extract_account_balance, accounts) if v >= 0)
-    liabilities = sum(abs(v) for v in map(_extract_account_balance, accounts) if v < 0)
-    cashflow = sum(_safe_amount(t.get("amount", 0)) for t in transactions)
+
+def _calculate_summary(columns: SnapshotColumns) -> Dict[str, Any]:
+    totals = columns.summary()
     return {
-        "netWorth": net_worth,
-        "assets": assets,
-        "liabilities": liabilities,
-        "cashflow": {"next30days": cashflow, "trend": 0},
+        "netWorth": totals["netWorth"],
+        "assets": totals["assets"],
+        "liabilities": totals["liabilities"],
+        "cashflow": {"next30days": totals["cashflow"], "trend": 0},
         "budgets": [],
     }
 
 
 @router.get("/dashboard/summary")
-async def summary(current_user = Depends(get_current_user)):
-    client_mapping = resolve_bank_clients(current_user.get("bankClientId"))
-    aggregated = await aggregate_banks(client_mapping)
-    summary_data = _calculate_summary(aggregated["accounts"], aggregated["transactions"])
-    summary_data["consents"] = aggregated["consents"]
-    summary_data["accounts"] = aggregated["accounts"]
-    return summary_data
+async def summary(request: Request, current_user = Depends(get_current_user)):
+    snapshot = await _load_snapshot(current_user)
+
+    def build() -> Dict[str, Any]:
+        columns = snapshot_columns(snapshot)
+        summary_data = _calculate_summary(columns)
+        summary_data["entities"] = columns.by_client()
+        summary_data["consents"] = snapshot.data["consents"]
+        summary_data["accounts"] = snapshot.data["accounts"]
+        return summary_data
+
+    return snapshot_response(request, snapshot.derived, "summary", snapshot.version, build)
 
 
 @router.get("/dashboard/transactions")
-async def transactions(current_user = Depends(get_current_user),
+async def transactions(request: Request,
+                       current_user = Depends(get_current_user),
                        from_date: Optional[str] = Query(None, alias="from"),
                        to_date: Optional[str] = Query(None, alias="to"),
                        accountId: Optional[str] = None,
-                       limit: int = 50,
-                       offset: int = 0):
-    client_mapping = resolve_bank_clients(current_user.get("bankClientId"))
-    aggregated = await aggregate_banks(client_mapping)
-    txs = aggregated["transactions"]
-
-    def match(tx: Dict[str, Any]) -> bool:
-        if accountId and str(tx.get("accountId")) != str(accountId):
-            return False
-        if from_date and str(tx.get("date")) < from_date:
-            return False
-        if to_date and str(tx.get("date")) > to_date:
-            return False
-        return True
-
-    filtered = [tx for tx in txs if match(tx)]
-    total = len(filtered)
-    return {"items": filtered[offset:offset + limit], "pagination": {"limit": limit, "offset": offset, "total": total}}
+                       bank: Optional[str] = None,
+                       limit: int = Query(50, ge=0, le=1000),
+                       offset: int = Query(0, ge=0),
+                       cursor: Optional[str] = None):
+    _validate_dates(from_date, to_date)
+    etag = None
+    index = await _account_index(current_user, accountId, bank)
+    if index is None:
+        snapshot = await _load_snapshot(current_user)
+        etag = snapshot_etag(request, snapshot.version)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        index = transaction_index(snapshot)
+    try:
+        page = index.query(from_date=from_date, to_date=to_date, account_id=accountId, bank=bank,
+                           limit=limit, offset=offset, cursor=cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return json_response(request, {
+        "items": page["items"],
+        "pagination": {"limit": limit, "offset": offset, "total": page["total"], "nextCursor": page["nextCursor"]},
+    }, etag=etag)
+
+
+@router.get("/dashboard/transactions/export")
+async def export_transactions(current_user = Depends(get_current_user),
+                              format: Literal["ndjson", "csv"] = "ndjson",
+                              from_date: Optional[str] = Query(None, alias="from"),
+                              to_date: Optional[str] = Query(None, alias="to"),
+                              accountId: Optional[str] = None,
+                              bank: Optional[str] = None):
+    _validate_dates(from_date, to_date)
+    snapshot = await _load_snapshot(current_user)
+    rows = transaction_index(snapshot).iter_range(from_date=from_date, to_date=to_date, account_id=accountId, bank=bank)
+    if format == "csv":
+        body, media_type = iter_csv(rows), "text/csv; charset=utf-8"
+    else:
+        body, media_type = iter_ndjson(rows), "application/x-ndjson"
+    filename = f"transactions-{current_user.get('id')}.{format}"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.post("/dashboard/sync")
+async def sync(current_user = Depends(get_current_user), full: bool = False):
+    snapshot = await snapshot_cache.reload(resolve_user_clients(current_user), full_sync=full)
+    return {"full": full, "transactions": len(snapshot.data["transactions"]), "consents": snapshot.data["consents"]}
 
 
 @router.get("/recommendations")
-async def recommendations(current_user = Depends(get_current_user)):
-    client_mapping = resolve_bank_clients(current_user.get("bankClientId"))
-    aggregated = await aggregate_banks(client_mapping)
-    accounts = aggregated["accounts"]
-    transactions = aggregated["transactions"]
+async def recommendations(request: Request, current_user = Depends(get_current_user)):
+    snapshot = await _load_snapshot(current_user)
+    return snapshot_response(request, snapshot.derived, "recommendations", snapshot.version, lambda: _build_recommendations(snapshot))
+
+
+def _build_recommendations(snapshot: Snapshot) -> List[Dict[str, Any]]:
+    accounts = snapshot.data["accounts"]
+    columns = snapshot_columns(snapshot)
 
-    total_positive = sum(_safe_amount(tx.get("amount", 0)) for tx in transactions if _safe_amount(tx.get("amount", 0)) > 0)
-    total_negative = sum(_safe_amount(tx.get("amount", 0)) for tx in transactions if _safe_amount(tx.get("amount", 0)) < 0)
-    largest_accounts = sorted(accounts, key=lambda acc: _safe_amount(acc.get("balance", 0)), reverse=True)[:3]
+    flows = columns.income_outcome()
+    total_positive = flows["totalPositive"]
+    total_negative = flows["totalNegative"]
+    top_index = columns.top_account()
 
     recs: List[Dict[str, Any]] = []
 
@@ -91,10 +145,10 @@ async def recommendations(current_user = Depends(get_current_user)):
             "category": "Расходы",
         })
 
-    if largest_accounts:
-        top_account = largest_accounts[0]
-        top_balance = _safe_amount(top_account.get("balance", 0))
-        top_label = top_account.get("name") or top_account.get("accountType") or top_account.get("bank") or "счёте"
+    if top_index is not None:
+        top_account = accounts[top_index]
+        top_balance = float(columns.balances[top_index])
+        top_label = top_account.name or top_account.account_type or top_account.bank or "счёте"
         recs.append({
             "id": "rec-deposit",
             "title": "Разместите излишки ликвидности",
@@ -102,8 +156,7 @@ async def recommendations(current_user = Depends(get_current_user)):
             "category": "Инвестиции",
         })
 
-    unique_banks = set(acc.get("bank") for acc in accounts if acc.get("bank"))
-    if len(unique_banks) < len(accounts):
+    if columns.unique_banks() < len(accounts):
         recs.append({
             "id": "rec-diversify",
             "title": "Диверсифицируйте средства",
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Dict
+from ..core.auth import get_current_user, get_stream_user, issue_stream_ticket
+from ..core.logs import get_logger
+from ..banks.cache import snapshot_cache
+from ..banks.config import resolve_user_clients
+from ..banks.events import Event, event_bus
+from ..banks.records import dumps
+
+log = get_logger(__name__)
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+EVENT_HEARTBEAT_SECONDS = 15.0
+EVENT_RETRY_MS = 5000  # пауза перед переподключением EventSource
+
+
+def _format_event(event: Event) -> bytes:
+    return f"id: {event.id}\nevent: {event.type}\ndata: ".encode("utf-8") + dumps(event.data) + b"\n\n"
+
+
+@router.post("/ticket")
+async def ticket(current_user = Depends(get_current_user)) -> Dict:
+    """Одноразовый билет на подключение к /stream; живёт MONETRIX_STREAM_TICKET_TTL секунд"""
+    return await issue_stream_ticket(current_user)
+
+
+@router.get("/stream")
+async def stream(request: Request, current_user = Depends(get_stream_user)):
+    """SSE-поток изменений по банкам пользователя: consent, transactions, balance, resync"""
+    clients = resolve_user_clients(current_user)
+    subscription = event_bus.subscribe(clients)
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            yield f"retry: {EVENT_RETRY_MS}\nevent: ready\ndata: {{}}\n\n".encode("utf-8")
+            while True:
+                event = await subscription.next(timeout=EVENT_HEARTBEAT_SECONDS)
+                if event is not None:
+                    yield _format_event(event)
+                    continue
+                if await request.is_disconnected():
+                    break
+                # Пока открыт дашборд, снимок обновляется по TTL кэша — одно обновление на всех подписчиков,
+                # а новые транзакции и балансы приходят событиями из этого обновления
+                try:
+                    await snapshot_cache.get(clients)
+                except Exception as exc:
+                    log.warning("events.refresh_failed", "⚠️  Не удалось обновить данные для потока событий", error=repr(exc))
+                yield b": ping\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,73 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from fastapi.security import HTTPAuthorizationCredentials
+from ..core.auth import optional_security
+from ..core.logs import dropped_records
+from ..core.metrics import CONTENT_TYPE, metrics
+from ..core.models import ConsentStatus
+from ..banks.cache import snapshot_cache
+from ..banks.client import bank_data_flight, consent_registry
+from ..banks.config import BANK_CONFIGS
+from ..banks.events import event_bus
+from ..banks.health import BreakerState, bank_breakers
+from ..banks.outbound import bank_outbound
+
+METRICS_TOKEN = os.getenv("MONETRIX_METRICS_TOKEN")  # если задан, /metrics требует Authorization: Bearer <token>
+
+router = APIRouter(tags=["metrics"])
+
+consent_states = metrics.gauge("monetrix_consents", "Согласия в реестре процесса по статусу", ("bank", "status"))
+breaker_state = metrics.gauge("monetrix_bank_breaker_state", "Состояние circuit breaker банка (1 — текущее)", ("bank", "state"))
+breaker_failure_rate = metrics.gauge("monetrix_bank_breaker_failure_rate", "Доля неудачных вызовов в окне breaker", ("bank",))
+outbound_total = metrics.counter("monetrix_bank_outbound_total", "Планировщик исходящих запросов: выдано, в очереди, 429, повторы", ("bank", "result"))
+outbound_queued = metrics.gauge("monetrix_bank_outbound_queued", "Запросы, ждущие слота в token bucket", ("bank", "priority"))
+singleflight_total = metrics.counter("monetrix_singleflight_total", "Вызовы single-flight: выполнено и объединено", ("flight", "result"))
+singleflight_in_flight = metrics.gauge("monetrix_singleflight_in_flight", "Выполняющиеся общие запросы", ("flight",))
+snapshot_entries = metrics.gauge("monetrix_snapshot_cache", "Снимки в кэше: записи, элементы, фоновые обновления", ("kind",))
+event_subscribers = metrics.gauge("monetrix_event_subscribers", "Открытые SSE-подписки")
+log_dropped = metrics.counter("monetrix_log_dropped_total", "Записи лога, отброшенные из-за переполненной очереди")
+
+
+def _collect() -> None:
+    consent_states.clear()
+    for bank_code in BANK_CONFIGS:
+        for status in ConsentStatus:
+            consent_states.set(0, bank=bank_code, status=status.value)
+    for state in consent_registry:
+        consent_states.inc(bank=state.bank_code, status=state.status.value)
+    for bank_code, breaker in bank_breakers.items():
+        for state in BreakerState:
+            breaker_state.set(1 if breaker.state == state else 0, bank=bank_code, state=state.value)
+        breaker_failure_rate.set(breaker.describe()["failureRate"], bank=bank_code)
+    for bank_code, outbound in bank_outbound.items():
+        for result, count in outbound.stats.items():
+            outbound_total.set(count, bank=bank_code, result=result)
+        for level, count in outbound.queued().items():
+            outbound_queued.set(count, bank=bank_code, priority=level)
+    flights = {"bank_data": {**bank_data_flight.stats, "in_flight": bank_data_flight.in_flight()}, "snapshot": snapshot_cache.flight_stats()}
+    for flight, stats in flights.items():
+        singleflight_total.set(stats["executed"], flight=flight, result="executed")
+        singleflight_total.set(stats["coalesced"], flight=flight, result="coalesced")
+        singleflight_in_flight.set(stats["in_flight"], flight=flight)
+    for kind, value in snapshot_cache.stats().items():
+        snapshot_entries.set(value, kind=kind)
+    event_subscribers.set(len(event_bus))
+    log_dropped.set(dropped_records())
+
+
+metrics.add_collector(_collect)
+
+
+def _check_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> None:
+    if METRICS_TOKEN is None:
+        return
+    if credentials is None or not hmac.compare_digest(credentials.credentials, METRICS_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(_check_token)])
+async def prometheus_metrics() -> Response:
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
@@ -1,18 +1,19 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import Response
 from typing import Dict, Any
 from ..core.auth import get_current_user
-from ..banks.client import bank_consents_by_key
-from ..banks.config import BANK_CONFIGS, resolve_bank_clients, BANK_CLIENT_IDS
+from ..core.responses import json_response
+from ..core.users import public_user
+from ..banks.client import load_consents
+from ..banks.config import BANK_CONFIGS, resolve_user_clients, BANK_CLIENT_IDS
 
 router = APIRouter(prefix="/api", tags=["profile"])
 
 @router.get("/profile")
-async def profile(current_user = Depends(get_current_user)) -> Dict[str, Any]:
+async def profile(request: Request, current_user = Depends(get_current_user)) -> Response:
     consents = []
-    client_mapping = resolve_bank_clients(current_user.get("bankClientId"))
-    for bank_code in BANK_CONFIGS:
-        client_id = client_mapping.get(bank_code)
-        state = bank_consents_by_key.get((bank_code, client_id))
+    states = await load_consents(resolve_user_clients(current_user))
+    for (bank_code, client_id), state in states.items():
         consents.append({
             "bank": bank_code,
             "bankLabel": BANK_CONFIGS[bank_code].name,
@@ -20,4 +21,5 @@ async def profile(current_user = Depends(get_current_user)) -> Dict[str, Any]:
             "consentId": state.consent_id if state else None,
             "clientId": client_id,
         })
-    return {"user": current_user, "consents": consents, "availableClients": BANK_CLIENT_IDS}
+    payload: Dict[str, Any] = {"user": public_user(current_user), "consents": consents, "availableClients": BANK_CLIENT_IDS}
+    return json_response(request, payload)
@@ -0,0 +1,65 @@
+import os
+
+# До импорта приложения: пользователи и состояние в памяти, тесты не создают файлов БД
+os.environ.setdefault("MONETRIX_USER_STORE", "memory")
+os.environ.setdefault("MONETRIX_STATE_BACKEND", "memory")
+
+from typing import Any, Dict, List
+import httpx
+import pytest
+from backendV2.banks.config import BANK_CONFIGS
+from backendV2.banks.records import format_timestamp, parse_timestamp
+from backendV2.banks.store import transaction_store
+from backendV2.banks.transport import bank_transport
+
+FAKE_BANK_EPOCH = parse_timestamp("2026-01-01T00:00:00Z")
+FAKE_BANK_STEP_SECONDS = 3600
+
+
+class FakeBank:
+    """Банк в памяти: транзакции счёта от новых к старым, limit/offset и нижняя граница даты как у настоящего API"""
+
+    def __init__(self) -> None:
+        self.transactions: Dict[str, List[Dict[str, Any]]] = {}
+        self.requests: List[httpx.Request] = []
+        self.max_page_size = 100
+        self.oldest_first = False  # отдавать историю от старых к новым
+        self.ignore_from = False  # не фильтровать по нижней границе даты
+
+    def publish(self, account_id: str, count: int) -> None:
+        """Добавляет count новых транзакций в начало истории счёта"""
+        history = self.transactions.setdefault(account_id, [])
+        start = len(history)
+        fresh = [{
+            "transactionId": f"{account_id}-tx{seq}",
+            "accountId": account_id,
+            "amount": {"amount": "10.00", "currency": "RUB"},
+            "creditDebitIndicator": "Debit",
+            "bookingDateTime": format_timestamp(FAKE_BANK_EPOCH + seq * FAKE_BANK_STEP_SECONDS),
+        } for seq in range(start, start + count)]
+        history[:0] = reversed(fresh)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        bank_code, _, account_id, _ = request.url.path.strip("/").split("/")
+        params = request.url.params
+        from_ts = None if self.ignore_from else parse_timestamp(params.get(BANK_CONFIGS[bank_code].transactions_from_param or ""))
+        items = [raw for raw in self.transactions.get(account_id, [])
+                 if from_ts is None or parse_timestamp(raw["bookingDateTime"]) >= from_ts]
+        if self.oldest_first:
+            items.reverse()
+        offset = int(params.get("offset", 0))
+        limit = min(int(params.get("limit", 50)), self.max_page_size)
+        return httpx.Response(200, json={"items": items[offset:offset + limit]})
+
+
+@pytest.fixture
+def fake_bank(monkeypatch):
+    bank = FakeBank()
+    monkeypatch.setattr(bank_transport, "transport", httpx.MockTransport(bank.handler))
+    monkeypatch.setattr(bank_transport, "_clients", {})
+    for code, cfg in BANK_CONFIGS.items():
+        monkeypatch.setattr(cfg, "base_url", f"http://fake-bank/{code}")
+    yield bank
+    for code in BANK_CONFIGS:
+        transaction_store.drop(code)
@@ -0,0 +1,114 @@
+import asyncio
+import uuid
+import httpx
+import pytest
+from fastapi import HTTPException
+from backendV2.app import app
+from backendV2.core import auth
+from backendV2.core.auth import get_stream_user, issue_tokens
+from backendV2.core.users import user_repository
+
+# Любой endpoint под get_current_user, который не ходит в банки
+PROTECTED = "/api/profile"
+
+
+async def new_user():
+    return await user_repository.create({"userType": "individual", "fullName": "Test", "email": f"{uuid.uuid4().hex}@example.com",
+                                         "passwordHash": None, "bankClientId": "team-1"})
+
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def bearer(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_refresh_rotates_and_rejects_reuse():
+    async def main():
+        tokens = issue_tokens(await new_user())
+        async with client() as c:
+            response = await c.post("/api/auth/refresh", json={"refreshToken": tokens["refreshToken"]})
+            assert response.status_code == 200
+            rotated = response.json()
+            assert rotated["refreshToken"] != tokens["refreshToken"]
+            assert (await c.get(PROTECTED, headers=bearer(rotated["accessToken"]))).status_code == 200
+
+            reuse = await c.post("/api/auth/refresh", json={"refreshToken": tokens["refreshToken"]})
+            assert reuse.status_code == 401
+            # Ротированный токен по-прежнему действует
+            assert (await c.post("/api/auth/refresh", json={"refreshToken": rotated["refreshToken"]})).status_code == 200
+
+    asyncio.run(main())
+
+
+def test_concurrent_refresh_with_one_token_succeeds_once():
+    async def main():
+        tokens = issue_tokens(await new_user())
+        async with client() as c:
+            responses = await asyncio.gather(*(c.post("/api/auth/refresh", json={"refreshToken": tokens["refreshToken"]})
+                                               for _ in range(5)))
+        assert sorted(response.status_code for response in responses) == [200] + [401] * 4
+
+    asyncio.run(main())
+
+
+def test_token_types_are_not_interchangeable():
+    async def main():
+        tokens = issue_tokens(await new_user())
+        async with client() as c:
+            assert (await c.get(PROTECTED, headers=bearer(tokens["refreshToken"]))).status_code == 401
+            assert (await c.post("/api/auth/refresh", json={"refreshToken": tokens["accessToken"]})).status_code == 401
+
+    asyncio.run(main())
+
+
+def test_logout_revokes_refresh_and_access():
+    async def main():
+        tokens = issue_tokens(await new_user())
+        async with client() as c:
+            assert (await c.get(PROTECTED, headers=bearer(tokens["accessToken"]))).status_code == 200
+            response = await c.post("/api/auth/logout", json={"refreshToken": tokens["refreshToken"]},
+                                    headers=bearer(tokens["accessToken"]))
+            assert response.json() == {"revoked": True}
+            assert (await c.get(PROTECTED, headers=bearer(tokens["accessToken"]))).status_code == 401
+            assert (await c.post("/api/auth/refresh", json={"refreshToken": tokens["refreshToken"]})).status_code == 401
+
+    asyncio.run(main())
+
+
+def test_stream_ticket_is_single_use():
+    async def main():
+        user = await new_user()
+        async with client() as c:
+            response = await c.post("/api/events/ticket", headers=bearer(issue_tokens(user)["accessToken"]))
+        ticket = response.json()["ticket"]
+        assert (await get_stream_user(ticket=ticket, credentials=None))["id"] == user["id"]
+        with pytest.raises(HTTPException) as exc:
+            await get_stream_user(ticket=ticket, credentials=None)
+        assert exc.value.status_code == 401
+
+        # Два одновременных подключения с одним билетом: проходит только одно
+        ticket = (await auth.issue_stream_ticket(user))["ticket"]
+        results = await asyncio.gather(*(get_stream_user(ticket=ticket, credentials=None) for _ in range(3)), return_exceptions=True)
+        assert sum(not isinstance(result, HTTPException) for result in results) == 1
+
+    asyncio.run(main())
+
+
+def test_stream_ticket_expires_and_access_token_is_not_a_ticket(monkeypatch):
+    monkeypatch.setattr(auth, "STREAM_TICKET_TTL_SECONDS", 0.05)
+
+    async def main():
+        user = await new_user()
+        ticket = await auth.issue_stream_ticket(user)
+        assert ticket["expiresIn"] == 0.05
+        await asyncio.sleep(0.1)
+        with pytest.raises(HTTPException):
+            await get_stream_user(ticket=ticket["ticket"], credentials=None)
+        # Долгоживущий access-токен в URL не принимается
+        with pytest.raises(HTTPException):
+            await get_stream_user(ticket=issue_tokens(user)["accessToken"], credentials=None)
+
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+import asyncio
+import dataclasses
+import httpx
+import pytest
+from backendV2.banks import health
+from backendV2.banks.config import BANK_CONFIGS
+from backendV2.banks.health import BankUnavailableError, BreakerState, CircuitBreaker
+from backendV2.banks.transport import bank_transport
+
+BANK = "vbank"
+
+
+def make_breaker() -> CircuitBreaker:
+    cfg = dataclasses.replace(BANK_CONFIGS[BANK], breaker_window=4, breaker_min_calls=4, breaker_failure_rate=0.5,
+                              breaker_slow_call_seconds=1.0, breaker_open_seconds=30.0)
+    return CircuitBreaker(cfg)
+
+
+def expire_open(breaker: CircuitBreaker) -> None:
+    breaker.opened_at -= breaker.open_seconds + 1
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    assert breaker.state == BreakerState.OPEN
+    return breaker
+
+
+def test_opens_when_failure_rate_reached():
+    breaker = make_breaker()
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == BreakerState.CLOSED  # меньше min_calls
+    breaker.record(True, 0.1)
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.is_open()
+    assert not breaker.allow()
+    assert breaker.retry_in() > 0
+
+
+def test_slow_calls_count_as_failures():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(True, 2.0)
+    assert breaker.state == BreakerState.OPEN
+
+
+def test_half_open_allows_single_probe_and_closes_on_success():
+    breaker = open_breaker()
+    expire_open(breaker)
+    assert breaker.allow()
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.describe()["calls"] == 0
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker()
+    expire_open(breaker)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+
+
+def test_release_frees_probe_without_outcome():
+    breaker = open_breaker()
+    expire_open(breaker)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert breaker.allow()
+
+    closed = make_breaker()
+    closed.release()
+    assert closed.state == BreakerState.CLOSED
+    assert closed.describe()["calls"] == 0
+
+
+@pytest.fixture
+def bank_handler(monkeypatch):
+    """Подменяет сеть банка обработчиком, который задаёт тест; breaker банка — свежий"""
+    breaker = make_breaker()
+    monkeypatch.setitem(health.bank_breakers, BANK, breaker)
+    monkeypatch.setattr(BANK_CONFIGS[BANK], "base_url", f"http://fake-bank/{BANK}")
+    monkeypatch.setattr(BANK_CONFIGS[BANK], "max_retries", 0)
+    monkeypatch.setattr(bank_transport, "_clients", {})
+
+    def install(handler):
+        monkeypatch.setattr(bank_transport, "transport", httpx.MockTransport(handler))
+        return breaker
+
+    return install
+
+
+def test_timeouts_open_breaker_and_short_circuit(bank_handler):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    breaker = bank_handler(handler)
+
+    async def main():
+        for _ in range(4):
+            with pytest.raises(httpx.ReadTimeout):
+                await bank_transport.request(BANK_CONFIGS[BANK], "GET", "/accounts", operation="accounts")
+        assert breaker.state == BreakerState.OPEN
+        with pytest.raises(BankUnavailableError):
+            await bank_transport.request(BANK_CONFIGS[BANK], "GET", "/accounts", operation="accounts")
+        assert len(calls) == 4
+
+    asyncio.run(main())
+
+
+def test_cancelled_calls_are_not_failures(bank_handler):
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    breaker = bank_handler(slow)
+
+    async def cancel_one():
+        task = asyncio.create_task(bank_transport.request(BANK_CONFIGS[BANK], "GET", "/accounts", operation="accounts"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    async def main():
+        for _ in range(4):
+            await cancel_one()
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker.describe()["calls"] == 0
+
+        # Отменённый пробный запрос не размыкает breaker и не занимает слот пробы навсегда
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        expire_open(breaker)
+        await cancel_one()
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow()
+
+    asyncio.run(main())
+
+
+def test_calls_cancelled_after_slow_threshold_count_as_failures(bank_handler):
+    async def hang(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    breaker = bank_handler(hang)
+    breaker.slow_call_seconds = 0.02
+
+    async def main():
+        # Как deadline_seconds в aggregate_banks: ответа нет дольше порога медленного вызова, запрос отменяется
+        for _ in range(4):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(bank_transport.request(BANK_CONFIGS[BANK], "GET", "/accounts", operation="accounts"), 0.05)
+        assert breaker.state == BreakerState.OPEN
+
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+import asyncio
+from typing import Any, Dict, List
+import pytest
+from backendV2.banks.cache import SnapshotCache
+from backendV2.banks.singleflight import SingleFlight
+
+PAIRS = (("vbank", "c1"), ("abank", "c1"))
+
+
+class Loader:
+    """Загрузчик снимков со счётчиком вызовов; gate держит загрузку, пока тест его не откроет"""
+
+    def __init__(self) -> None:
+        self.calls: List[Any] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self, key, **kwargs) -> Dict[str, Any]:
+        self.calls.append(key)
+        number = len(self.calls)
+        await self.gate.wait()
+        return {"accounts": [], "transactions": [], "load": number}
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    async def main():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        assert results == [1] * 5
+        assert flight.stats == {"calls": 5, "executed": 1, "coalesced": 4}
+        assert flight.in_flight() == 0
+        # После завершения ключ свободен: следующий вызов выполняется заново
+        assert await flight.do("k", work) == 2
+
+    asyncio.run(main())
+
+
+def test_singleflight_shares_errors_and_forgets_key():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("bank down")
+
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(res, RuntimeError) for res in results)
+        assert flight.stats["executed"] == 1
+        assert flight.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_singleflight_waiter_cancel_keeps_shared_call():
+    async def main():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())
+
+
+def test_snapshot_cache_coalesces_misses_and_serves_hits():
+    async def main():
+        loader = Loader()
+        cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+        snapshots = await asyncio.gather(*(cache.get(PAIRS) for _ in range(5)))
+        assert len(loader.calls) == 1
+        assert len({id(snapshot) for snapshot in snapshots}) == 1
+        # Порядок пар не важен: ключ снимка отсортирован
+        assert await cache.get(tuple(reversed(PAIRS))) is snapshots[0]
+        assert len(loader.calls) == 1
+
+    asyncio.run(main())
+
+
+def test_snapshot_cache_invalidate_by_pair():
+    async def main():
+        loader = Loader()
+        cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+        first = await cache.get(PAIRS)
+        assert cache.invalidate("sbank", "c1") == 0
+        assert await cache.get(PAIRS) is first
+        assert cache.invalidate("vbank", "c1") == 1
+        second = await cache.get(PAIRS)
+        assert second is not first
+        assert second.version > first.version
+        assert len(loader.calls) == 2
+
+    asyncio.run(main())
+
+
+def test_snapshot_cache_drops_load_invalidated_mid_flight():
+    async def main():
+        loader = Loader()
+        loader.gate.clear()
+        cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+        pending = asyncio.create_task(cache.get(PAIRS))
+        while not loader.calls:
+            await asyncio.sleep(0)
+        # Данные поменялись, пока шла загрузка: её результат отдаётся ждущим, но не кэшируется
+        cache.invalidate("vbank", "c1")
+        loader.gate.set()
+        stale = await pending
+        assert cache.peek(PAIRS) is None
+        fresh = await cache.get(PAIRS)
+        assert fresh is not stale
+        assert len(loader.calls) == 2
+
+    asyncio.run(main())
+
+
+def test_snapshot_cache_serves_stale_and_refreshes_in_background():
+    async def main():
+        loader = Loader()
+        cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+        first = await cache.get(PAIRS)
+        first.created_at -= 90  # старше ttl, но в пределах stale_ttl
+        assert await cache.get(PAIRS) is first
+        await asyncio.sleep(0.01)
+        assert len(loader.calls) == 2
+        refreshed = await cache.get(PAIRS)
+        assert refreshed is not first
+        assert refreshed.data["load"] == 2
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_snapshot_cache_miss_after_invalidate_does_not_join_older_load():
+    async def main():
+        loader = Loader()
+        loader.gate.clear()
+        cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+        before = asyncio.create_task(cache.get(PAIRS))
+        while not loader.calls:
+            await asyncio.sleep(0)
+        # Например, create_consent: всё, что запрошено после invalidate, должно видеть новые данные
+        cache.invalidate("vbank", "c1")
+        after = asyncio.create_task(cache.get(PAIRS))
+        while len(loader.calls) < 2:
+            await asyncio.sleep(0)
+        loader.gate.set()
+        assert (await before).data["load"] == 1
+        assert (await after).data["load"] == 2
+        assert cache.peek(PAIRS).data["load"] == 2
+
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+import asyncio
+import dataclasses
+from datetime import datetime, timedelta
+from backendV2.banks.config import BANK_CONFIGS
+from backendV2.banks.consent_scheduler import ConsentScheduler
+from backendV2.banks.registry import BankConsentState, ConsentRegistry
+from backendV2.core.models import ConsentStatus
+
+POLL_INTERVALS = {"abank": 0.01, "sbank": 0.025, "vbank": 0.06}
+
+
+def pending(bank_code: str, client_id: str = "c1") -> BankConsentState:
+    return BankConsentState(consent_id=f"{bank_code}-{client_id}", status=ConsentStatus.PENDING, bank_code=bank_code,
+                            client_id=client_id, expires_at=None, last_synced_at=datetime.utcnow())
+
+
+def test_scheduler_polls_in_due_order_with_backoff(monkeypatch):
+    for code, interval in POLL_INTERVALS.items():
+        monkeypatch.setattr(BANK_CONFIGS[code], "poll_interval", interval)
+        monkeypatch.setattr(BANK_CONFIGS[code], "poll_timeout", 5.0)
+        monkeypatch.setattr(BANK_CONFIGS[code], "poll_max_interval", 1.0)
+    checks = []
+    finished = []
+
+    async def checker(bank_code, states):
+        checks.append(bank_code)
+        # vbank одобряет согласие, остальные банки держат его в pending
+        return [dataclasses.replace(state, status=ConsentStatus.ACTIVE) if bank_code == "vbank" else state for state in states]
+
+    async def main():
+        scheduler = ConsentScheduler(checker)
+        scheduler.add_listener(lambda old, new: finished.append((old.status, new.status)))
+        # Порядок добавления не важен: первой проверяется пара, чья очередь подошла раньше
+        for code in ("vbank", "sbank", "abank"):
+            scheduler.track(pending(code))
+        scheduler.track(pending("abank", "gone"))
+        scheduler.untrack("abank", "gone")
+
+        resolved = await scheduler.wait("vbank", "c1", timeout=2.0)
+        assert resolved.status == ConsentStatus.ACTIVE
+        assert not scheduler.is_pending("vbank", "c1")
+        assert finished == [(ConsentStatus.PENDING, ConsentStatus.ACTIVE)]
+        # abank: 0.01, затем пауза удваивается — 0.03; sbank: 0.025; vbank: 0.06
+        assert checks == ["abank", "sbank", "abank", "vbank"]
+        assert scheduler.is_pending("abank", "c1") and not scheduler.is_pending("abank", "gone")
+        await scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_scheduler_stops_polling_after_timeout(monkeypatch):
+    monkeypatch.setattr(BANK_CONFIGS["abank"], "poll_interval", 0.01)
+    monkeypatch.setattr(BANK_CONFIGS["abank"], "poll_timeout", 0.05)
+    checks = []
+
+    async def checker(bank_code, states):
+        checks.append(bank_code)
+        return states
+
+    async def main():
+        scheduler = ConsentScheduler(checker)
+        scheduler.track(pending("abank"))
+        resolved = await scheduler.wait("abank", "c1", timeout=1.0)
+        assert resolved.status == ConsentStatus.PENDING  # сдались по poll_timeout, а не по timeout ожидания
+        assert not scheduler.is_pending("abank", "c1")
+        count = len(checks)
+        await asyncio.sleep(0.05)
+        assert len(checks) == count
+        await scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_registry_keeps_indexes_in_step():
+    registry = ConsentRegistry(terminal_ttl=60)
+    first = dataclasses.replace(pending("sbank"), request_id="req-1")
+    registry.put(first)
+    assert registry.find("req-1") is first and registry.find("sbank-c1") is first
+
+    # Новое согласие той же пары вытесняет старое из всех индексов
+    second = dataclasses.replace(first, consent_id="sbank-c1-v2", request_id="req-2", status=ConsentStatus.ACTIVE)
+    registry.put(second)
+    assert registry.get("sbank", "c1") is second
+    assert registry.find("req-1") is None and registry.find("sbank-c1") is None
+    assert registry.find("sbank-c1-v2") is second and registry.by_request_id("req-2") is second
+
+    # Удалить можно только текущее согласие пары
+    assert not registry.remove(first)
+    assert registry.remove(second)
+    assert len(registry) == 0 and registry.find("req-2") is None
+
+
+def test_registry_prunes_expired_and_old_terminal_consents():
+    registry = ConsentRegistry(terminal_ttl=60)
+    now = datetime.utcnow()
+    live = dataclasses.replace(pending("vbank"), status=ConsentStatus.ACTIVE, expires_at=now + timedelta(days=1))
+    expired = dataclasses.replace(pending("abank"), status=ConsentStatus.ACTIVE, expires_at=now - timedelta(seconds=1))
+    revoked = dataclasses.replace(pending("sbank"), status=ConsentStatus.REVOKED, last_synced_at=now - timedelta(seconds=120))
+    fresh_revoked = dataclasses.replace(pending("sbank", "c2"), status=ConsentStatus.REVOKED)
+    for state in (live, expired, revoked, fresh_revoked):
+        registry.put(state)
+    assert registry.ttl_for(fresh_revoked) == 60 and registry.ttl_for(pending("vbank")) is None
+    assert registry.prune(now) == 2
+    assert {state.consent_id for state in registry} == {live.consent_id, fresh_revoked.consent_id}
@@ -0,0 +1,103 @@
+from decimal import Decimal
+from typing import List, Optional
+import pytest
+from backendV2.banks.index import TransactionIndex, decode_cursor, encode_cursor
+from backendV2.banks.records import Transaction, parse_timestamp
+
+DAY = 86400
+BASE = parse_timestamp("2026-03-01T00:00:00Z")
+
+
+def tx(key: str, ts: Optional[float], bank: str = "vbank", account: str = "a1") -> Transaction:
+    return Transaction(key=key, bank=bank, account_id=account, amount=Decimal("-10"), currency="RUB", timestamp=ts, description=key)
+
+
+def sample() -> List[Transaction]:
+    rows = []
+    for day in range(10):
+        # По две транзакции в день с одинаковым временем: порядок между ними задаёт стабильный ключ
+        rows.append(tx(f"d{day}-x", BASE + day * DAY + 3600, account="a1"))
+        rows.append(tx(f"d{day}-y", BASE + day * DAY + 3600, bank="abank", account="a2"))
+    rows.append(tx("undated", None))
+    return rows
+
+
+def keys(items) -> List[str]:
+    return [item.key for item in items]
+
+
+def test_query_orders_newest_first_with_undated_last():
+    index = TransactionIndex(sample())
+    page = index.query(limit=100)
+    assert page["total"] == 21
+    assert page["items"][0].timestamp == BASE + 9 * DAY + 3600
+    assert page["items"][-1].key == "undated"
+    assert page["nextCursor"] is None
+
+
+def test_cursor_pages_cover_everything_once():
+    index = TransactionIndex(sample())
+    full = keys(index.query(limit=100)["items"])
+    seen, cursor = [], None
+    while True:
+        page = index.query(limit=3, cursor=cursor)
+        seen.extend(keys(page["items"]))
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    assert seen == full
+
+
+def test_cursor_is_stable_when_older_rows_are_added():
+    rows = sample()
+    first = TransactionIndex(rows).query(limit=4)
+    # Новый снимок с добавленной старой транзакцией: курсор продолжает с того же места, без дублей
+    index = TransactionIndex([*rows, tx("older", BASE - DAY)])
+    second = index.query(limit=4, cursor=first["nextCursor"])
+    assert not set(keys(first["items"])) & set(keys(second["items"]))
+    assert keys(second["items"]) == keys(index.query(limit=100)["items"])[4:8]
+
+
+def test_offset_still_supported():
+    index = TransactionIndex(sample())
+    full = keys(index.query(limit=100)["items"])
+    assert keys(index.query(limit=5, offset=5)["items"]) == full[5:10]
+
+
+def test_date_range_is_inclusive_and_skips_undated():
+    index = TransactionIndex(sample())
+    page = index.query(from_date="2026-03-03", to_date="2026-03-05", limit=100)
+    # Дата без времени в to покрывает весь день
+    assert page["total"] == 6
+    assert {item.key for item in page["items"]} == {f"d{day}-{suffix}" for day in (2, 3, 4) for suffix in "xy"}
+    assert "undated" not in keys(index.query(from_date="2026-01-01", limit=100)["items"])
+
+
+def test_partial_dates_cover_the_whole_period():
+    index = TransactionIndex(sample())
+    assert index.query(from_date="2026-03", to_date="2026-03", limit=100)["total"] == 20
+    assert index.query(from_date="2026", limit=100)["total"] == 20
+    assert index.query(to_date="2026-02", limit=100)["total"] == 0
+    assert parse_timestamp("2026-13") is None
+
+
+def test_account_and_bank_postings():
+    index = TransactionIndex(sample())
+    assert index.query(account_id="a2", limit=100)["total"] == 10
+    assert index.query(bank="vbank", limit=100)["total"] == 11
+    assert index.query(bank="abank", account_id="a1", limit=100) == {"items": [], "total": 0, "nextCursor": None}
+    cursor = index.query(account_id="a1", limit=2)["nextCursor"]
+    assert keys(index.query(account_id="a1", limit=2, cursor=cursor)["items"]) == ["d7-x", "d6-x"]
+
+
+def test_iter_range_matches_query():
+    index = TransactionIndex(sample())
+    window = {"from_date": "2026-03-02", "to_date": "2026-03-08", "bank": "abank"}
+    assert keys(index.iter_range(**window)) == keys(index.query(limit=100, **window)["items"])
+
+
+def test_cursor_roundtrip_and_invalid_cursor():
+    key = (-BASE, "vbank:a1:d0-x")
+    assert decode_cursor(encode_cursor(key)) == key
+    with pytest.raises((ValueError, TypeError)):
+        TransactionIndex(sample()).query(cursor="not-a-cursor")
@@ -0,0 +1,107 @@
+import asyncio
+import dataclasses
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from backendV2.banks.config import BANK_CONFIGS
+from backendV2.banks.outbound import OutboundScheduler, Priority, backoff_delay, parse_retry_after, priority
+from backendV2.banks.singleflight import SingleFlight
+
+BANK = "vbank"
+
+
+def make_scheduler(rate: float = 20.0, burst: int = 2) -> OutboundScheduler:
+    return OutboundScheduler(dataclasses.replace(BANK_CONFIGS[BANK], rate_limit_per_second=rate, rate_limit_burst=burst))
+
+
+def drain(scheduler: OutboundScheduler) -> None:
+    scheduler._tokens = 0.0
+    scheduler._refilled_at = time.monotonic()
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def main():
+        scheduler = make_scheduler(rate=20.0, burst=2)
+        started = time.monotonic()
+        await scheduler.acquire()
+        await scheduler.acquire()
+        assert time.monotonic() - started < 0.02
+        await scheduler.acquire()  # бакет пуст: следующий токен через 1 / rate
+        assert time.monotonic() - started >= 0.04
+        assert scheduler.stats["granted"] == 3 and scheduler.stats["queued"] == 1
+
+    asyncio.run(main())
+
+
+def test_parse_retry_after_and_backoff():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-5") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    moment = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(moment, usegmt=True)) <= 30
+    assert parse_retry_after(format_datetime(moment - timedelta(minutes=5), usegmt=True)) == 0.0
+    # Пауза повтора не короче, чем просил банк
+    assert backoff_delay(BANK_CONFIGS[BANK], 0, retry_after=7.0) >= 7.0
+
+
+def test_defer_pauses_all_lanes():
+    async def main():
+        scheduler = make_scheduler(rate=100.0, burst=5)
+        scheduler.defer(0.1)
+        started = time.monotonic()
+        await scheduler.acquire(Priority.INTERACTIVE)
+        assert time.monotonic() - started >= 0.09
+        assert scheduler.stats["throttled"] == 1
+
+    asyncio.run(main())
+
+
+def test_free_slot_goes_to_most_urgent_lane():
+    async def main():
+        scheduler = make_scheduler()
+        drain(scheduler)
+        order = []
+
+        async def call(level: Priority):
+            await scheduler.acquire(level)
+            order.append(level)
+
+        tasks = [asyncio.create_task(call(level)) for level in (Priority.POLLING, Priority.BACKGROUND, Priority.INTERACTIVE)]
+        await asyncio.gather(*tasks)
+        assert order == [Priority.INTERACTIVE, Priority.BACKGROUND, Priority.POLLING]
+
+    asyncio.run(main())
+
+
+def test_interactive_join_raises_shared_background_call():
+    async def main():
+        scheduler = make_scheduler()
+        drain(scheduler)
+        flight = SingleFlight()
+        order = []
+
+        async def shared_fetch():
+            await scheduler.acquire()
+            order.append("shared")
+            return "data"
+
+        async def other_background():
+            with priority(Priority.BACKGROUND):
+                await scheduler.acquire()
+            order.append("background")
+
+        other = asyncio.create_task(other_background())
+        with priority(Priority.BACKGROUND):
+            refresh = asyncio.create_task(flight.do("k", shared_fetch))  # фоновое обновление кэша
+        while scheduler.queued()["background"] < 2:
+            await asyncio.sleep(0)
+        # Пользователь присоединяется к фоновому вызову: тот переходит в интерактивную полосу
+        user = asyncio.create_task(flight.do("k", shared_fetch))
+        await asyncio.sleep(0)
+        assert scheduler.queued() == {"interactive": 1, "background": 1, "polling": 0}
+        assert await user == "data" and await refresh == "data"
+        await other
+        assert order == ["shared", "background"]
+
+    asyncio.run(main())
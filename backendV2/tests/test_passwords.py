@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import uuid
+import httpx
+from backendV2.app import app
+from backendV2.core.passwords import PasswordHasher
+from backendV2.core.users import user_repository
+from backendV2.routers import auth as auth_router
+
+FAST = dict(n=2 ** 10, r=8, p=1, workers=2)  # дешёвая стоимость: тесты не тратят время на scrypt
+
+
+def login(c: httpx.AsyncClient, email: str, password: str):
+    return c.post("/api/auth/login", json={"email": email, "password": password, "userType": "individual"})
+
+
+def test_legacy_plaintext_password_is_rehashed_on_login(monkeypatch):
+    hasher = PasswordHasher(**FAST)
+    monkeypatch.setattr(auth_router, "password_hasher", hasher)
+
+    async def main():
+        email = f"{uuid.uuid4().hex}@example.com"
+        user = await user_repository.create({"userType": "individual", "fullName": "Legacy", "email": email,
+                                             "password": "old-secret", "bankClientId": "team-1"})
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            assert "error" in (await login(c, email, "wrong")).json()
+            assert "password" in await user_repository.get(user["id"])
+
+            response = (await login(c, email, "old-secret")).json()
+            assert response["user"]["id"] == user["id"] and "passwordHash" not in response["user"]
+            stored = await user_repository.get(user["id"])
+            # Пароль в открытом виде удалён, вместо него — scrypt с текущей стоимостью
+            assert "password" not in stored
+            assert stored["passwordHash"].startswith("scrypt$1024$8$1$")
+            assert not hasher.needs_rehash(stored["passwordHash"])
+            assert "accessToken" in (await login(c, email, "old-secret")).json()
+            assert "error" in (await login(c, email, "wrong")).json()
+        await hasher.close()
+
+    asyncio.run(main())
+
+
+def test_hash_with_old_cost_is_upgraded_on_login(monkeypatch):
+    old, current = PasswordHasher(n=2 ** 8, r=8, p=1, workers=1), PasswordHasher(**FAST)
+    monkeypatch.setattr(auth_router, "password_hasher", current)
+
+    async def main():
+        email = f"{uuid.uuid4().hex}@example.com"
+        user = await user_repository.create({"userType": "individual", "fullName": "Old cost", "email": email,
+                                             "passwordHash": await old.hash("secret"), "bankClientId": "team-1"})
+        assert current.needs_rehash(user["passwordHash"])
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            assert "accessToken" in (await login(c, email, "secret")).json()
+        upgraded = (await user_repository.get(user["id"]))["passwordHash"]
+        assert upgraded != user["passwordHash"] and not current.needs_rehash(upgraded)
+        await old.close()
+        await current.close()
+
+    asyncio.run(main())
+
+
+def test_scrypt_runs_in_pool_and_rejects_bad_hashes():
+    threads = []
+
+    class RecordingHasher(PasswordHasher):
+        def hash_sync(self, password: str) -> str:
+            threads.append(threading.current_thread().name)
+            return super().hash_sync(password)
+
+    async def main():
+        hasher = RecordingHasher(**FAST)
+        hashes = await asyncio.gather(*(hasher.hash("secret") for _ in range(4)))
+        # KDF выполняется в пуле из workers потоков, а не в потоке event loop
+        assert all(name.startswith("passwords") for name in threads)
+        assert len(set(threads)) <= hasher.workers
+        assert len(set(hashes)) == 4  # соль у каждого хэша своя
+        assert await hasher.verify("secret", hashes[0])
+        assert not await hasher.verify("other", hashes[0])
+        assert not await hasher.verify("secret", None)
+        assert not await hasher.verify("secret", "md5$garbage")
+        await hasher.close()
+
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+from decimal import Decimal
+import pytest
+from backendV2.banks.records import Transaction, parse_amount
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("10.10", Decimal("10.10")),
+    (0.1, Decimal("0.1")),  # float через str: без хвоста двоичного представления
+    (7, Decimal(7)),
+    ({"amount": "1500.50", "currency": "RUB"}, Decimal("1500.50")),
+    ({"value": "3"}, Decimal(3)),
+    ({"currency": "RUB"}, Decimal(0)),
+    ("n/a", Decimal(0)),
+    ("NaN", Decimal(0)),
+    (None, Decimal(0)),
+    (True, Decimal(0)),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+@pytest.mark.parametrize("indicator, amount, expected", [
+    ("Debit", "100.00", Decimal("-100.00")),
+    ("DBIT", "100.00", Decimal("-100.00")),
+    ("Debit", "-100.00", Decimal("-100.00")),  # банк уже поставил знак — второй раз не меняем
+    ("Credit", "100.00", Decimal("100.00")),
+    ("CRDT", "100.00", Decimal("100.00")),
+    (None, "-5", Decimal("-5")),
+])
+def test_transaction_sign_follows_credit_debit_indicator(indicator, amount, expected):
+    raw = {"transactionId": "t1", "amount": {"amount": amount, "currency": "EUR"}, "bookingDateTime": "2026-01-01T00:00:00Z"}
+    if indicator:
+        raw["creditDebitIndicator"] = indicator
+    tx = Transaction.from_raw(raw, "vbank", "acc-1")
+    assert tx.amount == expected
+    assert tx.currency == "EUR"
+
+
+def test_flat_transaction_amount_and_currency():
+    tx = Transaction.from_raw({"transactionId": "t2", "transactionAmount": "12.5", "currency": "RUB"}, "abank", "acc-2")
+    assert (tx.amount, tx.currency, tx.account_id, tx.bank) == (Decimal("12.5"), "RUB", "acc-2", "abank")
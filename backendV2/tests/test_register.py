@@ -0,0 +1,50 @@
+import asyncio
+import uuid
+import httpx
+import pytest
+from backendV2.app import app
+from backendV2.banks.config import BANK_CLIENT_IDS
+from backendV2.routers import auth as auth_router
+
+
+@pytest.fixture
+def bootstraps(monkeypatch):
+    calls = []
+
+    async def fake_bootstrap(client_ids, **kwargs):
+        calls.append((list(client_ids), kwargs))
+        return {"total": 0, "completed": 0, "results": {}}
+
+    monkeypatch.setattr(auth_router, "bootstrap_consents", fake_bootstrap)
+    return calls
+
+
+def register(c: httpx.AsyncClient, **fields):
+    payload = {"companyName": "Test", "inn": "7700000000", "contact": "Test", "email": f"{uuid.uuid4().hex}@example.com",
+               "password": "secret", "userType": "business", **fields}
+    return c.post("/api/auth/register", json=payload)
+
+
+def test_register_refuses_foreign_and_unknown_clients(bootstraps):
+    async def main():
+        own, shared = BANK_CLIENT_IDS[5], BANK_CLIENT_IDS[0]
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            unknown = (await register(c, bankClientIds=[own, "someone-else"])).json()
+            assert "someone-else" in unknown["error"]
+
+            first = (await register(c, bankClientIds=[own, BANK_CLIENT_IDS[6]])).json()
+            assert first["user"]["bankClientIds"] == [own, BANK_CLIENT_IDS[6]]
+            # Клиент уже записан за первым пользователем: второй не получит ни его данные, ни его согласия
+            taken = (await register(c, bankClientId=BANK_CLIENT_IDS[6])).json()
+            assert "accessToken" not in taken and BANK_CLIENT_IDS[6] in taken["error"]
+
+            # Общий демо-клиент доступен всем, кто не указал своего
+            for _ in range(2):
+                assert (await register(c, bankClientId=shared)).json()["user"]["bankClientId"] == shared
+            assert (await register(c)).json()["user"]["bankClientId"] == shared
+
+        # Согласия создаются только для принятых регистраций и без перевыпуска действующих
+        assert [client_ids for client_ids, _ in bootstraps] == [[own, BANK_CLIENT_IDS[6]], [shared], [shared], [shared]]
+        assert all(not kwargs.get("force_new") for _, kwargs in bootstraps)
+
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import gzip
+import pytest
+from starlette.requests import Request
+from backendV2.core import responses
+from backendV2.core.responses import choose_encoding, json_response
+
+PAYLOAD = {"items": [{"id": i, "description": "payment"} for i in range(100)]}  # больше COMPRESS_MIN_BYTES
+
+
+def make_request(**headers: str) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "scheme": "http", "server": ("test", 80), "path": "/api/dashboard/summary",
+        "query_string": b"", "root_path": "",
+        "headers": [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_if_none_match_returns_304_for_any_representation():
+    plain = json_response(make_request(), PAYLOAD)
+    assert plain.status_code == 200 and "content-encoding" not in plain.headers
+    etag = plain.headers["etag"]
+    gzipped = json_response(make_request(accept_encoding="gzip"), PAYLOAD)
+    assert gzipped.headers["etag"] != etag
+    assert gzip.decompress(gzipped.body) == plain.body
+
+    # Сжатое и несжатое представления — одна версия данных: подходит любой их ETag
+    for candidate in (etag, gzipped.headers["etag"], f'"other", {etag}', "*"):
+        cached = json_response(make_request(if_none_match=candidate), PAYLOAD)
+        assert cached.status_code == 304 and cached.body == b""
+        assert cached.headers["vary"] == "Accept-Encoding, Authorization"
+    assert json_response(make_request(if_none_match='"other"'), PAYLOAD).status_code == 200
+
+
+def test_weak_etag_matches_by_weak_comparison():
+    etag = json_response(make_request(), PAYLOAD).headers["etag"]
+    # If-None-Match сравнивает слабо: W/ от прокси или браузера не мешает 304, а в ответе ETag остаётся строгим
+    cached = json_response(make_request(if_none_match=f"W/{etag}"), PAYLOAD)
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    changed = json_response(make_request(if_none_match=f"W/{etag}"), {**PAYLOAD, "extra": True})
+    assert changed.status_code == 200
+
+
+def test_accept_encoding_falls_back_without_brotli(monkeypatch):
+    monkeypatch.setattr(responses, "BROTLI_AVAILABLE", False)
+    assert choose_encoding(make_request(accept_encoding="br, gzip;q=0.5")) == "gzip"
+    assert choose_encoding(make_request(accept_encoding="br")) is None
+    assert choose_encoding(make_request(accept_encoding="gzip;q=0, deflate")) is None
+    assert choose_encoding(make_request(accept_encoding="gzip;q=bad")) is None
+    assert choose_encoding(make_request()) is None
+
+
+@pytest.mark.skipif(not responses.BROTLI_AVAILABLE, reason="brotli не установлен")
+def test_brotli_preferred_when_available():
+    assert choose_encoding(make_request(accept_encoding="gzip, br")) == "br"
+
+
+def test_small_bodies_are_not_compressed():
+    response = json_response(make_request(accept_encoding="gzip"), {"ok": True})
+    assert "content-encoding" not in response.headers
+    assert response.body == b'{"ok":true}'
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from backendV2.core.state import KeyedLocks, SQLiteStateBackend
+
+
+def test_keyed_locks_exclude_per_key_and_clean_up():
+    async def main():
+        locks = KeyedLocks()
+        active = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0, "total": 0}
+
+        async def worker(key):
+            async with locks.hold(key):
+                active[key] += 1
+                peak[key] = max(peak[key], active[key])
+                peak["total"] = max(peak["total"], sum(active.values()))
+                await asyncio.sleep(0.01)
+                active[key] -= 1
+
+        await asyncio.gather(*(worker(key) for key in ("a", "b") * 3))
+        # Один ключ — строго по очереди, разные ключи друг друга не ждут
+        assert peak == {"a": 1, "b": 1, "total": 2}
+        assert len(locks) == 0
+
+        async with locks.hold("a"):
+            with pytest.raises(asyncio.TimeoutError):
+                async with locks.hold("a", timeout=0.01):
+                    pass
+            assert len(locks) == 1
+        assert len(locks) == 0
+
+    asyncio.run(main())
+
+
+def test_sqlite_lock_lease_is_renewed_while_held(tmp_path):
+    async def main():
+        path = str(tmp_path / "state.db")
+        holder, other = SQLiteStateBackend(path, workers=2), SQLiteStateBackend(path, workers=2)
+        try:
+            async with holder.lock("job", lease=0.3):
+                # Секция дольше аренды: без продления блокировку забрал бы другой процесс
+                await asyncio.sleep(0.6)
+                with pytest.raises(TimeoutError):
+                    async with other.lock("job", timeout=0.2, lease=0.3):
+                        pass
+            async with other.lock("job", timeout=0.2, lease=0.3):
+                pass
+        finally:
+            await holder.close()
+            await other.close()
+
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime
+from backendV2.banks.client import sync_account_transactions
+from backendV2.banks.config import BANK_CONFIGS
+from backendV2.banks.records import format_timestamp
+from backendV2.banks.registry import BankConsentState
+from backendV2.banks.store import transaction_store
+from backendV2.core.models import ConsentStatus
+
+BANK = "vbank"
+CLIENT = "team-1"
+ACCOUNT = "acc-1"
+
+
+def consent() -> BankConsentState:
+    return BankConsentState(consent_id="consent-1", status=ConsentStatus.ACTIVE, bank_code=BANK, client_id=CLIENT,
+                            expires_at=None, last_synced_at=datetime.utcnow())
+
+
+async def sync(**kwargs) -> int:
+    return await sync_account_transactions(BANK_CONFIGS[BANK], "token", consent(), CLIENT, ACCOUNT, **kwargs)
+
+
+def history():
+    return transaction_store.history(BANK, CLIENT, ACCOUNT)
+
+
+def walk(fake_bank):
+    """(offset, нижняя граница даты) запросов с прошлого вызова"""
+    from_param = BANK_CONFIGS[BANK].transactions_from_param
+    calls = [(int(request.url.params["offset"]), request.url.params.get(from_param)) for request in fake_bank.requests]
+    fake_bank.requests.clear()
+    return calls
+
+
+def test_incremental_sync_asks_only_for_new_transactions(fake_bank):
+    async def main():
+        fake_bank.publish(ACCOUNT, 30)
+        assert await sync(page_size=10) == 30
+        assert walk(fake_bank) == [(0, None), (10, None), (20, None), (30, None)]
+        watermark = history().watermark
+        assert watermark == max(tx.timestamp for tx in history().transactions.values())
+
+        fake_bank.publish(ACCOUNT, 2)
+        assert await sync(page_size=10) == 2
+        # Запрос начинается с водяного знака; транзакция ровно на нём уже известна и не считается новой.
+        # Размер страницы банка ещё неизвестен, поэтому конец подтверждает пустая страница
+        since = format_timestamp(watermark)
+        assert walk(fake_bank) == [(0, since), (3, since)]
+        assert len(history().transactions) == 32
+        assert history().watermark > watermark
+
+        assert await sync(page_size=10) == 0
+
+    asyncio.run(main())
+
+
+def test_truncated_walk_resumes_before_watermark_moves(fake_bank, monkeypatch):
+    monkeypatch.setattr(BANK_CONFIGS[BANK], "max_sync_pages", 2)
+
+    async def main():
+        fake_bank.publish(ACCOUNT, 250)
+        assert await sync(page_size=50) == 100
+        assert (history().resume_offset, history().watermark) == (100, None)
+
+        assert await sync(page_size=50) == 100
+        assert walk(fake_bank)[2:] == [(100, None), (150, None)]
+        assert (history().resume_offset, history().watermark) == (200, None)
+
+        assert await sync(page_size=50) == 50
+        assert history().resume_offset is None
+        assert len(history().transactions) == 250
+        assert history().watermark == max(tx.timestamp for tx in history().transactions.values())
+
+    asyncio.run(main())
+
+
+def test_transactions_arriving_during_backfill_are_not_lost(fake_bank, monkeypatch):
+    monkeypatch.setattr(BANK_CONFIGS[BANK], "max_sync_pages", 2)
+
+    async def main():
+        fake_bank.publish(ACCOUNT, 150)
+        assert await sync(page_size=50) == 100
+        # Новые транзакции сдвигают историю: продолжение с offset=100 повторит пять уже известных
+        fake_bank.publish(ACCOUNT, 5)
+        assert await sync(page_size=50) == 50
+        assert history().resume_offset is None
+        assert len(history().transactions) == 150
+
+        # Полный обход завершён, и следующая синхронизация забирает всё новее водяного знака
+        assert await sync(page_size=50) == 5
+        assert len(history().transactions) == 155
+        assert {tx.key for tx in history().transactions.values()} == {f"{ACCOUNT}-tx{seq}" for seq in range(155)}
+
+    asyncio.run(main())
+
+
+def test_full_resync_starts_from_scratch(fake_bank):
+    async def main():
+        fake_bank.publish(ACCOUNT, 20)
+        await sync(page_size=50)
+        walk(fake_bank)
+        assert await sync(page_size=50, full=True) == 20
+        assert walk(fake_bank)[0] == (0, None)
+
+    asyncio.run(main())
+
+
+def test_oldest_first_bank_ignoring_date_filter_is_walked_to_the_end(fake_bank):
+    fake_bank.oldest_first = fake_bank.ignore_from = True
+
+    async def main():
+        fake_bank.publish(ACCOUNT, 25)
+        assert await sync(page_size=10) == 25
+        walk(fake_bank)
+
+        fake_bank.publish(ACCOUNT, 3)
+        # Первая страница целиком старше водяного знака: это не конец окна, новые транзакции в хвосте
+        assert await sync(page_size=10) == 3
+        assert [offset for offset, _ in walk(fake_bank)] == [0, 10, 20]
+        assert len(history().transactions) == 28
+
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+import asyncio
+from datetime import datetime, timedelta
+from backendV2.banks import tokens
+from backendV2.banks.config import BANK_CONFIGS
+from backendV2.banks.tokens import BankTokenManager, BankTokenState
+
+
+def test_start_does_not_wait_for_warm_up(monkeypatch):
+    release = asyncio.Event()
+    fetched = []
+
+    async def hanging_fetch(cfg):
+        await release.wait()
+        fetched.append(cfg.code)
+        return BankTokenState(access_token=f"token-{cfg.code}", expires_at=datetime.utcnow() + timedelta(hours=1))
+
+    monkeypatch.setattr(tokens, "fetch_bank_token", hanging_fetch)
+    monkeypatch.setattr(tokens, "bank_tokens", {})
+
+    async def main():
+        manager = BankTokenManager()
+        # Банк не отвечает: запуск приложения всё равно не ждёт прогрева
+        await asyncio.wait_for(manager.start(), 0.5)
+        assert not fetched
+        release.set()
+        while len(fetched) < len(BANK_CONFIGS):
+            await asyncio.sleep(0.01)
+        assert await manager.ensure("vbank") == "token-vbank"
+        await manager.close()
+
+    asyncio.run(main())
@@ -94,6 +94,7 @@ export type ProfileResponse = {
     fullName?: string
     companyName?: string
     bankClientId?: string
+    bankClientIds?: string[]
     email?: string
   }
   consents: Array<{ bank: string; bankLabel?: string; status: string; clientId: string; consentId?: string }>
@@ -110,7 +111,8 @@ export type SummaryResponse = {
   liabilities: number
   cashflow: { next30days: number; trend: number }
   budgets: Array<{ category: string; limit: number; actual: number; percentage?: number }>
-  consents?: Array<{ bank: string; status: string }>
+  consents?: Array<{ bank: string; clientId?: string; status: string }>
+  entities?: Array<{ clientId: string; netWorth: number; assets: number; liabilities: number; cashflow: number; accounts: number }>
   accounts?: Array<Record<string, unknown>>
   transactions?: Array<Record<string, unknown>>
 }
@@ -121,7 +123,7 @@ export function fetchSummary(token: string) {
 
 export type TransactionsResponse = {
   items: Array<Record<string, unknown>>
-  pagination: { limit: number; offset: number; total: number }
+  pagination: { limit: number; offset: number; total: number; nextCursor?: string | null }
 }
 
 export function fetchTransactions(token: string) {
@@ -133,3 +135,65 @@ export type RecommendationsResponse = Array<{ id: string; type?: string; title:
 export function fetchRecommendations(token: string) {
   return request<RecommendationsResponse>('/api/recommendations', { token })
 }
+
+export type DashboardEvent =
+  | { type: 'consent'; bank: string; clientId: string; consentId?: string | null; requestId?: string | null; status: string }
+  | { type: 'transactions'; bank: string; clientId: string; accountId: string; items: Array<Record<string, unknown>> }
+  | { type: 'balance'; bank: string; clientId: string; accountId: string; balance: string; delta: string; currency?: string | null }
+  | { type: 'resync' }
+
+const DASHBOARD_EVENT_TYPES: Array<DashboardEvent['type']> = ['consent', 'transactions', 'balance', 'resync']
+
+const EVENT_RECONNECT_MS = 5000
+
+export function fetchStreamTicket(token: string) {
+  return request<{ ticket: string; expiresIn: number }>('/api/events/ticket', { method: 'POST', token })
+}
+
+// EventSource не умеет передавать заголовки, поэтому в query уходит одноразовый билет, а не токен.
+// Билет не переживает переподключение, так что при обрыве берём новый сами
+export function subscribeDashboardEvents(token: string, onEvent: (event: DashboardEvent) => void): () => void {
+  let source: EventSource | null = null
+  let retry: ReturnType<typeof setTimeout> | null = null
+  let closed = false
+
+  const reconnect = () => {
+    if (!closed) {
+      retry = setTimeout(connect, EVENT_RECONNECT_MS)
+    }
+  }
+
+  async function connect() {
+    let ticket: string
+    try {
+      ticket = (await fetchStreamTicket(token)).ticket
+    } catch {
+      reconnect()
+      return
+    }
+    if (closed) {
+      return
+    }
+    source = new EventSource(`${API_BASE_URL}/api/events/stream?ticket=${encodeURIComponent(ticket)}`)
+    DASHBOARD_EVENT_TYPES.forEach((type) => {
+      source?.addEventListener(type, (message) => {
+        const data = JSON.parse((message as MessageEvent<string>).data || '{}')
+        onEvent({ ...data, type } as DashboardEvent)
+      })
+    })
+    source.onerror = () => {
+      source?.close()
+      source = null
+      reconnect()
+    }
+  }
+
+  void connect()
+  return () => {
+    closed = true
+    if (retry) {
+      clearTimeout(retry)
+    }
+    source?.close()
+  }
+}
@@ -1,9 +1,9 @@
-import { useEffect, useMemo, useState } from 'react'
+import { useCallback, useEffect, useMemo, useState } from 'react'
 import { useNavigate } from 'react-router-dom'
 import Footer from '../components/Footer'
 import Topbar from '../components/Topbar'
-import { fetchProfile, fetchRecommendations, fetchSummary, fetchTransactions } from '../lib/api'
-import type { RecommendationsResponse } from '../lib/api'
+import { fetchProfile, fetchRecommendations, fetchSummary, fetchTransactions, subscribeDashboardEvents } from '../lib/api'
+import type { DashboardEvent, RecommendationsResponse } from '../lib/api'
 import { ApiError } from '../lib/api'
 import { clearToken, getToken } from '../lib/authStorage'
 import { formatCurrency, formatDate, formatSignedCurrency } from '../lib/format'
@@ -126,54 +126,96 @@ const buildMoneyFlow = (transactions: Array<Record<string, unknown>>) => {
   })
 }
 
+type SummaryState = { netWorth: number; assets: number; liabilities: number; cashflow: { next30days: number; trend: number }; budgets: Array<{ category: string; limit: number; actual: number; percentage?: number }>; accounts?: Array<Record<string, unknown>> }
+
+const getTransactionId = (tx: Record<string, unknown>) => (tx.transactionId as string) || (tx.id as string) || ''
+
+const applyBalance = (summary: SummaryState, event: Extract<DashboardEvent, { type: 'balance' }>): SummaryState => {
+  const next = Number(event.balance)
+  const previous = next - Number(event.delta)
+  if (!Number.isFinite(next) || !Number.isFinite(previous)) return summary
+  return {
+    ...summary,
+    netWorth: summary.netWorth + (next - previous),
+    assets: summary.assets + Math.max(next, 0) - Math.max(previous, 0),
+    liabilities: summary.liabilities + Math.max(-next, 0) - Math.max(-previous, 0),
+    accounts: summary.accounts?.map((account) =>
+      account.bank === event.bank && getAccountId(account, -1) === event.accountId ? { ...account, balance: event.balance } : account,
+    ),
+  }
+}
+
 const ClientDashboardPage = () => {
   const navigate = useNavigate()
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [profile, setProfile] = useState<{ fullName?: string; companyName?: string; bankClientId?: string; email?: string } | null>(null)
   const [consents, setConsents] = useState<Array<{ bank: string; bankLabel?: string; status: string; clientId: string }>>([])
-  const [summary, setSummary] = useState<{ netWorth: number; assets: number; liabilities: number; cashflow: { next30days: number; trend: number }; budgets: Array<{ category: string; limit: number; actual: number; percentage?: number }>; accounts?: Array<Record<string, unknown>> } | null>(null)
+  const [summary, setSummary] = useState<SummaryState | null>(null)
   const [transactions, setTransactions] = useState<Array<Record<string, unknown>>>([])
   const [recommendations, setRecommendations] = useState<RecommendationsResponse>([])
   const [selectedBank, setSelectedBank] = useState<AggregatedBank | null>(null)
 
-  useEffect(() => {
-    const load = async () => {
-      try {
-        setLoading(true)
-        const token = getToken()
-        if (!token) {
-          navigate('/login', { replace: true })
-          return
-        }
-        const [profileData, summaryData, transactionsData, recommendationsData] = await Promise.all([
-          fetchProfile(token),
-          fetchSummary(token),
-          fetchTransactions(token),
-          fetchRecommendations(token),
-        ])
-
-        setProfile(profileData.user)
-        setConsents(profileData.consents)
-        setSummary(summaryData)
-        setTransactions(transactionsData.items)
-        setRecommendations(recommendationsData)
-      } catch (apiError) {
-        if (apiError instanceof ApiError && apiError.status === 401) {
-          clearToken()
-          setError('Сессия истекла. Пожалуйста, войдите заново.')
-        } else if (apiError instanceof Error) {
-          setError(apiError.message)
-        } else {
-          setError('Не удалось загрузить данные. Попробуйте позже.')
-        }
-      } finally {
-        setLoading(false)
+  const load = useCallback(async () => {
+    try {
+      setLoading(true)
+      const token = getToken()
+      if (!token) {
+        navigate('/login', { replace: true })
+        return
+      }
+      const [profileData, summaryData, transactionsData, recommendationsData] = await Promise.all([
+        fetchProfile(token),
+        fetchSummary(token),
+        fetchTransactions(token),
+        fetchRecommendations(token),
+      ])
+
+      setProfile(profileData.user)
+      setConsents(profileData.consents)
+      setSummary(summaryData)
+      setTransactions(transactionsData.items)
+      setRecommendations(recommendationsData)
+    } catch (apiError) {
+      if (apiError instanceof ApiError && apiError.status === 401) {
+        clearToken()
+        setError('Сессия истекла. Пожалуйста, войдите заново.')
+      } else if (apiError instanceof Error) {
+        setError(apiError.message)
+      } else {
+        setError('Не удалось загрузить данные. Попробуйте позже.')
       }
+    } finally {
+      setLoading(false)
     }
+  }, [navigate])
 
+  useEffect(() => {
     load()
-  }, [navigate])
+  }, [load])
+
+  // Изменения приходят с сервера событиями — повторно опрашивать summary не нужно
+  useEffect(() => {
+    const token = getToken()
+    if (!token) return undefined
+    return subscribeDashboardEvents(token, (event) => {
+      if (event.type === 'consent') {
+        setConsents((prev) => prev.map((consent) =>
+          consent.bank === event.bank && consent.clientId === event.clientId ? { ...consent, status: event.status } : consent,
+        ))
+      } else if (event.type === 'transactions') {
+        setTransactions((prev) => {
+          const known = new Set(prev.map(getTransactionId))
+          const fresh = event.items.filter((tx) => !known.has(getTransactionId(tx)))
+          return fresh.length ? [...fresh, ...prev] : prev
+        })
+      } else if (event.type === 'balance') {
+        setSummary((prev) => (prev ? applyBalance(prev, event) : prev))
+      } else if (event.type === 'resync') {
+        load()
+      }
+    })
+  }, [load])
 
   const banks = useMemo(() => aggregateBanks(summary?.accounts), [summary])
   const moneyFlow = useMemo(() => buildMoneyFlow(transactions), [transactions])